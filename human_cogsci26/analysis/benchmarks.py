@@ -0,0 +1,538 @@
+"""
+Benchmarks for the analysis hot paths.
+
+Times the statistics behind the figures and reports on deterministic
+synthetic fixtures at several multiples of the study size (82 participants),
+records wall time and peak traced memory to a JSON history, and flags
+results that are slower or larger than the recent history of the same case.
+
+Usage (from human_cogsci26/):
+    python analysis/benchmarks.py                      # all cases, 1x/10x/100x
+    python analysis/benchmarks.py lowess_line --scales 1,10
+    python analysis/benchmarks.py --budget 30 --fail-on-regression
+    python analysis/benchmarks.py --list
+
+A case is skipped at a scale when its runtime, projected from the previous
+scale, exceeds --budget seconds; the projection is recorded in the history.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from statistics import median
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from common import ANALYSIS_DIR, PELLET_TILES, ROOT_DIR
+from counting import round_counts
+from curves import bootstrap_ci, build_top_low, lowess_line
+from hierarchical import HierarchicalFit
+from hypothesis_model import analyze_user_data, fit_lambdas, hypothesis_probabilities
+from loaders import read_main
+from sim_scores import calculate_difference_with_ci
+from tensors import LogTensor
+
+BASE_USERS = 82
+SCALES = (1, 10, 100)
+HISTORY_FILE = ANALYSIS_DIR / "benchmark_history.json"
+
+# Size of the study at 1x, taken from the clean + pilot tables
+Q_ROWS_PER_AGENT_ROUND = 200  # 0.5 s samples over 100 s
+DRAGS_PER_USER = 95  # ~5.1k rows in clean/random.csv for 54 users
+ACTIONS_PER_USER = 155  # ~12.6k rows in study_data/user_data_action.csv
+SIM_STEPS = 50
+SIM_BASELINE_RUNS = 10
+SIM_INTERVENTION_RUNS = 60  # 6 types x 10 runs at one rate
+
+# Reduced loop counts so a case stays in seconds at 1x; recorded as params
+BENCH_BOOTSTRAP_ITERATIONS = 20
+BENCH_SIM_BOOTSTRAP = 200
+
+DEFAULT_REPEAT = 3
+SINGLE_SHOT_SECONDS = 5.0  # no repeats once a run takes this long
+DEFAULT_BUDGET = 120.0
+DEFAULT_THRESHOLD = 0.25
+MIN_DELTA_SECONDS = 0.05  # ignore differences below timer noise
+HISTORY_WINDOW = 5
+
+
+# ==================== fixtures ====================
+def _rng(case: str, scale: int) -> np.random.Generator:
+    seed = sum(ord(c) for c in case) * 1000 + scale
+    return np.random.default_rng(seed)
+
+
+def _q_curves(rng, n_users: int, rounds: list[int], agents: list[int]) -> pd.DataFrame:
+    """user_data_q-shaped rows: a saturating Q curve plus noise per agent."""
+    time_grid = np.arange(1, Q_ROWS_PER_AGENT_ROUND + 1) * 0.5
+    keys = pd.MultiIndex.from_product(
+        [range(1, n_users + 1), rounds, agents], names=["user_id", "round", "agent_id"]
+    ).to_frame(index=False)
+    n_curves = len(keys)
+    ceiling = rng.uniform(20, 60, n_curves)[:, None]
+    rate = rng.uniform(0.01, 0.06, n_curves)[:, None]
+    q = ceiling * (1 - np.exp(-rate * time_grid)) + rng.normal(
+        0, 3, (n_curves, time_grid.size)
+    )
+    df = keys.loc[keys.index.repeat(time_grid.size)].reset_index(drop=True)
+    df["time"] = np.tile(time_grid, n_curves)
+    df["ExpectedQvalue"] = q.ravel()
+    return df
+
+
+def _type_slice_points(scale: int) -> int:
+    """Points behind one type x setting curve: users/6 x 2 rounds x 200."""
+    users_per_type = math.ceil(BASE_USERS * scale / 6)
+    return users_per_type * 2 * Q_ROWS_PER_AGENT_ROUND
+
+
+def _xy(case: str, scale: int):
+    rng = _rng(case, scale)
+    n = _type_slice_points(scale)
+    x = np.tile(np.arange(1, Q_ROWS_PER_AGENT_ROUND + 1) * 0.5, n // Q_ROWS_PER_AGENT_ROUND)
+    y = 40 * (1 - np.exp(-0.03 * x)) + rng.normal(0, 5, x.size)
+    return x, y
+
+
+def _drags(rng, n_users: int, layout: str) -> pd.DataFrame:
+    """random.csv/smooth.csv-shaped drags from a mixture of target rules."""
+    n = n_users * DRAGS_PER_USER
+    pellets = np.array(PELLET_TILES[layout])
+    start = rng.integers(0, 8, (n, 2))
+    rule = rng.choice(3, n, p=[0.4, 0.4, 0.2])
+    target = np.where(
+        (rule == 0)[:, None],
+        start,
+        np.where(
+            (rule == 1)[:, None],
+            pellets[rng.integers(0, len(pellets), n)],
+            rng.integers(0, 8, (n, 2)),
+        ),
+    )
+    return pd.DataFrame(
+        {
+            "user_id": np.repeat(np.arange(1, n_users + 1), DRAGS_PER_USER),
+            "agent_ini_pos_x": start[:, 0],
+            "agent_ini_pos_y": start[:, 1],
+            "agent_end_pos_x": target[:, 0],
+            "agent_end_pos_y": target[:, 1],
+        }
+    )
+
+
+def _sim_runs(rng, runs: int) -> pd.DataFrame:
+    """run_*.csv-shaped simulation rows stacked over `runs` runs."""
+    steps = np.arange(1, SIM_STEPS + 1)
+    reward = np.cumsum(rng.poisson(0.3, (runs, SIM_STEPS)), axis=1)
+    return pd.DataFrame(
+        {
+            "agentid": 0,
+            "step": np.tile(steps, runs),
+            "CumulativeReward": reward.ravel(),
+            "run": np.repeat(np.arange(1, runs + 1), SIM_STEPS),
+        }
+    )
+
+
+# ==================== cases ====================
+@dataclass
+class Case:
+    name: str
+    description: str
+    setup: Callable[[int], tuple]
+    run: Callable
+    complexity: float  # runtime exponent in the scale, used for projections
+    params: dict
+
+
+def _setup_lowess(scale):
+    return _xy("lowess_line", scale)
+
+
+def _setup_bootstrap(scale):
+    return _xy("bootstrap_ci", scale)
+
+
+def _setup_sim_difference(scale):
+    rng = _rng("calculate_difference_with_ci", scale)
+    return (
+        _sim_runs(rng, SIM_INTERVENTION_RUNS * scale),
+        _sim_runs(rng, SIM_BASELINE_RUNS * scale),
+    )
+
+
+def _setup_likelihood(scale):
+    rng = _rng("likelihood_fit", scale)
+    return (_drags(rng, BASE_USERS * scale, "random"),)
+
+
+def _run_likelihood(drags):
+    pellets = PELLET_TILES["random"]
+    return [analyze_user_data(g, pellets)[0] for _, g in drags.groupby("user_id")]
+
+
+def _run_batched_likelihood(drags):
+    probs = hypothesis_probabilities(
+        drags[["agent_ini_pos_x", "agent_ini_pos_y"]].values,
+        drags[["agent_end_pos_x", "agent_end_pos_y"]].values,
+        PELLET_TILES["random"],
+    )
+    return fit_lambdas(probs, drags["user_id"].to_numpy() - 1)
+
+
+def _run_hierarchical(drags):
+    return HierarchicalFit.from_drags(drags, PELLET_TILES["random"])
+
+
+def _setup_top_low(scale):
+    rng = _rng("build_top_low", scale)
+    return (_q_curves(rng, BASE_USERS * scale, [6, 7], [0, 1]), [6, 7])
+
+
+def _setup_csv_load(scale):
+    rng = _rng("csv_load", scale)
+    n_users = BASE_USERS * scale
+    tmp = tempfile.TemporaryDirectory(prefix="cogsci26_bench_")
+    folder = os.path.join(tmp.name, "clean")
+    os.makedirs(folder)
+    rounds = list(range(2, 10))
+    stats = pd.DataFrame({"user_id": np.arange(1, n_users + 1)})
+    for r in rounds:
+        stats[f"round_{r}"] = rng.integers(0, 30, n_users)
+    stats.to_csv(os.path.join(folder, "user_round_statistics.csv"), index=False)
+    # one agent per round, as in the single-agent settings
+    q = _q_curves(rng, n_users, rounds, [0])
+    q[["agent_id", "time", "user_id", "round", "ExpectedQvalue"]].to_csv(
+        os.path.join(folder, "user_data_q.csv"), index=False
+    )
+    return (tmp.name, tmp)
+
+
+def _run_csv_load(data_dir, _tmp):
+    return read_main(data_dir)
+
+
+def _setup_log_tensor(scale):
+    rng = _rng("log_tensor", scale)
+    return (_q_curves(rng, BASE_USERS * scale, list(range(2, 10)), [0, 1]),)
+
+
+def _run_log_tensor(df):
+    return LogTensor.from_frame(df, "ExpectedQvalue").group_mean()
+
+
+def _setup_round_counts(scale):
+    rng = _rng("round_counts", scale)
+    n = BASE_USERS * scale * ACTIONS_PER_USER
+    actions = pd.DataFrame(
+        {
+            "user_id": rng.integers(1, BASE_USERS * scale + 1, n),
+            "round": rng.integers(1, 10, n),
+        }
+    )
+    return (actions,)
+
+
+CASES = [
+    Case(
+        "lowess_line",
+        "LOWESS of one type x setting slice",
+        _setup_lowess,
+        lowess_line,
+        2.0,
+        {},
+    ),
+    Case(
+        "bootstrap_ci",
+        "bootstrap LOWESS band of one slice",
+        _setup_bootstrap,
+        lambda x, y: bootstrap_ci(x, y, n_iterations=BENCH_BOOTSTRAP_ITERATIONS),
+        2.0,
+        {"n_iterations": BENCH_BOOTSTRAP_ITERATIONS},
+    ),
+    Case(
+        "calculate_difference_with_ci",
+        "sim score difference with per-step bootstrap",
+        _setup_sim_difference,
+        lambda a, b: calculate_difference_with_ci(a, b, n_bootstrap=BENCH_SIM_BOOTSTRAP),
+        1.0,
+        {"n_bootstrap": BENCH_SIM_BOOTSTRAP},
+    ),
+    Case(
+        "likelihood_fit",
+        "H1-H4 lambda fits for every user (random layout)",
+        _setup_likelihood,
+        _run_likelihood,
+        1.0,
+        {"drags_per_user": DRAGS_PER_USER},
+    ),
+    Case(
+        "batched_likelihood_fit",
+        "likelihood_fit with fit_lambdas, all users at once",
+        _setup_likelihood,
+        _run_batched_likelihood,
+        1.0,
+        {"drags_per_user": DRAGS_PER_USER},
+    ),
+    Case(
+        "hierarchical_fit",
+        "empirical-Bayes H1-H4 weights of all users (random layout)",
+        _setup_likelihood,
+        _run_hierarchical,
+        1.0,
+        {"drags_per_user": DRAGS_PER_USER},
+    ),
+    Case(
+        "build_top_low",
+        "top/low grouping of two-agent rounds",
+        _setup_top_low,
+        build_top_low,
+        1.0,
+        {},
+    ),
+    Case(
+        "csv_load",
+        "read_main over user_data_q + round statistics",
+        _setup_csv_load,
+        _run_csv_load,
+        1.0,
+        {},
+    ),
+    Case(
+        "log_tensor",
+        "dense tensor of user_data_q plus per-type means",
+        _setup_log_tensor,
+        _run_log_tensor,
+        1.0,
+        {},
+    ),
+    Case(
+        "round_counts",
+        "per-(user, round) action counts with zero fill",
+        _setup_round_counts,
+        round_counts,
+        1.0,
+        {},
+    ),
+]
+CASES_BY_NAME = {c.name: c for c in CASES}
+
+
+# ==================== measurement ====================
+def measure(case: Case, scale: int, repeat: int) -> dict:
+    """Best-of-`repeat` wall time and peak traced memory of one case."""
+    args = case.setup(scale)
+
+    timings = []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        case.run(*args)
+        timings.append(time.perf_counter() - t0)
+        if timings[-1] >= SINGLE_SHOT_SECONDS:
+            break
+
+    tracemalloc.start()
+    try:
+        case.run(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "case": case.name,
+        "scale": scale,
+        "status": "ok",
+        "seconds": min(timings),
+        "runs": len(timings),
+        "peak_mb": peak / 2**20,
+        "params": case.params,
+    }
+
+
+def run_cases(cases: list[Case], scales: list[int], repeat: int, budget: float):
+    results = []
+    for case in cases:
+        previous = None
+        for scale in sorted(scales):
+            if previous is not None:
+                projected = previous["seconds"] * (scale / previous["scale"]) ** case.complexity
+                if projected > budget:
+                    print(f"  {case.name:<30} {scale:>4}x  skipped (projected {projected:.0f}s)")
+                    results.append(
+                        {
+                            "case": case.name,
+                            "scale": scale,
+                            "status": "skipped",
+                            "projected_seconds": projected,
+                            "params": case.params,
+                        }
+                    )
+                    continue
+            result = measure(case, scale, repeat)
+            print(
+                f"  {case.name:<30} {scale:>4}x  {result['seconds']:9.3f}s"
+                f"  {result['peak_mb']:9.1f} MB"
+            )
+            results.append(result)
+            previous = result
+    return results
+
+
+# ==================== history ====================
+def load_history(path) -> list[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_history(path, history: list[dict]):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def environment() -> dict:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def find_regressions(results: list[dict], history: list[dict], threshold: float):
+    """Results slower/larger than the median of the last runs of the same case.
+
+    Only history entries with the same case, scale, params and host count.
+    """
+    host = platform.node()
+    regressions = []
+    for result in results:
+        if result["status"] != "ok":
+            continue
+        past = [
+            r
+            for run in history
+            if run["env"].get("host") == host
+            for r in run["results"]
+            if r["status"] == "ok"
+            and r["case"] == result["case"]
+            and r["scale"] == result["scale"]
+            and r["params"] == result["params"]
+        ][-HISTORY_WINDOW:]
+        if not past:
+            continue
+        base_seconds = median(r["seconds"] for r in past)
+        base_mb = median(r["peak_mb"] for r in past)
+        slower = (
+            result["seconds"] > base_seconds * (1 + threshold)
+            and result["seconds"] - base_seconds > MIN_DELTA_SECONDS
+        )
+        larger = result["peak_mb"] > base_mb * (1 + threshold) and result["peak_mb"] - base_mb > 1
+        if slower or larger:
+            regressions.append(
+                {
+                    "case": result["case"],
+                    "scale": result["scale"],
+                    "seconds": result["seconds"],
+                    "baseline_seconds": base_seconds,
+                    "peak_mb": result["peak_mb"],
+                    "baseline_mb": base_mb,
+                }
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("cases", nargs="*", help="cases to run (default: all)")
+    parser.add_argument(
+        "--scales",
+        default=",".join(str(s) for s in SCALES),
+        help="comma-separated multiples of the 82-participant study",
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=DEFAULT_BUDGET,
+        help="skip a scale whose projected runtime exceeds this many seconds",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="relative slowdown/growth flagged as a regression",
+    )
+    parser.add_argument("--history", default=str(HISTORY_FILE))
+    parser.add_argument("--no-save", action="store_true", help="do not append to the history")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for case in CASES:
+            print(f"{case.name:<30} {case.description}")
+        return 0
+
+    unknown = [c for c in args.cases if c not in CASES_BY_NAME]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+    cases = [CASES_BY_NAME[c] for c in args.cases] if args.cases else CASES
+    scales = [int(s) for s in args.scales.split(",") if s]
+
+    print(f"Benchmarking {len(cases)} case(s) at scales {scales}")
+    results = run_cases(cases, scales, args.repeat, args.budget)
+
+    history = load_history(args.history)
+    regressions = find_regressions(results, history, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against the recent history:")
+        for r in regressions:
+            print(
+                f"  {r['case']} {r['scale']}x: {r['seconds']:.3f}s (baseline "
+                f"{r['baseline_seconds']:.3f}s), {r['peak_mb']:.1f} MB (baseline "
+                f"{r['baseline_mb']:.1f} MB)"
+            )
+    elif history:
+        print("\nNo regressions against the recent history.")
+
+    if not args.no_save:
+        history.append({"env": environment(), "results": results, "regressions": regressions})
+        save_history(args.history, history)
+        print(f"History written to {args.history}")
+
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""Incremental, parallel build of the paper artefacts.
+
+Every analysis script is declared as a node with its input and output
+files, and its stdout is kept as a log. A node is rebuilt only when the
+content hash of its script + inputs differs from the last successful build
+or one of its outputs is missing. Dependencies come from the declarations
+(a node depends on whichever node produces one of its inputs) and
+independent nodes run in parallel.
+
+Build state is kept in analysis/.build_state.json and per-node stdout in
+analysis/build_logs/.
+
+Usage (from human_cogsci26/):
+    python analysis/build.py                 # build everything that is stale
+    python analysis/build.py expected_q -j 4 # one target and its upstream nodes
+    python analysis/build.py --dry-run       # show what would run
+    python analysis/build.py --list          # show the declared graph
+    COGSCI26_PROFILE=1 python analysis/build.py   # profile every script run
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+import profiling
+from common import ANALYSIS_DIR, ROOT_DIR
+
+STATE_FILE = ANALYSIS_DIR / ".build_state.json"
+LOG_DIR = ANALYSIS_DIR / "build_logs"
+HASH_CHUNK = 1 << 20
+
+
+@dataclass
+class Node:
+    """One build step. Paths are relative to human_cogsci26/.
+
+    `inputs` must exist; `optional` entries (files or glob patterns) are hashed
+    when present. A node with `script=None` copies inputs[i] -> outputs[i].
+    """
+
+    name: str
+    script: str | None
+    inputs: list[str] = field(default_factory=list)
+    outputs: list[str] = field(default_factory=list)
+    optional: list[str] = field(default_factory=list)
+    cwd: str = "."
+
+
+def _likelihood(folder: str, layout: str, per_user: bool = True) -> Node:
+    suffix = "_user" if per_user else ""
+    script = f"study_data/data/{folder}/likehood_{layout}{suffix}.py"
+    return Node(
+        name=f"likelihood_{folder}_{layout}{suffix}",
+        script=script,
+        inputs=[f"study_data/data/{folder}/{layout}.csv"],
+    )
+
+
+_D = "study_data/data"
+_Q_INPUTS = [
+    f"{_D}/clean/user_round_statistics.csv",
+    f"{_D}/pilot/user_round_statistics.csv",
+    f"{_D}/clean/user_data_q.csv",
+    f"{_D}/pilot/user_data_q.csv",
+]
+_SCORE_INPUTS = [
+    f"{_D}/clean/user_round_statistics.csv",
+    f"{_D}/pilot/user_round_statistics.csv",
+    f"{_D}/clean/user_data.csv",
+    f"{_D}/pilot/user_data.csv",
+]
+_BLACK_Q = [f"{_D}/black/user_round_counts_detailed.csv"]
+_TYPES = ["SUGGESTION", "RESET", "INTERRUPT", "TRANSITION", "DISRUPT", "IMPEDE"]
+
+NODES = [
+    # ---- data preparation ----
+    Node(
+        "clean_study",
+        "study_data/clean.py",
+        inputs=["study_data/user_round_statistics.csv"]
+        + [f"study_data/{f}" for f in ("user_data_action.csv", "user_data_end_counts.csv",
+                                       "user_data_try.csv")],
+        optional=["study_data/user_data_q.csv", "study_data/user_data.csv"],
+        outputs=[f"study_data/clean/{f}" for f in ("user_data_action.csv",
+                                                   "user_data_end_counts.csv",
+                                                   "user_data_try.csv")],
+    ),
+    Node(
+        "count_study",
+        "study_data/计数.py",
+        inputs=["study_data/user_data_action.csv", "analysis/counting.py"],
+        outputs=["study_data/user_round_counts_detailed.csv"],
+    ),
+    Node(
+        "count_pilot",
+        f"{_D}/pilot/计数.py",
+        inputs=[f"{_D}/pilot/user_data_action.csv", "analysis/counting.py"],
+        outputs=[f"{_D}/pilot/user_round_counts_detailed.csv"],
+    ),
+    Node(
+        "split_clean",
+        f"{_D}/clean/split.py",
+        inputs=[f"{_D}/clean/user_data_action.csv"],
+        outputs=[f"{_D}/clean/random.csv", f"{_D}/clean/smooth.csv"],
+    ),
+    Node(
+        "split_pilot",
+        f"{_D}/pilot/split_data.py",
+        inputs=[f"{_D}/pilot/demographics.csv", f"{_D}/pilot/user_data_action.csv"],
+        outputs=[f"{_D}/pilot/random.csv", f"{_D}/pilot/smooth.csv"],
+    ),
+    # ---- hypothesis likelihood reports ----
+    _likelihood("clean", "random"),
+    _likelihood("clean", "smooth"),
+    _likelihood("pilot", "random"),
+    _likelihood("pilot", "smooth"),
+    _likelihood("pilot", "random", per_user=False),
+    _likelihood("pilot", "smooth", per_user=False),
+    # ---- counts, rates and categories ----
+    Node(
+        "interpret_type_counts",
+        f"{_D}/id.py",
+        inputs=[f"{_D}/clean/user_round_statistics.csv", f"{_D}/pilot/user_round_statistics.csv",
+                "analysis/counting.py"],
+    ),
+    Node(
+        "intervention_rate",
+        f"{_D}/intervention_rate.py",
+        inputs=[f"{_D}/{fld}/{f}" for fld in ("clean", "pilot")
+                for f in ("user_round_statistics.csv", "user_data_action.csv", "user_data_try.csv")]
+        + ["analysis/counting.py"],
+    ),
+    Node(
+        "intervention_rate_by_group",
+        f"{_D}/intervent_rate2.py",
+        inputs=[f"{_D}/{fld}/{f}" for fld in ("clean", "pilot")
+                for f in ("user_round_statistics.csv", "user_data_action.csv", "user_data_try.csv")]
+        + ["analysis/counting.py"],
+    ),
+    Node(
+        "intervention_type",
+        f"{_D}/intervention_type.py",
+        inputs=[f"{_D}/{fld}/{f}" for fld in ("clean", "pilot")
+                for f in ("user_round_statistics.csv", "user_data_action.csv")]
+        + ["analysis/counting.py"],
+    ),
+    Node(
+        "intervention_type_by_group",
+        f"{_D}/intervention_type2.py",
+        inputs=[f"{_D}/{fld}/{f}" for fld in ("clean", "pilot")
+                for f in ("user_round_statistics.csv", "user_data_action.csv")]
+        + ["analysis/counting.py"],
+    ),
+    # ---- figures ----
+    Node(
+        "expected_q",
+        f"{_D}/expected_q.py",
+        inputs=_Q_INPUTS,
+        optional=[f"{_D}/black/setting*/run_*.csv"],
+        outputs=[f"{_D}/expected_q_lowess.png"],
+    ),
+    Node(
+        "expected_q_delta_ci",
+        f"{_D}/yuanbao_python_20251003_WjTaCE.py",
+        inputs=_Q_INPUTS + _BLACK_Q,
+        optional=[f"{_D}/black/user_data_q.csv"],
+        outputs=[f"{_D}/{name}_{i}_with_ci.png" for i, name in enumerate(_TYPES)],
+    ),
+    Node(
+        "expected_q_delta",
+        f"{_D}/7.5.reset.py",
+        inputs=_Q_INPUTS + _BLACK_Q,
+        optional=[f"{_D}/black/user_data_q.csv"],
+        outputs=[f"{_D}/{name}_{i}.png" for i, name in enumerate(_TYPES)],
+    ),
+    Node(
+        "expected_q_all_types",
+        f"{_D}/expected_q_rb - 副本.py",
+        inputs=_Q_INPUTS + _BLACK_Q,
+        optional=[f"{_D}/black/user_data_q.csv"],
+        outputs=[f"{_D}/7.5.42.png"],
+    ),
+    Node(
+        "score_all_types",
+        f"{_D}/score_rb - 副本.py",
+        inputs=_SCORE_INPUTS + _BLACK_Q,
+        optional=[f"{_D}/black/user_data.csv"],
+        outputs=[f"{_D}/7.5.32.png"],
+    ),
+    Node(
+        "score_ci",
+        f"{_D}/score ci test.py",
+        inputs=_SCORE_INPUTS + _BLACK_Q,
+        optional=[f"{_D}/black/user_data.csv"],
+        outputs=[f"{_D}/all_types_score_comparison_{m}_ci.png" for m in ("bootstrap", "std")],
+    ),
+    Node(
+        "interpretation_figure",
+        "study_data/interpretation figure.py",
+        outputs=["study_data/interpretation.png"],
+    ),
+    Node(
+        "sim_reward_difference",
+        "supporting_sim_scores/0.25.py",
+        optional=["supporting_sim_scores/干预results2/*/*/run_*.csv"],
+        outputs=["supporting_sim_scores/analysis_results/"
+                 "all_settings_intervention_analysis_rate_0.25.png"],
+    ),
+    # ---- paper text and figures ----
+    Node(
+        "qvalue_frequency_report",
+        "analysis/reproduce_qvalue_frequency_analysis.py",
+        inputs=["study_data/user_data_q.csv", "study_data/user_data_action.csv"],
+    ),
+    Node(
+        "statistical_report",
+        "analysis/statistical_analysis.py",
+        inputs=["study_data/user_data_action.csv", "study_data/user_data.csv",
+                "study_data/user_data_q.csv", "study_data/user_data_try.csv",
+                "analysis/visits.py", "analysis/replay.py", "analysis/loaders.py",
+                "analysis/gridworld.py"],
+    ),
+    Node(
+        "hierarchical_weights",
+        "analysis/hierarchical.py",
+        inputs=[f"{_D}/{fld}/{f}" for fld in ("clean", "pilot")
+                for f in ("user_round_statistics.csv", "random.csv", "smooth.csv")]
+        + ["analysis/hypothesis_model.py", "analysis/loaders.py"],
+    ),
+    Node(
+        "parameter_recovery",
+        "analysis/recovery.py",
+        inputs=[f"{_D}/{fld}/{f}" for fld in ("clean", "pilot")
+                for f in ("user_round_statistics.csv", "random.csv", "smooth.csv")]
+        + ["analysis/hypothesis_model.py", "analysis/loaders.py",
+           "analysis/gridworld.py"],
+    ),
+    Node(
+        "hypothesis_cv",
+        "analysis/crossval.py",
+        inputs=[f"{_D}/{fld}/{f}" for fld in ("clean", "pilot")
+                for f in ("user_round_statistics.csv", "random.csv", "smooth.csv")]
+        + ["analysis/hypothesis_model.py", "analysis/loaders.py"],
+    ),
+    Node(
+        "occupancy",
+        "analysis/occupancy.py",
+        inputs=[f"{_D}/{f}/user_data_end_counts.csv" for f in ("clean", "pilot")]
+        + ["analysis/gridworld.py", "analysis/loaders.py", "analysis/tensors.py",
+           "analysis/curves.py"],
+        outputs=["analysis/figure_tables/occupancy.npz"],
+    ),
+    Node(
+        "paper_figs",
+        None,
+        inputs=[f"{_D}/7.5.32.png", f"{_D}/7.5.42.png"],
+        outputs=["figs/7.5.32.png", "figs/7.5.42.png"],
+    ),
+]
+
+
+# ----------- Hashing -----------
+class FileHasher:
+    """sha256 of file contents, memoised on (size, mtime_ns) between runs."""
+
+    def __init__(self, cache: dict):
+        self.cache = cache
+
+    def digest(self, rel_path: str) -> str:
+        path = ROOT_DIR / rel_path
+        st = path.stat()
+        key = f"{st.st_size}:{st.st_mtime_ns}"
+        cached = self.cache.get(rel_path)
+        if cached and cached[0] == key:
+            return cached[1]
+        h = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(HASH_CHUNK), b""):
+                h.update(chunk)
+        self.cache[rel_path] = [key, h.hexdigest()]
+        return h.hexdigest()
+
+
+def expand_optional(patterns: list[str]) -> list[str]:
+    files = []
+    for pattern in patterns:
+        matches = glob.glob(str(ROOT_DIR / pattern))
+        files.extend(sorted(os.path.relpath(m, ROOT_DIR) for m in matches))
+    return files
+
+
+def node_digest(node: Node, hasher: FileHasher) -> str:
+    h = hashlib.sha256()
+    h.update(repr((node.script, node.inputs, node.optional, node.outputs)).encode())
+    files = ([node.script] if node.script else []) + node.inputs + expand_optional(node.optional)
+    for rel_path in files:
+        h.update(rel_path.encode())
+        h.update(hasher.digest(rel_path).encode())
+    return h.hexdigest()
+
+
+# ----------- Graph -----------
+def build_graph(nodes: list[Node]) -> dict[str, set[str]]:
+    """Map node name -> names of the nodes producing its inputs."""
+    producer = {}
+    for node in nodes:
+        for out in node.outputs:
+            if out in producer:
+                raise ValueError(f"{out} is produced by both {producer[out]} and {node.name}")
+            producer[out] = node.name
+    deps = {}
+    for node in nodes:
+        wanted = node.inputs + expand_optional(node.optional)
+        deps[node.name] = {producer[f] for f in wanted if f in producer} - {node.name}
+    return deps
+
+
+def select(nodes: dict[str, Node], deps: dict[str, set[str]], targets: list[str]) -> list[str]:
+    """Targets plus everything upstream of them, in topological order."""
+    unknown = [t for t in targets if t not in nodes]
+    if unknown:
+        raise SystemExit(f"Unknown target(s): {', '.join(unknown)}")
+    order, seen, visiting = [], set(), set()
+
+    def visit(name):
+        if name in seen:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle through {name}")
+        visiting.add(name)
+        for dep in sorted(deps[name]):
+            visit(dep)
+        visiting.discard(name)
+        seen.add(name)
+        order.append(name)
+
+    for target in targets or list(nodes):
+        visit(target)
+    return order
+
+
+# ----------- Execution -----------
+def run_node(node: Node) -> tuple[bool, str]:
+    """Run one node; returns (ok, message)."""
+    if node.script is None:
+        for src, dst in zip(node.inputs, node.outputs):
+            os.makedirs(os.path.dirname(ROOT_DIR / dst), exist_ok=True)
+            shutil.copyfile(ROOT_DIR / src, ROOT_DIR / dst)
+        return True, "copied"
+
+    command = [sys.executable, str(ROOT_DIR / node.script)]
+    if profiling.enabled():
+        command.insert(1, str(ANALYSIS_DIR / "profiling.py"))
+
+    started = time.perf_counter()
+    proc = subprocess.run(
+        command,
+        cwd=ROOT_DIR / node.cwd,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    elapsed = time.perf_counter() - started
+    LOG_DIR.mkdir(exist_ok=True)
+    with open(LOG_DIR / f"{node.name}.log", "w", encoding="utf-8") as fh:
+        fh.write(proc.stdout)
+        if proc.stderr:
+            fh.write("\n--- stderr ---\n" + proc.stderr)
+
+    if proc.returncode != 0:
+        return False, f"exit code {proc.returncode} ({elapsed:.1f}s)"
+    # Several scripts swallow their exceptions, so check the outputs exist
+    missing = [out for out in node.outputs if not (ROOT_DIR / out).exists()]
+    if missing:
+        return False, f"did not produce {', '.join(missing)} ({elapsed:.1f}s)"
+    return True, f"{elapsed:.1f}s"
+
+
+def build(targets: list[str], jobs: int, force: bool, dry_run: bool) -> int:
+    nodes = {node.name: node for node in NODES}
+    deps = build_graph(NODES)
+    order = select(nodes, deps, targets)
+
+    state = json.loads(STATE_FILE.read_text()) if STATE_FILE.exists() else {}
+    hasher = FileHasher(state.setdefault("files", {}))
+    built = state.setdefault("nodes", {})
+
+    pending = {name: set(deps[name]) & set(order) for name in order}
+    status = {}
+    running = {}
+    digests = {}
+
+    def ready_nodes():
+        return [n for n, d in pending.items() if not d and n not in running]
+
+    def finish(name, result):
+        status[name] = result
+        del pending[name]
+        for other, other_deps in pending.items():
+            other_deps.discard(name)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while pending:
+            for name in ready_nodes():
+                node = nodes[name]
+                failed_up = [d for d in deps[name] if status.get(d) in ("failed", "blocked")]
+                if failed_up:
+                    print(f"[blocked] {name}: upstream {', '.join(failed_up)} failed")
+                    finish(name, "blocked")
+                    continue
+                missing = [f for f in node.inputs if not (ROOT_DIR / f).exists()]
+                stale_up = [d for d in deps[name] if status.get(d) == "stale"]
+                if missing and not stale_up:
+                    print(f"[blocked] {name}: missing {missing[0]}")
+                    finish(name, "blocked")
+                    continue
+                # In a dry run, anything downstream of a stale node is stale too
+                digest = None if stale_up else node_digest(node, hasher)
+                outputs_ok = all((ROOT_DIR / o).exists() for o in node.outputs)
+                if not force and outputs_ok and digest and built.get(name) == digest:
+                    print(f"[fresh]   {name}")
+                    finish(name, "fresh")
+                    continue
+                if dry_run:
+                    print(f"[stale]   {name}")
+                    finish(name, "stale")
+                    continue
+                print(f"[run]     {name}")
+                digests[name] = digest
+                running[name] = pool.submit(run_node, node)
+
+            if not running:
+                continue
+            done, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+            for name in [n for n, fut in running.items() if fut in done]:
+                ok, message = running.pop(name).result()
+                if ok:
+                    built[name] = digests[name]
+                    print(f"[done]    {name} ({message})")
+                    finish(name, "built")
+                else:
+                    built.pop(name, None)
+                    print(f"[failed]  {name}: {message}")
+                    finish(name, "failed")
+
+    if not dry_run:
+        STATE_FILE.write_text(json.dumps(state, indent=1, ensure_ascii=False))
+
+    counts = {}
+    for result in status.values():
+        counts[result] = counts.get(result, 0) + 1
+    print("\n" + ", ".join(f"{k}: {v}" for k, v in sorted(counts.items())))
+    return 1 if counts.get("failed") else 0
+
+
+def list_nodes() -> None:
+    deps = build_graph(NODES)
+    for node in NODES:
+        after = ", ".join(sorted(deps[node.name])) or "-"
+        print(f"{node.name:32s} <- {after}")
+        print(f"    script:  {node.script or '(copy)'}")
+        for out in node.outputs:
+            print(f"    output:  {out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("targets", nargs="*", help="node names (default: all)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--force", action="store_true", help="rebuild even if fresh")
+    parser.add_argument("--dry-run", action="store_true", help="report stale nodes only")
+    parser.add_argument("--list", action="store_true", help="print the declared graph")
+    args = parser.parse_args()
+
+    if args.list:
+        list_nodes()
+        return
+    sys.exit(build(args.targets, args.jobs, args.force, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
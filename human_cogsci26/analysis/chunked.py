@@ -0,0 +1,212 @@
+"""Out-of-core reductions of user_data_q.csv.
+
+The analyses read user_data_q.csv whole. For logs too large for memory,
+QAggregator streams the table in chunks and keeps only partial aggregates,
+whose size depends on the number of groups, not rows:
+
+    per user             count and sum of ExpectedQvalue -> mean
+    per (user, round)    last logged value, as groupby(...).last()
+    per time bin         count, sum and sum of squares -> mean and std,
+                         per (round, agent_id) by default
+
+Each chunk is reduced with one groupby and merged into the running
+aggregates (sums add up, later last values replace earlier ones). Counts
+and last values equal the in-memory groupbys exactly, whatever the chunk
+size; sums, means and stds differ only by float rounding (below 1e-10
+relative on the study tables):
+
+    python analysis/chunked.py --chunk-rows 100000 --check
+    python analysis/chunked.py --time-bin 5 --out-dir /tmp/q_aggregates
+"""
+
+import argparse
+import os
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from common import DATA_DIR
+from loaders import iter_study_table, read_study_tables
+
+USER_KEYS = ["data_source", "user_id"]
+VALUE = "ExpectedQvalue"
+CHUNK_ROWS = 500_000
+TIME_BIN = 0.5  # seconds; the logging period
+
+
+@dataclass
+class QSummary:
+    users: pd.DataFrame  # USER_KEYS -> count, sum, mean
+    last: pd.DataFrame  # last_by -> last
+    bins: pd.DataFrame  # bin_by + time_bin -> count, sum, sumsq, mean, std
+    rows: int = 0
+
+
+class QAggregator:
+    """Running aggregates of ExpectedQvalue over a stream of chunks."""
+
+    def __init__(
+        self, time_bin=TIME_BIN, bin_by=("round", "agent_id"), last_by=("round",)
+    ):
+        self.time_bin = time_bin
+        self.bin_keys = list(bin_by) + ["time_bin"]
+        self.last_keys = USER_KEYS + list(last_by)
+        self.rows = 0
+        self._users = None
+        self._last = None
+        self._bins = None
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        """Fold one chunk (rows in file order) into the aggregates."""
+        if "data_source" not in chunk.columns:
+            chunk = chunk.assign(data_source="")
+        value = chunk[VALUE].astype(float)
+        chunk = chunk.assign(
+            **{VALUE: value, "sq": value**2},
+            time_bin=np.floor(chunk["time"] / self.time_bin).astype(int),
+        )
+        self.rows += len(chunk)
+
+        users = chunk.groupby(USER_KEYS)[VALUE].agg(["count", "sum"])
+        last = chunk.groupby(self.last_keys)[VALUE].last()
+        bins = chunk.groupby(self.bin_keys).agg(
+            count=(VALUE, "count"), sum=(VALUE, "sum"), sumsq=("sq", "sum")
+        )
+        self._users = _merge(self._users, users, "sum")
+        self._last = _merge(self._last, last, "last")
+        self._bins = _merge(self._bins, bins, "sum")
+
+    def result(self) -> QSummary:
+        users = self._users.copy()
+        users["mean"] = users["sum"] / users["count"]
+        bins = self._bins.copy()
+        bins["mean"] = bins["sum"] / bins["count"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = (bins["sumsq"] - bins["sum"] ** 2 / bins["count"]) / (
+                bins["count"] - 1
+            )
+        bins["std"] = np.sqrt(var.clip(lower=0))
+        return QSummary(
+            users.reset_index(),
+            self._last.rename("last").reset_index(),
+            bins.reset_index(),
+            self.rows,
+        )
+
+
+def _merge(running, partial, how: str):
+    """Combine running aggregates with a chunk's; `partial` wins for "last"."""
+    if running is None:
+        return partial
+    both = pd.concat([running, partial])
+    grouped = both.groupby(level=list(range(both.index.nlevels)))
+    return grouped.last() if how == "last" else grouped.sum()
+
+
+def aggregate_q(chunks, **kwargs) -> QSummary:
+    """Aggregates of an iterable of user_data_q chunks."""
+    aggregator = QAggregator(**kwargs)
+    for chunk in chunks:
+        aggregator.add(chunk)
+    return aggregator.result()
+
+
+def stream_q(chunk_rows=CHUNK_ROWS, data_dir=DATA_DIR, **kwargs) -> QSummary:
+    """Aggregates of user_data_q.csv (clean + pilot, valid users), streamed."""
+    return aggregate_q(iter_study_table("user_data_q", chunk_rows, data_dir), **kwargs)
+
+
+def in_memory(
+    df: pd.DataFrame,
+    time_bin=TIME_BIN,
+    bin_by=("round", "agent_id"),
+    last_by=("round",),
+) -> QSummary:
+    """The same reductions as direct groupbys over the whole table."""
+    value = df[VALUE].astype(float)
+    df = df.assign(
+        **{VALUE: value, "sq": value**2},
+        time_bin=np.floor(df["time"] / time_bin).astype(int),
+    )
+    users = df.groupby(USER_KEYS)[VALUE].agg(["count", "sum", "mean"])
+    last = df.groupby(USER_KEYS + list(last_by))[VALUE].last()
+    bins = df.groupby(list(bin_by) + ["time_bin"]).agg(
+        count=(VALUE, "count"),
+        sum=(VALUE, "sum"),
+        sumsq=("sq", "sum"),
+        mean=(VALUE, "mean"),
+        std=(VALUE, "std"),
+    )
+    return QSummary(
+        users.reset_index(),
+        last.rename("last").reset_index(),
+        bins.reset_index(),
+        len(df),
+    )
+
+
+def compare(streamed: QSummary, reference: QSummary) -> dict[str, float]:
+    """Largest difference per table; counts and last values must be equal."""
+    out = {}
+    for name in ("users", "last", "bins"):
+        a, b = getattr(streamed, name), getattr(reference, name)
+        if len(a) != len(b):
+            raise AssertionError(f"{name}: {len(a)} vs {len(b)} groups")
+        values = [c for c in a.columns if a[c].dtype.kind == "f"]
+        keys = [c for c in a.columns if c not in values]
+        if not a[keys].equals(b[keys]):
+            raise AssertionError(f"{name}: group keys or counts differ")
+        diff = (a[values] - b[values]).abs().to_numpy()
+        out[name] = float(np.nanmax(diff)) if diff.size else 0.0
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument(
+        "--time-bin", type=float, default=TIME_BIN, help="time bin width (s)"
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="compare with the in-memory groupbys"
+    )
+    parser.add_argument("--out-dir", help="write users.csv, last.csv and bins.csv")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    summary = stream_q(args.chunk_rows, time_bin=args.time_bin)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{summary.rows:,} rows in chunks of {args.chunk_rows:,}: "
+        f"{seconds:.2f}s, peak {peak / 2**20:.1f} MB"
+    )
+    print(
+        f"{len(summary.users)} users, {len(summary.last)} (user, round) last "
+        f"values, {len(summary.bins)} time bins"
+    )
+
+    if args.check:
+        df = read_study_tables(["user_data_q"])["user_data_q"]
+        diffs = compare(summary, in_memory(df, args.time_bin))
+        listed = ", ".join(f"{name} {d:.3g}" for name, d in diffs.items())
+        print(f"Max difference from the in-memory groupbys: {listed}")
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+        for name in ("users", "last", "bins"):
+            getattr(summary, name).to_csv(
+                os.path.join(args.out_dir, f"{name}.csv"), index=False
+            )
+        print(f"Saved to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    profiling.rerun_profiled()
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""One command for the analysis scripts, with fast startup.
+
+Each subcommand runs the scripts of its build.py nodes in this process, as
+`python script` would. Nothing outside the standard library is imported
+until a script runs. As a result, `--help` and argument errors return in
+about 50 ms, and each command pays only for the libraries its scripts import:
+pandas for count and rates, scipy for likelihood and stats, and matplotlib or
+statsmodels only for figures. That cost still dominates: count and rates take
+about 0.5 s end to end, 0.35 s of it importing pandas in the study_data
+scripts, so they miss the 200 ms target for the whole command.
+
+Usage (from anywhere; paths are resolved like build.py's):
+    python analysis/cogsci26.py clean
+    python analysis/cogsci26.py split [clean|pilot]
+    python analysis/cogsci26.py count [study|pilot]
+    python analysis/cogsci26.py rates [--by-group] [--types]
+    python analysis/cogsci26.py likelihood [clean|pilot] [random|smooth] [--pooled]
+    python analysis/cogsci26.py likelihood --hierarchical
+    python analysis/cogsci26.py likelihood --cv
+    python analysis/cogsci26.py stats [--qvalue]
+    python analysis/cogsci26.py figures [compute|render|all] [figure] [--dpi N]
+    python analysis/cogsci26.py --timing count   # import and run time per script
+"""
+
+import argparse
+import os
+import runpy
+import sys
+import time
+
+from common import DATA_FOLDERS, LAYOUT_ROUNDS, ROOT_DIR
+
+LAYOUTS = tuple(LAYOUT_ROUNDS)
+COUNT_FOLDERS = ("study", "pilot")  # study_data/计数.py, data/pilot/计数.py
+# Scripts that are not build nodes: name -> (script, cwd)
+EXTRA_SCRIPTS = {"figure_pipeline": ("analysis/figure_pipeline.py", ".")}
+
+
+# ==================== Subcommand -> build nodes ====================
+
+
+def _clean_nodes(args) -> list[str]:
+    return ["clean_study"]
+
+
+def _folders(args, allowed) -> list[str]:
+    """The folders given on the command line (default: all of `allowed`).
+
+    Checked here rather than with choices=, which rejects an empty nargs="*".
+    """
+    unknown = [f for f in args.folders if f not in allowed]
+    if unknown:
+        raise SystemExit(
+            f"cogsci26 {args.command}: invalid folder {unknown[0]!r} "
+            f"(choose from {', '.join(allowed)})"
+        )
+    return args.folders or list(allowed)
+
+
+def _split_nodes(args) -> list[str]:
+    return [f"split_{folder}" for folder in _folders(args, DATA_FOLDERS)]
+
+
+def _count_nodes(args) -> list[str]:
+    return [f"count_{folder}" for folder in _folders(args, COUNT_FOLDERS)]
+
+
+def _rates_nodes(args) -> list[str]:
+    base = "intervention_type" if args.types else "intervention_rate"
+    return [f"{base}_by_group" if args.by_group else base]
+
+
+def _likelihood_nodes(args) -> list[str]:
+    if args.hierarchical:
+        return ["hierarchical_weights"]
+    if args.cv:
+        return ["hypothesis_cv"]
+    suffix = "" if args.pooled else "_user"
+    folders = [args.folder] if args.folder else DATA_FOLDERS
+    if args.pooled:
+        if args.folder not in (None, "pilot"):
+            raise SystemExit("cogsci26: --pooled fits exist for the pilot data only")
+        folders = ["pilot"]
+    layouts = [args.layout] if args.layout else LAYOUTS
+    return [f"likelihood_{f}_{layout}{suffix}" for f in folders for layout in layouts]
+
+
+def _stats_nodes(args) -> list[str]:
+    return ["qvalue_frequency_report" if args.qvalue else "statistical_report"]
+
+
+def _figures_nodes(args) -> list[str]:
+    return ["figure_pipeline"]
+
+
+def _figures_argv(args) -> list[str]:
+    return [args.stage, args.figure, "--dpi", str(args.dpi)]
+
+
+# ==================== CLI ====================
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="cogsci26", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument(
+        "--timing", action="store_true", help="report import and run time per script"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("clean", help="keep the valid users (study_data/clean)")
+    cmd.set_defaults(nodes=_clean_nodes)
+
+    cmd = commands.add_parser("split", help="split drags into random/smooth rounds")
+    cmd.add_argument("folders", nargs="*", metavar="{%s}" % ",".join(DATA_FOLDERS))
+    cmd.set_defaults(nodes=_split_nodes)
+
+    cmd = commands.add_parser("count", help="drags per user and round")
+    cmd.add_argument("folders", nargs="*", metavar="{%s}" % ",".join(COUNT_FOLDERS))
+    cmd.set_defaults(nodes=_count_nodes)
+
+    cmd = commands.add_parser("rates", help="intervention rates or categories")
+    cmd.add_argument(
+        "--by-group", action="store_true", help="per frequency group and setting"
+    )
+    cmd.add_argument(
+        "--types", action="store_true", help="acceleration/correction/restart shares"
+    )
+    cmd.set_defaults(nodes=_rates_nodes)
+
+    cmd = commands.add_parser("likelihood", help="H1-H4 hypothesis fits")
+    cmd.add_argument("folder", nargs="?", choices=DATA_FOLDERS)
+    cmd.add_argument("layout", nargs="?", choices=LAYOUTS)
+    cmd.add_argument(
+        "--pooled", action="store_true", help="one fit over all users (pilot only)"
+    )
+    cmd.add_argument(
+        "--hierarchical",
+        action="store_true",
+        help="empirical-Bayes weights of all users (hierarchical.py)",
+    )
+    cmd.add_argument(
+        "--cv", action="store_true", help="leave-one-round-out winners (crossval.py)"
+    )
+    cmd.set_defaults(nodes=_likelihood_nodes)
+
+    cmd = commands.add_parser("stats", help="statistical report of the paper claims")
+    cmd.add_argument(
+        "--qvalue", action="store_true", help="Q-value x frequency analysis only"
+    )
+    cmd.set_defaults(nodes=_stats_nodes)
+
+    cmd = commands.add_parser("figures", help="expected-Q figure pipeline")
+    cmd.add_argument("stage", nargs="?", default="all")
+    cmd.add_argument("figure", nargs="?", default="all")
+    cmd.add_argument("--dpi", type=int, default=300)
+    cmd.set_defaults(nodes=_figures_nodes, argv=_figures_argv)
+    return parser
+
+
+def resolve_scripts(names: list[str]) -> list[tuple[str, str]]:
+    """(script, cwd) of each build node or extra script, relative to ROOT_DIR."""
+    from build import NODES  # standard library only
+
+    nodes = {node.name: (node.script, node.cwd) for node in NODES}
+    nodes.update(EXTRA_SCRIPTS)
+    return [nodes[name] for name in names]
+
+
+def run_script(script: str, argv: list[str], cwd: str = ".") -> int:
+    """Execute `script` as __main__ (like `python script ...`); its exit code."""
+    path = ROOT_DIR / script
+    old_argv, old_path0, old_cwd = sys.argv, sys.path[0], os.getcwd()
+    sys.argv = [str(path)] + argv
+    sys.path[0] = str(path.parent)
+    os.chdir(ROOT_DIR / cwd)
+    try:
+        runpy.run_path(str(path), run_name="__main__")
+    except SystemExit as exc:
+        if isinstance(exc.code, int) or exc.code is None:
+            return exc.code or 0
+        print(exc.code, file=sys.stderr)
+        return 1
+    finally:
+        sys.argv, sys.path[0] = old_argv, old_path0
+        os.chdir(old_cwd)
+    return 0
+
+
+def main(argv=None) -> int:
+    started = time.perf_counter()
+    args = build_parser().parse_args(argv)
+    argv_of = getattr(args, "argv", lambda args: [])
+    scripts = resolve_scripts(args.nodes(args))
+    if args.timing:
+        print(f"[cogsci26] ready in {time.perf_counter() - started:.3f}s", flush=True)
+
+    status = 0
+    for script, cwd in scripts:
+        before = set(sys.modules)
+        t = time.perf_counter()
+        status = run_script(script, argv_of(args), cwd) or status
+        if args.timing:
+            print(
+                f"[cogsci26] {script}: {time.perf_counter() - t:.2f}s, "
+                f"{len(set(sys.modules) - before)} modules imported",
+                flush=True,
+            )
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
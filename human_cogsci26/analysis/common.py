@@ -0,0 +1,77 @@
+"""Shared constants and helpers for the CogSci 2026 analysis modules.
+
+Paths are resolved relative to this file so the modules work regardless of
+the current working directory.
+"""
+
+from pathlib import Path
+
+ANALYSIS_DIR = Path(__file__).resolve().parent
+ROOT_DIR = ANALYSIS_DIR.parent
+STUDY_DIR = ROOT_DIR / "study_data"
+DATA_DIR = STUDY_DIR / "data"
+# Pretrained Q-tables bundled with the frontend (MyMap JSON)
+POLICY_DIR = ROOT_DIR.parent / "src" / "policy"
+
+# Folders under study_data/data holding the participant tables
+DATA_FOLDERS = ("clean", "pilot")
+
+# Interpretation types mapping (HumIntInterp in QLearningAgent2.ts)
+INTERPRETATION_TYPES = {
+    0: "SUGGESTION",
+    1: "RESET",
+    2: "INTERRUPT",
+    3: "TRANSITION",
+    4: "DISRUPT",
+    5: "IMPEDE",
+}
+
+# Rounds played in each experimental setting
+SETTINGS = {
+    1: [2, 3],
+    2: [4, 5],
+    3: [6, 7],
+    4: [8, 9],
+}
+
+# Rounds played on each pellet layout
+LAYOUT_ROUNDS = {
+    "random": [2, 3, 6, 7],
+    "smooth": [4, 5, 8, 9],
+}
+
+GRID_SIZE = 8
+
+# Pellet tiles (x, y) of each layout, as in the likelihood scripts
+PELLET_TILES = {
+    "random": [
+        (0, 1), (7, 0), (3, 1), (1, 4), (7, 4), (2, 0), (7, 7),
+        (7, 3), (4, 0), (2, 7), (4, 1), (4, 3), (4, 7),
+    ],
+    "smooth": [
+        (2, 2), (1, 2), (2, 1), (2, 3), (3, 2), (1, 1), (1, 3), (3, 1), (3, 3),
+        (5, 5), (4, 5), (5, 4), (5, 6), (6, 5), (4, 4), (4, 6), (6, 4), (6, 6),
+    ],
+}
+
+SETTING_TITLES = {
+    1: "One agent Random env",
+    2: "One agent Smooth env",
+    3: "Two agents Random env",
+    4: "Two agents Smooth env",
+}
+
+
+def layout_of(round_id: int) -> str:
+    """Pellet layout of a round; the practice round uses the random one."""
+    return "smooth" if round_id in LAYOUT_ROUNDS["smooth"] else "random"
+
+
+def get_interpret_type(user_id: int) -> int:
+    """Get interpretation type from user_id using (user_id - 1) % 6"""
+    return (int(user_id) - 1) % 6
+
+
+def get_type_name(itype: int) -> str:
+    """Human-readable name of an interpretation type."""
+    return INTERPRETATION_TYPES.get(itype, f"TYPE_{itype}")
@@ -0,0 +1,250 @@
+"""Dense counting kernels for per-(user, round) tallies.
+
+Labels (user ids, rounds, categories) are mapped to dense integer codes and
+all cells are counted with one np.bincount over row * n_cols + col. Cells
+with no rows stay 0, so every user of the table gets every round:
+
+    users, rounds, counts = count_matrix(df["user_id"], df["round"], ROUNDS)
+    round_counts(actions)    # user_round_counts_detailed.csv layout
+    type_counts(user_ids)    # users per interpretation type
+
+RateCube holds the numerator (non-optimal interventions) and denominator
+(non-optimal tries) of the intervention rate for every user and round, from
+one bincount over both tables. A grouping of users and rounds (world,
+setting, frequency group) is then a product with membership matrices:
+
+    cube = read_rate_cube()
+    cube.table(rounds=LAYOUT_ROUNDS)      # one row per layout
+
+CategoryCube does the same for the acceleration / correction / restart
+category of each drag.
+
+study_data/计数.py, study_data/data/id.py and the intervention rate and type
+scripts use these kernels.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from common import DATA_DIR, INTERPRETATION_TYPES
+from loaders import read_study_tables
+
+ROUNDS = np.arange(2, 10)  # rounds with interventions; round 1 is practice
+USER_KEYS = ["data_source", "user_id"]
+
+
+def dense_codes(values, labels=None) -> tuple[np.ndarray, np.ndarray]:
+    """(labels, codes) with values == labels[codes]; code -1 if not in labels.
+
+    Without labels, they are the sorted distinct non-missing values.
+    """
+    if labels is None:
+        codes, labels = pd.factorize(pd.Series(values), sort=True)
+        return np.asarray(labels), codes
+    labels = np.asarray(labels)
+    return labels, pd.Index(labels).get_indexer(values)
+
+
+def count_matrix(
+    rows, cols, col_labels=None, row_labels=None, weights=None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(row_labels, col_labels, counts) of the (row, col) pairs.
+
+    counts[i, j] is the number (or total weight) of pairs labelled
+    (row_labels[i], col_labels[j]); pairs outside the labels are dropped.
+    """
+    row_labels, r = dense_codes(rows, row_labels)
+    col_labels, c = dense_codes(cols, col_labels)
+    keep = (r >= 0) & (c >= 0)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)[keep]
+    size = len(row_labels) * len(col_labels)
+    flat = np.bincount(
+        r[keep] * len(col_labels) + c[keep], weights=weights, minlength=size
+    )
+    if weights is None:
+        flat = flat.astype(np.int64)
+    return row_labels, col_labels, flat.reshape(len(row_labels), len(col_labels))
+
+
+def round_counts(actions: pd.DataFrame, rounds=ROUNDS) -> pd.DataFrame:
+    """Rows per user and round: user_id, round_2 ... round_9.
+
+    Every user of `actions` gets a row, even with no rows in `rounds`.
+    """
+    users, rounds, counts = count_matrix(actions["user_id"], actions["round"], rounds)
+    table = pd.DataFrame(counts, columns=[f"round_{r}" for r in rounds])
+    table.insert(0, "user_id", users)
+    return table
+
+
+def type_counts(user_ids) -> pd.Series:
+    """Users per interpretation type, 0-5 in order (missing types are 0)."""
+    types = (np.asarray(user_ids, dtype=np.int64) - 1) % len(INTERPRETATION_TYPES)
+    return pd.Series(
+        np.bincount(types, minlength=len(INTERPRETATION_TYPES)),
+        index=pd.RangeIndex(len(INTERPRETATION_TYPES)),
+    )
+
+
+# ==================== User x round cubes ====================
+
+
+def _memberships(labels, groups) -> tuple[list, np.ndarray]:
+    """(names, (len(labels), n_groups) 0/1 matrix) of a grouping.
+
+    `groups` maps each name to the labels it contains; None is one group
+    holding every label.
+    """
+    if groups is None:
+        return ["all"], np.ones((len(labels), 1), dtype=np.int64)
+    members = np.zeros((len(labels), len(groups)), dtype=np.int64)
+    for j, group in enumerate(groups.values()):
+        members[:, j] = np.isin(labels, list(group))
+    return list(groups), members
+
+
+def _user_round_codes(rows: pd.DataFrame):
+    """(users, rounds, user codes, round codes) of a table's rows.
+
+    Users are (data_source, user_id) pairs; tables without data_source get "".
+    """
+    if "data_source" not in rows.columns:
+        rows = rows.assign(data_source="")
+    users = rows[USER_KEYS].drop_duplicates().sort_values(USER_KEYS)
+    users = users.reset_index(drop=True)
+    u = pd.MultiIndex.from_frame(users).get_indexer(
+        pd.MultiIndex.from_frame(rows[USER_KEYS])
+    )
+    rounds = np.sort(rows["round"].unique())
+    return users, rounds, u, np.searchsorted(rounds, rows["round"].to_numpy())
+
+
+@dataclass
+class _UserRoundCube:
+    users: pd.DataFrame  # data_source, user_id per user row
+    rounds: np.ndarray
+
+    def user_rows(self, user_ids, data_source=None) -> np.ndarray:
+        """User-axis positions of the given ids, in one folder or in all."""
+        hit = self.users["user_id"].isin(np.asarray(user_ids))
+        if data_source is not None:
+            hit &= self.users["data_source"] == data_source
+        return np.flatnonzero(hit.to_numpy())
+
+    def _group_sums(self, cells: np.ndarray, users=None, rounds=None):
+        """Sums of (users, rounds, k) cells over every (user group, round group).
+
+        `users` maps group names to lists of user rows (positions on the user
+        axis), `rounds` group names to lists of round ids; None is one group
+        of everything. Returns (row index, (groups, k) sums).
+        """
+        user_names, user_members = _memberships(np.arange(len(self.users)), users)
+        round_names, round_members = _memberships(self.rounds, rounds)
+        sums = np.einsum("ug,urk,rh->ghk", user_members, cells, round_members)
+        index = pd.MultiIndex.from_product(
+            [user_names, round_names], names=["users", "rounds"]
+        )
+        return index, sums.reshape(len(index), -1)
+
+
+def _percent(numerator, denominator) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominator > 0, numerator / denominator * 100, 0.0)
+
+
+@dataclass
+class RateCube(_UserRoundCube):
+    """Intervention rate: non-optimal drags over non-optimal tries."""
+
+    interventions: np.ndarray = None  # (users, rounds) drags on non-optimal moves
+    needed: np.ndarray = None  # (users, rounds) non-optimal tries
+
+    @classmethod
+    def from_tables(cls, actions: pd.DataFrame, tries: pd.DataFrame) -> "RateCube":
+        columns = ["round", "is_optimal"] + [c for c in USER_KEYS if c in actions]
+        rows = pd.concat(
+            [actions[columns].assign(table=0), tries[columns].assign(table=1)],
+            ignore_index=True,
+        )
+        users, rounds, u, r = _user_round_codes(rows)
+        cell = np.where(rows["is_optimal"].to_numpy() == 0, r * 2 + rows["table"], -1)
+        _, _, counts = count_matrix(
+            u, cell, np.arange(len(rounds) * 2), np.arange(len(users))
+        )
+        counts = counts.reshape(len(users), len(rounds), 2)
+        return cls(users, rounds, counts[..., 0], counts[..., 1])
+
+    def table(self, users=None, rounds=None) -> pd.DataFrame:
+        """Numerator, denominator and rate (%) per (user group, round group)."""
+        cells = np.stack([self.interventions, self.needed], axis=-1)
+        index, sums = self._group_sums(cells, users, rounds)
+        return pd.DataFrame(
+            {
+                "numerator": sums[:, 0],
+                "denominator": sums[:, 1],
+                "intervention_rate": _percent(sums[:, 0], sums[:, 1]),
+            },
+            index=index,
+        )
+
+
+def read_rate_cube(data_dir=DATA_DIR) -> RateCube:
+    """Rate cube of clean + pilot (valid users)."""
+    tables = read_study_tables(["user_data_action", "user_data_try"], data_dir)
+    return RateCube.from_tables(tables["user_data_action"], tables["user_data_try"])
+
+
+# Intervention categories of a drag, by the dragged move
+CATEGORIES = ("acceleration", "correction", "restart")
+
+
+def intervention_categories(actions: pd.DataFrame) -> np.ndarray:
+    """Category code of each drag, -1 if none applies.
+
+    correction: is_optimal = 0; acceleration: is_optimal = 1 and
+    expected_q_value = 0; restart: is_optimal = 1 otherwise.
+    """
+    optimal = actions["is_optimal"].to_numpy()
+    zero_q = actions["expected_q_value"].to_numpy() == 0
+    return np.select(
+        [optimal == 0, (optimal == 1) & zero_q, optimal == 1],
+        [CATEGORIES.index(c) for c in ("correction", "acceleration", "restart")],
+        -1,
+    )
+
+
+@dataclass
+class CategoryCube(_UserRoundCube):
+    """Drags per user, round and intervention category."""
+
+    counts: np.ndarray = None  # (users, rounds, categories + 1); last: none
+
+    @classmethod
+    def from_actions(cls, actions: pd.DataFrame) -> "CategoryCube":
+        users, rounds, u, r = _user_round_codes(actions)
+        k = len(CATEGORIES) + 1
+        category = intervention_categories(actions)
+        cell = r * k + np.where(category >= 0, category, k - 1)
+        _, _, counts = count_matrix(
+            u, cell, np.arange(len(rounds) * k), np.arange(len(users))
+        )
+        return cls(users, rounds, counts.reshape(len(users), len(rounds), k))
+
+    def table(self, users=None, rounds=None) -> pd.DataFrame:
+        """Drags, per-category counts and shares (%) per group pair."""
+        index, sums = self._group_sums(self.counts, users, rounds)
+        total = sums.sum(axis=1)
+        table = pd.DataFrame({"total": total}, index=index)
+        for j, name in enumerate(CATEGORIES):
+            table[name] = sums[:, j]
+            table[f"{name}_rate"] = _percent(sums[:, j], total)
+        return table
+
+
+def read_category_cube(data_dir=DATA_DIR) -> CategoryCube:
+    """Category cube of clean + pilot (valid users)."""
+    actions = read_study_tables(["user_data_action"], data_dir)["user_data_action"]
+    return CategoryCube.from_actions(actions)
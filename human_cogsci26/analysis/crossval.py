@@ -0,0 +1,186 @@
+"""Cross-validated comparison of the H1-H4 hypotheses for each participant.
+
+analyze_user_data picks the hypothesis with the largest in-sample
+likelihood at its fitted lambda. That favours hypotheses whose S_H covers
+more tiles, since they catch more targets by chance. Here each participant's
+drags are split into folds. lambda is fitted on all but one fold
+(fit_lambdas) and the held-out fold is scored (log_likelihoods). The CV
+winner has the largest held-out log-likelihood summed over the folds:
+
+    rounds   leave one round out (the four rounds of a layout)
+    k        --folds random folds of each participant's drags
+
+Participants are split into chunks that are scored in a process pool
+(--jobs). Within a chunk, each fold is one batched fit over all its users.
+
+    python analysis/crossval.py                          # leave-one-round-out
+    python analysis/crossval.py --scheme k --folds 10 --jobs 4 --out cv.csv
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from common import PELLET_TILES
+from hypothesis_model import (
+    HYPOTHESES,
+    fit_lambdas,
+    hypothesis_probabilities,
+    log_likelihoods,
+)
+from loaders import read_study_tables
+
+USER_KEYS = ["data_source", "user_id"]
+SCHEMES = ("rounds", "k")
+DEFAULT_FOLDS = 5
+
+
+def assign_folds(drags: pd.DataFrame, users, scheme="rounds", k=DEFAULT_FOLDS, seed=0):
+    """Fold (0 .. n_folds - 1) of each drag.
+
+    "rounds" uses the round; "k" deals a random permutation of each user's
+    drags to k folds in turn, so fold sizes differ by at most one.
+    """
+    if scheme == "rounds":
+        return np.unique(drags["round"].to_numpy(), return_inverse=True)[1]
+    if scheme != "k":
+        raise ValueError(f"Unknown scheme: {scheme}")
+    users = np.asarray(users)
+    order = np.lexsort((np.random.default_rng(seed).random(len(users)), users))
+    sorted_users = users[order]
+    rank = np.empty(len(users), dtype=int)
+    rank[order] = np.arange(len(users)) - np.searchsorted(sorted_users, sorted_users)
+    return rank % k
+
+
+def cross_validate(probs, users, folds, n_users) -> np.ndarray:
+    """(users, hypotheses) held-out log-likelihood, summed over the folds."""
+    total = np.zeros((n_users, probs.shape[1]))
+    for fold in np.unique(folds):
+        test = folds == fold
+        lam, _ = fit_lambdas(probs[~test], users[~test], n_users)
+        total += log_likelihoods(lam, probs[test], users[test], n_users)
+    return total
+
+
+def _score_chunk(probs, users, folds, n_users):
+    """(held-out, in-sample) log-likelihoods of one chunk of users."""
+    _, in_sample = fit_lambdas(probs, users, n_users)
+    return cross_validate(probs, users, folds, n_users), in_sample
+
+
+def score_users(probs, users, folds, n_users, jobs=1):
+    """_score_chunk over all users, in `jobs` worker processes.
+
+    Users are split into contiguous chunks of user rows, one per job.
+    """
+    users = np.asarray(users)
+    if jobs <= 1:
+        return _score_chunk(probs, users, folds, n_users)
+    chunks = [c for c in np.array_split(np.arange(n_users), jobs) if len(c)]
+    with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+        futures = []
+        for chunk in chunks:
+            rows = (users >= chunk[0]) & (users <= chunk[-1])
+            futures.append(
+                pool.submit(
+                    _score_chunk,
+                    probs[rows],
+                    users[rows] - chunk[0],
+                    folds[rows],
+                    len(chunk),
+                )
+            )
+        parts = [f.result() for f in futures]
+    return tuple(np.concatenate([p[i] for p in parts]) for i in range(2))
+
+
+def cv_table(
+    drags: pd.DataFrame, pellet_tiles, scheme="rounds", k=DEFAULT_FOLDS, jobs=1, seed=0
+) -> pd.DataFrame:
+    """Per user: drags, folds, in-sample and CV winners, held-out log-likelihoods.
+
+    cv_best is empty when every hypothesis scores the same held-out
+    log-likelihood (e.g. all of a user's drags fall in one round).
+    """
+    if "data_source" not in drags.columns:
+        drags = drags.assign(data_source="")
+    codes, keys = pd.MultiIndex.from_frame(drags[USER_KEYS]).factorize(sort=True)
+    n_users = len(keys)
+    probs = hypothesis_probabilities(
+        drags[["agent_ini_pos_x", "agent_ini_pos_y"]].values,
+        drags[["agent_end_pos_x", "agent_end_pos_y"]].values,
+        pellet_tiles,
+    )
+    folds = assign_folds(drags, codes, scheme, k, seed)
+    held_out, in_sample = score_users(probs, codes, folds, n_users, jobs)
+
+    table = keys.to_frame(index=False, name=USER_KEYS)
+    table["n_drags"] = np.bincount(codes, minlength=n_users)
+    pairs = np.unique(np.column_stack([codes, folds]), axis=0)
+    table["n_folds"] = np.bincount(pairs[:, 0], minlength=n_users)
+    names = np.array(HYPOTHESES)
+    table["in_sample_best"] = names[in_sample.argmax(axis=1)]
+    tied = np.ptp(held_out, axis=1) == 0
+    table["cv_best"] = np.where(tied, "", names[held_out.argmax(axis=1)])
+    for j, hypo in enumerate(HYPOTHESES):
+        table[f"cv_ll_{hypo}"] = held_out[:, j]
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scheme", choices=SCHEMES, default="rounds")
+    parser.add_argument(
+        "--folds", type=int, default=DEFAULT_FOLDS, help="folds of the k scheme"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--layout", choices=list(PELLET_TILES), help="one layout (default: both)"
+    )
+    parser.add_argument("--out", help="write the per-user table (CSV)")
+    args = parser.parse_args()
+
+    layouts = [args.layout] if args.layout else list(PELLET_TILES)
+    tables = read_study_tables(layouts)
+    results = []
+    for layout in layouts:
+        start = time.perf_counter()
+        table = cv_table(
+            tables[layout],
+            PELLET_TILES[layout],
+            args.scheme,
+            args.folds,
+            args.jobs,
+            args.seed,
+        )
+        seconds = time.perf_counter() - start
+        scored = table[table["cv_best"] != ""]
+        agree = (scored["cv_best"] == scored["in_sample_best"]).mean()
+        print(
+            f"\n[{layout}] {len(table)} users, {args.scheme} scheme, "
+            f"{args.jobs} job(s): {seconds:.2f}s"
+        )
+        print(
+            f"CV winner = in-sample winner for {agree:.1%} of {len(scored)} users"
+            f" ({len(table) - len(scored)} tied, e.g. all drags in one fold)"
+        )
+        print(pd.crosstab(scored["in_sample_best"], scored["cv_best"]))
+        results.append(table.assign(layout=layout))
+
+    if args.out:
+        pd.concat(results, ignore_index=True).to_csv(args.out, index=False)
+        print(f"\nSaved to {args.out}")
+
+
+if __name__ == "__main__":
+    profiling.rerun_profiled()
+    main()
@@ -0,0 +1,137 @@
+"""LOWESS curves, bootstrap bands and top/low agent grouping.
+
+These are the statistics behind the expected-Q figures, lifted out of
+study_data/data/expected_q.py and yuanbao_python_20251003_WjTaCE.py so the
+figure pipeline and the benchmarks share one implementation. Defaults
+(frac=0.3, it=3, 1000 iterations, seed 42) match the original scripts.
+"""
+
+import numpy as np
+import pandas as pd
+from statsmodels.nonparametric.smoothers_lowess import lowess
+
+FRAC = 0.3
+BOOTSTRAP_ITERATIONS = 1000
+CI_ALPHA = 0.05
+CI_GRID_POINTS = 100
+
+
+def lowess_line(x: np.ndarray, y: np.ndarray, frac: float = FRAC):
+    """LOWESS fit of y on x after dropping NaNs; returns (x_sm, y_sm)."""
+    mask = ~np.isnan(x) & ~np.isnan(y)
+    if not mask.any():
+        return np.array([]), np.array([])
+    x_clean, y_clean = x[mask], y[mask]
+    order = np.argsort(x_clean)
+    smoothed = lowess(y_clean[order], x_clean[order], frac=frac, it=3)
+    return smoothed[:, 0], smoothed[:, 1]
+
+
+def eval_at_100(x: np.ndarray, y: np.ndarray) -> float:
+    """Value of the LOWESS curve at t = 100 (NaN outside the fitted range)."""
+    x_sm, y_sm = lowess_line(x, y)
+    if not x_sm.size:
+        return np.nan
+    return np.interp(100, x_sm, y_sm, left=np.nan, right=np.nan)
+
+
+def bootstrap_ci(
+    x: np.ndarray,
+    y: np.ndarray,
+    n_iterations: int = BOOTSTRAP_ITERATIONS,
+    alpha: float = CI_ALPHA,
+    random_state: int = 42,
+):
+    """Bootstrap confidence band of the LOWESS curve.
+
+    Returns (x_grid, lower_ci, upper_ci) on a 100-point grid spanning x.
+    Resamples with fewer than 11 valid points leave their row at zero, as in
+    the original script.
+    """
+    if len(x) == 0 or len(y) == 0:
+        return np.array([]), np.array([]), np.array([])
+
+    x_grid = np.linspace(np.min(x), np.max(x), CI_GRID_POINTS)
+    bootstrap_fits = np.zeros((n_iterations, len(x_grid)))
+
+    np.random.seed(random_state)
+    indices = np.arange(len(x))
+
+    for i in range(n_iterations):
+        sample_indices = np.random.choice(indices, size=len(indices), replace=True)
+        x_sample = x[sample_indices]
+        y_sample = y[sample_indices]
+
+        mask = ~np.isnan(x_sample) & ~np.isnan(y_sample)
+        x_clean, y_clean = x_sample[mask], y_sample[mask]
+
+        if len(x_clean) > 10:
+            order = np.argsort(x_clean)
+            smoothed = lowess(y_clean[order], x_clean[order], frac=FRAC, it=3)
+            if len(smoothed) > 0:
+                bootstrap_fits[i, :] = np.interp(
+                    x_grid, smoothed[:, 0], smoothed[:, 1], left=np.nan, right=np.nan
+                )
+
+    lower_ci = np.nanpercentile(bootstrap_fits, 100 * alpha / 2, axis=0)
+    upper_ci = np.nanpercentile(bootstrap_fits, 100 * (1 - alpha / 2), axis=0)
+    return x_grid, lower_ci, upper_ci
+
+
+def lowess_with_ci(x: np.ndarray, y: np.ndarray):
+    """LOWESS curve plus its bootstrap band: (x_sm, y_sm, x_ci, lower, upper)."""
+    x_sm, y_sm = lowess_line(x, y)
+    x_ci, lower_ci, upper_ci = bootstrap_ci(x, y)
+    return x_sm, y_sm, x_ci, lower_ci, upper_ci
+
+
+def delta_line(xs: np.ndarray, ys: np.ndarray, base_x: np.ndarray, base_y: np.ndarray):
+    """Subtract a baseline curve (interpolated onto xs) from ys."""
+    if base_x.size == 0:
+        return xs, ys
+    return xs, ys - np.interp(xs, base_x, base_y, left=np.nan, right=np.nan)
+
+
+def build_top_low(df: pd.DataFrame, rounds: list[int]) -> pd.DataFrame:
+    """Label each (user, round) agent as 'top' or 'low' by its curve at t=100.
+
+    Keeps agents 0 and 1 of the given rounds; the agent whose LOWESS curve is
+    highest at t = 100 is 'top', the other 'low'.
+    """
+    sub = df[df["round"].isin(rounds) & df["agent_id"].isin([0, 1])].copy()
+    score = (
+        sub.groupby(["user_id", "round", "agent_id"])
+        .apply(lambda g: eval_at_100(g["time"].values, g["ExpectedQvalue"].values))
+        .reset_index(name="score")
+    )
+    best = (
+        score.sort_values("score")
+        .drop_duplicates(["user_id", "round"], keep="last")
+        .assign(group="top")
+    )
+    best["agent_id_best"] = best["agent_id"]
+    sub = sub.merge(
+        best[["user_id", "round", "agent_id_best", "group"]],
+        on=["user_id", "round"],
+        how="left",
+    )
+    sub["group"] = np.where(sub["agent_id"] == sub["agent_id_best"], "top", "low")
+    return sub.drop(columns="agent_id_best")
+
+
+def black_top_low(df: pd.DataFrame) -> pd.DataFrame:
+    """Top/low labelling for simulated no-intervention runs (keyed by run_id)."""
+    score = (
+        df.groupby(["run_id", "agentid"])
+        .apply(lambda g: eval_at_100(g["time"].values, g["ExpectedQvalue"].values))
+        .reset_index(name="score")
+    )
+    best = (
+        score.sort_values("score")
+        .drop_duplicates(["run_id"], keep="last")
+        .assign(group="top")
+    )
+    best["agentid_best"] = best["agentid"]
+    df = df.merge(best[["run_id", "agentid_best", "group"]], on="run_id", how="left")
+    df["group"] = np.where(df["agentid"] == df["agentid_best"], "top", "low")
+    return df.drop(columns="agentid_best")
@@ -0,0 +1,587 @@
+"""Discrete-event simulation of experiment rounds at the browser's timings.
+
+Each round runs on simulated time with the frontend's clocks:
+
+    self move      WAIT_TIME, then round(1000 * MOVE_TIME / RFH_TIME) + 1
+                   animation frames of RFH_TIME (2.04 s)
+    pellets        exponential gaps -log(u) * EXPECTED_PELLET_TIME on the
+                   layout's pellet tiles
+    drags          mouse-down some time into a move the teacher objects to,
+                   mouse-up after a `duration` drawn from user_data_action.csv;
+                   no agent starts a move while one is dragged
+    samples        ExpectedQvalue (simulateActions) and the scores every
+                   0.5 s up to 100 s
+
+so the logs come out in the user_data_q.csv and user_data.csv schemas.
+
+Rounds are simulated in batches. Every round keeps an event calendar of its
+next move end per agent, mouse-down and mouse-up, and each pass pops the
+earliest event of every round at once (argmin over the calendar), so one
+array operation advances the whole batch. Pellet arrivals are drawn up
+front and counted lazily when an agent lands. ExpectedQvalue only changes
+when an update changes a greedy move. At those events the policy move of
+the updated tile is redrawn, the walk values are recomputed, and the
+result is read off the 0.5 s grid at the end.
+
+Throughput on one core, in batches of BATCH_ROUNDS: about 1,900 one-agent
+rounds/s and 750 two-agent rounds/s. The ceiling is the ExpectedQvalue
+walk (SIM_STEPS gathers per refresh, about 60% of a two-agent round).
+
+    python analysis/event_sim.py --users 1000 --rounds 2,6 [--out-dir DIR]
+"""
+
+import argparse
+import os
+import time
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from common import get_interpret_type, layout_of
+from gridworld import (
+    AGENT_EPS,
+    EXPECTED_PELLET_TIME,
+    MOVE_TIME,
+    N_ACTIONS,
+    N_STATES,
+    NOMOVE,
+    PELLET_FEEDBACK,
+    Q_INIT,
+    UP,
+    pellet_grid,
+    td_update,
+)
+from loaders import read_study_tables
+from pretrain import NEXT, SIDE_TILES, VALID
+from replay import EXPECTED, LAYOUTS, TEACHER_OPTIMAL, _drag_updates
+
+RFH_TIME = 0.06  # seconds per animation frame
+WAIT_TIME = 0.0
+SELF_MOVE_SECONDS = (round(MOVE_TIME / RFH_TIME) + 1) * RFH_TIME
+ROUND_SECONDS = 100.0
+SAMPLE_PERIOD = 0.5
+SIM_LOOPS = 100  # simulateActions: random starts ...
+SIM_STEPS = 30  # ... of this many greedy steps
+TEACH_EPS = 1.0
+TWO_AGENT_ROUNDS = (6, 7, 8, 9)
+BATCH_ROUNDS = 4000
+
+Q_COLUMNS = ["agent_id", "time", "user_id", "round", "ExpectedQvalue"]
+SCORE_COLUMNS = ["score", "agent_id", "time", "user_id", "round"]
+
+
+# ==================== Timing ====================
+
+
+@lru_cache(maxsize=None)
+def study_durations() -> np.ndarray:
+    """Drag durations (seconds) of every logged drag in clean + pilot."""
+    actions = read_study_tables(["user_data_action"])["user_data_action"]
+    return actions["duration"].dropna().to_numpy() / 1000.0
+
+
+def _pellet_arrivals(rng, n_rounds, layout):
+    """(keys, start, slot) of the pellet arrivals of n_rounds rounds.
+
+    keys are the sorted (round * 64 + tile) * slot + time of every arrival,
+    start[round * 64 + tile] the first key of that tile, so the pellets that
+    reached a tile before t are searchsorted(keys, its key of t) - start.
+    """
+    tiles = np.flatnonzero(pellet_grid(layout).ravel())
+    k = int(2 * ROUND_SECONDS / EXPECTED_PELLET_TIME)
+    while True:
+        times = np.cumsum(rng.exponential(EXPECTED_PELLET_TIME, (n_rounds, k)), axis=1)
+        if (times[:, -1] > ROUND_SECONDS).all():
+            break
+        k *= 2
+    where = tiles[rng.integers(len(tiles), size=(n_rounds, k))]
+    slot = 2 * times[:, -1].max()
+    cells = np.arange(n_rounds)[:, None] * N_STATES + where
+    keys = np.sort((cells * slot + times).ravel())
+    start = np.searchsorted(keys, np.arange(n_rounds * N_STATES) * slot)
+    return keys, start, slot
+
+
+# ==================== Teachers ====================
+
+
+@dataclass
+class MoveContext:
+    """Moves that just started, one entry each, for a teacher to judge."""
+
+    lane: np.ndarray
+    agent: np.ndarray
+    user_id: np.ndarray
+    rule: np.ndarray
+    layout: np.ndarray  # index into replay.LAYOUTS
+    time: np.ndarray
+    s: np.ndarray
+    a: np.ndarray
+    dest: np.ndarray
+    q_value: np.ndarray
+    expected_q: np.ndarray
+    is_optimal: np.ndarray
+
+
+class AutoDragTeacher:
+    """DataLog.autoDrag: with probability TEACH_EPS, drag a non-optimal move
+    back to its start tile, at a uniform point of the move."""
+
+    def __init__(self, teach_eps=TEACH_EPS):
+        self.teach_eps = teach_eps
+
+    def decide(self, rng, ctx: MoveContext):
+        """-> (intervene mask, drop tile, seconds from move start to mouse-down)."""
+        n = len(ctx.s)
+        intervene = (
+            ~ctx.is_optimal & (ctx.a != NOMOVE) & (rng.random(n) < self.teach_eps)
+        )
+        return intervene, ctx.s.copy(), rng.uniform(0, SELF_MOVE_SECONDS, n)
+
+
+# ==================== Expected Q ====================
+
+
+_MOVES = VALID[:, :NOMOVE]  # NOMOVE is the last action
+_TILES = np.arange(N_STATES)
+_MOVE_NEXT = np.where(_MOVES, NEXT[:, :NOMOVE], _TILES[:, None])
+_MOVE_W = _MOVES / _MOVES.sum(axis=1, keepdims=True)
+_MOVE_R = (EXPECTED[:, :, :NOMOVE] * _MOVE_W).sum(axis=2)  # (layouts, 64)
+
+
+def greedy_picks(q, rng) -> np.ndarray:
+    """(n, 64) getPolicy move of every tile of (n, 64, 9) tables.
+
+    Ties are broken at random; a tile with no finite entry moves UP.
+    """
+    vals = np.where(VALID & (q != 0), q, -np.inf)
+    best = vals.max(axis=2, keepdims=True)
+    pick = np.argmax((vals == best) * rng.random(vals.shape, dtype=np.float32), axis=2)
+    return np.where(np.isfinite(best[..., 0]), pick, UP)
+
+
+def walk_value(pick, layout) -> np.ndarray:
+    """simulateActions' expected TotalQ under (n, 64) policy moves.
+
+    Values are propagated backwards along the greedy successor of every
+    tile, so a step costs one gather per tile plus one per neighbour of the
+    NOMOVE tiles (a random valid move at every step).
+    """
+    layout = np.asarray(layout)[:, None]
+    nomove = pick == NOMOVE
+    r = np.where(nomove, _MOVE_R[layout, _TILES], EXPECTED[layout, _TILES, pick])
+    succ = NEXT[_TILES, pick]
+    succ = np.where(succ >= 0, succ, _TILES)
+    # flat indices into v.ravel()
+    base = np.arange(len(pick))[:, None] * N_STATES
+    succ = (base + succ).ravel()
+    nm = np.flatnonzero(nomove)
+    nm_next = base.ravel()[nm // N_STATES, None] + _MOVE_NEXT[nm % N_STATES]
+    nm_w = _MOVE_W[nm % N_STATES]
+    r = r.ravel()
+    v = np.zeros(r.shape)
+    for _ in range(SIM_STEPS):
+        later = v.take(succ)
+        later[nm] = np.einsum("ij,ij->i", v.take(nm_next), nm_w)
+        v = r + later
+    return SIM_LOOPS * v.reshape(pick.shape).mean(axis=1)
+
+
+def expected_q_value(q, layout, rng) -> np.ndarray:
+    """simulateActions for (n, 64, 9) tables: expected TotalQ of SIM_LOOPS
+    walks of SIM_STEPS policy moves from uniform random tiles.
+
+    getPolicy breaks ties at random once per call, and a NOMOVE policy is
+    replaced by a random valid move at every step.
+    """
+    return walk_value(greedy_picks(q, rng), layout)
+
+
+def _greedy_set(vals, s):
+    """getPolicy's tie set for (n, 9) Q rows at tiles s."""
+    vals = np.where(VALID[s] & (vals != 0), vals, -np.inf)
+    return vals == vals.max(axis=1, keepdims=True)
+
+
+# ==================== Engine ====================
+
+
+class _Batch:
+    """Calendar and state of a batch of rounds (lanes)."""
+
+    def __init__(
+        self, rng, user_ids, round_id, n_agents, teacher, durations, eps, q_start
+    ):
+        self.rng = rng
+        self.teacher = teacher
+        self.durations = durations
+        self.eps = eps
+        n = self.n = len(user_ids)
+        a = self.n_agents = n_agents
+        self.user_id = np.asarray(user_ids)
+        self.rule = np.array([get_interpret_type(u) for u in user_ids])
+        self.layout = np.full(n, LAYOUTS.index(layout_of(round_id)))
+        self.arrival_keys, self.arrival_start, self.slot = _pellet_arrivals(
+            rng, n, layout_of(round_id)
+        )
+        self.collected = np.zeros((n, N_STATES), dtype=np.int16)
+
+        self.q = np.broadcast_to(q_start, (n * a, N_STATES, N_ACTIONS)).copy()
+        self.pos = rng.integers(N_STATES, size=(n, a))
+        self.score = np.zeros((n, a))
+        # calendar: move end per agent, mouse-down, mouse-up
+        self.move_end = np.full((n, a), np.inf)
+        self.move_start = np.zeros((n, a))
+        self.move_s = np.zeros((n, a), dtype=int)
+        self.move_a = np.zeros((n, a), dtype=int)
+        self.mouse_down = np.full(n, np.inf)
+        self.mouse_up = np.full(n, np.inf)
+        self.drag_agent = np.full(n, -1)
+        self.drop = np.zeros(n, dtype=int)
+        self.fb_cancel = np.zeros(n)
+
+        self.log_q = []  # (row, time, value) of ExpectedQvalue changes
+        self.log_score = []  # (row, time, value) of score changes
+        self.log_drag = []  # (lane, agent, s, a, drop, mouse-down, mouse-up)
+        self.n_drags = np.zeros(n, dtype=int)
+        self.n_moves = np.zeros(n, dtype=int)
+
+        rows = np.arange(n * a)
+        self.pick = greedy_picks(self.q, rng)  # policy move per row and tile
+        self.log_q.append((rows, np.zeros(n * a), self._expected(rows)))
+
+    # ---------- helpers ----------
+
+    def _expected(self, rows):
+        return walk_value(self.pick[rows], self.layout[rows // self.n_agents])
+
+    def _on_board(self, lanes, tiles, t):
+        """Pellets lying on `tiles` at time t."""
+        cells = lanes * N_STATES + tiles
+        arrived = np.searchsorted(self.arrival_keys, cells * self.slot + t)
+        lying = arrived - self.arrival_start[cells] - self.collected[lanes, tiles]
+        return np.maximum(lying, 0)
+
+    def _collect(self, lanes, tiles, t, p=1.0):
+        """Take the pellets on `tiles` at time t, each with probability p."""
+        got = self._on_board(lanes, tiles, t)
+        if p < 1:
+            got = self.rng.binomial(got, p).astype(got.dtype)
+        self.collected[lanes, tiles] += got
+        return got
+
+    def _hold(self, lanes, agents, t):
+        """Pellets landing on the tile an agent stands on or starts a move
+        from, until the agent has left its first half."""
+        leaves = self.move_start[lanes, agents] + SELF_MOVE_SECONDS / 2
+        return self._collect(lanes, self.move_s[lanes, agents], np.minimum(t, leaves))
+
+    def _learn(self, lanes, agents, s, a, s_next, fb, t, next_known=None):
+        rows = lanes * self.n_agents + agents
+        before = _greedy_set(self.q[rows, s], s)
+        td_update(self.q, rows, s, a, s_next, fb, next_known)
+        after = _greedy_set(self.q[rows, s], s)
+        changed = (before != after).any(axis=1)
+        if changed.any():
+            # only tile s changed: redraw its policy move, keep the others
+            rows, s, after = rows[changed], s[changed], after[changed]
+            pick = np.argmax(after * self.rng.random(after.shape), axis=1)
+            finite = (VALID[s] & (self.q[rows, s] != 0)).any(axis=1)
+            self.pick[rows, s] = np.where(finite, pick, UP)
+            self.log_q.append((rows, t[changed], self._expected(rows)))
+
+    def _start_moves(self, lanes, agents, t):
+        t = t + WAIT_TIME
+        rows = lanes * self.n_agents + agents
+        s = self.pos[lanes, agents]
+        vals = np.where(VALID[s] & (self.q[rows, s] != 0), self.q[rows, s], -np.inf)
+        ties = vals == vals.max(axis=1, keepdims=True)
+        greedy = np.argmax(ties * self.rng.random(ties.shape), axis=1)
+        greedy = np.where(np.isfinite(vals.max(axis=1)), greedy, UP)
+        moves = VALID[s].copy()
+        moves[:, NOMOVE] = False
+        random = np.argmax(moves * self.rng.random(moves.shape), axis=1)
+        a = np.where(self.rng.random(len(s)) < self.eps, random, greedy)
+
+        layout = self.layout[lanes]
+        self.move_start[lanes, agents] = t
+        self.move_s[lanes, agents] = s
+        self.move_a[lanes, agents] = a
+        self.move_end[lanes, agents] = t + SELF_MOVE_SECONDS
+        self.n_moves[lanes] += 1
+
+        # one drag at a time per round
+        free = self.drag_agent[lanes] < 0
+        if not free.any():
+            return
+        pick = np.flatnonzero(free)
+        pick = pick[np.unique(lanes[pick], return_index=True)[1]]
+        ctx = MoveContext(
+            lane=lanes[pick],
+            agent=agents[pick],
+            user_id=self.user_id[lanes[pick]],
+            rule=self.rule[lanes[pick]],
+            layout=layout[pick],
+            time=t[pick],
+            s=s[pick],
+            a=a[pick],
+            dest=NEXT[s[pick], a[pick]],
+            q_value=self.q[rows[pick], s[pick], a[pick]],
+            expected_q=EXPECTED[layout[pick], s[pick], a[pick]],
+            is_optimal=TEACHER_OPTIMAL[layout[pick], s[pick], a[pick]],
+        )
+        intervene, drop, latency = self.teacher.decide(self.rng, ctx)
+        latency = np.minimum(latency, SELF_MOVE_SECONDS - RFH_TIME)
+        lane = ctx.lane[intervene]
+        self.mouse_down[lane] = ctx.time[intervene] + latency[intervene]
+        self.drag_agent[lane] = ctx.agent[intervene]
+        self.drop[lane] = drop[intervene]
+
+    # ---------- events ----------
+
+    def move_end_event(self, lanes, agent, t):
+        agents = np.full(len(lanes), agent)
+        s, a = self.move_s[lanes, agent], self.move_a[lanes, agent]
+        dest = NEXT[s, a]
+        got = self._hold(lanes, agent, t) + self._collect(lanes, dest, t)
+        side = SIDE_TILES[s, a]
+        for k in range(2):
+            has = np.flatnonzero(side[:, k] >= 0)
+            got[has] += self._collect(lanes[has], side[has, k], t[has], 0.5)
+        fb = PELLET_FEEDBACK * got
+        self._score(lanes, agents, fb, t)
+
+        self._learn(lanes, agents, s, a, dest, fb, t)
+        self.pos[lanes, agent] = dest
+        self.move_end[lanes, agent] = np.inf
+        idle = ~np.isfinite(self.mouse_up[lanes])
+        self._start_moves(lanes[idle], agents[idle], t[idle])
+
+    def mouse_down_event(self, lanes, t):
+        agents = self.drag_agent[lanes]
+        self.fb_cancel[lanes] = PELLET_FEEDBACK * self._hold(lanes, agents, t)
+        self._score(lanes, agents, self.fb_cancel[lanes], t)
+        self.move_end[lanes, agents] = np.inf  # the move is cancelled
+        self.mouse_down[lanes] = np.inf
+        pick = self.rng.integers(len(self.durations), size=len(lanes))
+        self.mouse_up[lanes] = t + self.durations[pick]
+        self.n_drags[lanes] += 1
+        self.log_drag.append(
+            (
+                lanes,
+                agents,
+                self.move_s[lanes, agents],
+                self.move_a[lanes, agents],
+                self.drop[lanes],
+                t,
+                self.mouse_up[lanes],
+            )
+        )
+
+    def mouse_up_event(self, lanes, t):
+        agents = self.drag_agent[lanes]
+        drop = self.drop[lanes]
+        fb_release = PELLET_FEEDBACK * self._collect(lanes, drop, t)
+        # the drop's COLLISION is dispatched for index 0 of a one-agent list
+        self._score(lanes, np.zeros_like(agents), fb_release, t)
+
+        s, a_try = self.move_s[lanes, agents], self.move_a[lanes, agents]
+        learns, a, s_next, fb, next_known = _drag_updates(
+            self.rule[lanes], s, a_try, drop, self.fb_cancel[lanes], fb_release
+        )
+        if learns.any():
+            self._learn(
+                lanes[learns], agents[learns], s[learns], a[learns],
+                s_next[learns], fb[learns], t[learns], next_known[learns],
+            )
+        self.pos[lanes, agents] = drop
+        self.mouse_up[lanes] = np.inf
+        self.drag_agent[lanes] = -1
+        # every agent that is not moving starts now
+        idle_lane, idle_agent = np.nonzero(~np.isfinite(self.move_end[lanes]))
+        order = np.argsort(idle_lane, kind="stable")
+        idle_lane, idle_agent = idle_lane[order], idle_agent[order]
+        self._start_moves(lanes[idle_lane], idle_agent, t[idle_lane])
+
+    def _score(self, lanes, agents, fb, t):
+        gained = fb > 0
+        if gained.any():
+            lanes, agents = lanes[gained], agents[gained]
+            self.score[lanes, agents] += fb[gained]
+            rows = lanes * self.n_agents + agents
+            self.log_score.append((rows, t[gained], self.score[lanes, agents]))
+
+    def run(self):
+        n, a = self.n, self.n_agents
+        lanes = np.arange(n)
+        for agent in range(a):
+            self._start_moves(lanes, np.full(n, agent), np.zeros(n))
+        while True:
+            calendar = np.column_stack([self.move_end, self.mouse_down, self.mouse_up])
+            source = calendar.argmin(axis=1)
+            t = calendar[lanes, source]
+            live = t < ROUND_SECONDS
+            if not live.any():
+                break
+            for agent in range(a):
+                hit = np.flatnonzero(live & (source == agent))
+                if len(hit):
+                    self.move_end_event(hit, agent, t[hit])
+            hit = np.flatnonzero(live & (source == a))
+            if len(hit):
+                self.mouse_down_event(hit, t[hit])
+            hit = np.flatnonzero(live & (source == a + 1))
+            if len(hit):
+                self.mouse_up_event(hit, t[hit])
+
+    def sampled(self, log, initial) -> np.ndarray:
+        """(rows, ticks) values of a change log on the 0.5 s grid."""
+        rows = np.concatenate([r for r, _, _ in log])
+        times = np.concatenate([t for _, t, _ in log])
+        values = np.concatenate([v for _, _, v in log])
+        order = np.lexsort((times, rows))
+        rows, times, values = rows[order], times[order], values[order]
+        ticks = np.arange(1, int(ROUND_SECONDS / SAMPLE_PERIOD) + 1) * SAMPLE_PERIOD
+        n_rows = self.n * self.n_agents
+        key = rows * (2 * ROUND_SECONDS) + times
+        grid = np.arange(n_rows)[:, None] * (2 * ROUND_SECONDS) + ticks[None, :]
+        idx = np.searchsorted(key, grid, side="right") - 1
+        ok = idx >= 0
+        ok[ok] = rows[idx[ok]] == np.nonzero(ok)[0]
+        return np.where(ok, values[np.maximum(idx, 0)], initial), ticks
+
+
+@dataclass
+class SimLog:
+    q: pd.DataFrame  # user_data_q.csv schema
+    scores: pd.DataFrame  # user_data.csv schema
+    rounds: pd.DataFrame  # one row per simulated round
+    drags: pd.DataFrame  # one row per drag
+    seconds: float
+
+
+def _frame(values, ticks, user_id, round_id, n_agents, column, columns):
+    n_rows = len(values)
+    return pd.DataFrame(
+        {
+            column: values.ravel(),
+            "agent_id": np.repeat(np.arange(n_rows) % n_agents, len(ticks)),
+            "time": np.tile(ticks, n_rows),
+            "user_id": np.repeat(np.repeat(user_id, n_agents), len(ticks)),
+            "round": round_id,
+        }
+    )[columns]
+
+
+def _drag_frame(sim, users, round_id):
+    fields = ["lane", "agent_id", "s", "a", "drop", "st_time", "end_time"]
+    if not sim.log_drag:
+        return pd.DataFrame(columns=["user_id", "round", *fields[1:]])
+    drags = pd.DataFrame(dict(zip(fields, map(np.concatenate, zip(*sim.log_drag)))))
+    drags.insert(0, "user_id", users[drags.pop("lane")])
+    drags.insert(1, "round", round_id)
+    return drags
+
+
+def simulate(
+    user_ids,
+    round_id: int,
+    n_agents=None,
+    teacher=None,
+    durations=None,
+    eps=AGENT_EPS,
+    q_start=Q_INIT,
+    seed=0,
+    batch=BATCH_ROUNDS,
+) -> SimLog:
+    """Simulate `round_id` once for every user id.
+
+    Each user's interpretation type is (user_id - 1) % 6, as in the study.
+    Rounds 6-9 have two agents unless n_agents is given.
+    """
+    rng = np.random.default_rng(seed)
+    teacher = teacher or AutoDragTeacher()
+    durations = study_durations() if durations is None else np.asarray(durations)
+    n_agents = n_agents or (2 if round_id in TWO_AGENT_ROUNDS else 1)
+    user_ids = np.asarray(user_ids)
+
+    q_frames, score_frames, round_frames, drag_frames = [], [], [], []
+    start = time.perf_counter()
+    for lo in range(0, len(user_ids), batch):
+        users = user_ids[lo : lo + batch]
+        sim = _Batch(rng, users, round_id, n_agents, teacher, durations, eps, q_start)
+        sim.run()
+        q, ticks = sim.sampled(sim.log_q, np.nan)
+        if sim.log_score:
+            scores, _ = sim.sampled(sim.log_score, 0.0)
+        else:
+            scores = np.zeros_like(q)
+        frame = partial(
+            _frame, ticks=ticks, user_id=users, round_id=round_id, n_agents=n_agents
+        )
+        q_frames.append(frame(q, column="ExpectedQvalue", columns=Q_COLUMNS))
+        score_frames.append(
+            frame(scores.astype(int), column="score", columns=SCORE_COLUMNS)
+        )
+        round_frames.append(
+            pd.DataFrame(
+                {
+                    "user_id": users,
+                    "round": round_id,
+                    "interpret_type": sim.rule,
+                    "moves": sim.n_moves,
+                    "drags": sim.n_drags,
+                }
+            )
+        )
+        drag_frames.append(_drag_frame(sim, users, round_id))
+    return SimLog(
+        pd.concat(q_frames, ignore_index=True),
+        pd.concat(score_frames, ignore_index=True),
+        pd.concat(round_frames, ignore_index=True),
+        pd.concat(drag_frames, ignore_index=True),
+        time.perf_counter() - start,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rounds", default="2,6", help="comma-separated round ids")
+    parser.add_argument("--teach-eps", type=float, default=TEACH_EPS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--out-dir", help="write user_data_q.csv and user_data.csv here"
+    )
+    args = parser.parse_args()
+
+    teacher = AutoDragTeacher(args.teach_eps)
+    users = np.arange(1, args.users + 1)
+    logs = []
+    for i, round_id in enumerate(int(r) for r in args.rounds.split(",")):
+        log = simulate(users, round_id, teacher=teacher, seed=args.seed + i)
+        per_round = log.rounds[["moves", "drags"]].mean()
+        print(
+            f"round {round_id}: {len(users)} rounds in {log.seconds:.2f}s "
+            f"({len(users) / log.seconds:,.0f}/s), {per_round['moves']:.1f} moves "
+            f"and {per_round['drags']:.1f} drags per round, final score "
+            f"{log.scores[log.scores['time'] == ROUND_SECONDS]['score'].mean():.0f}"
+        )
+        logs.append(log)
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+        q = pd.concat([log.q for log in logs], ignore_index=True)
+        scores = pd.concat([log.scores for log in logs], ignore_index=True)
+        q.to_csv(Path(args.out_dir) / "user_data_q.csv", index=False)
+        scores.to_csv(Path(args.out_dir) / "user_data.csv", index=False)
+        print(f"Saved to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    profiling.rerun_profiled()
+    main()
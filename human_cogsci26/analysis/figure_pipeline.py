@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""Two-stage pipeline for the expected-Q figures.
+
+The compute stage runs the statistics (LOWESS, top/low grouping, bootstrap
+bands, baseline deltas) once and persists tidy curve tables under
+analysis/figure_tables/. The render stage only reads those tables and draws,
+so fonts, colors and layouts can be iterated on in about a second.
+
+Figures:
+    expected_q  - study_data/data/expected_q.py (plot_four)
+    delta_ci    - study_data/data/yuanbao_python_20251003_WjTaCE.py
+                  (plot_one_type, one PNG per interpretation type)
+
+Tables:
+    expected_q_curves.csv  setting, series, interpret_type, group, x, y
+    delta_ci_curves.csv    interpret_type, setting, series, group, x, y
+    delta_ci_bands.csv     interpret_type, setting, series, group, x, lower, upper
+
+Usage (from human_cogsci26/):
+    python analysis/figure_pipeline.py compute [expected_q|delta_ci|all]
+    python analysis/figure_pipeline.py render [expected_q|delta_ci|all] [--dpi 100]
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from common import ANALYSIS_DIR, DATA_DIR, SETTINGS, SETTING_TITLES, get_type_name
+
+TABLE_DIR = ANALYSIS_DIR / "figure_tables"
+FIGURE_DIR = DATA_DIR
+FIGURES = ("expected_q", "delta_ci")
+
+# Red/blue participant groups of the delta figure: mean interventions per round
+# in (lower, upper]
+DELTA_GROUPS = {"red": (0, 15), "blue": (15, None)}
+
+# ----------- Render style -----------
+TYPE_COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b"]
+GROUP_LINESTYLES = {"all": "-", "top": "-", "low": "--"}
+FONT_FAMILY = ["SimHei", "Arial", "DejaVu Sans"]
+DEFAULT_DPI = 300
+
+
+def _curve_rows(x_sm, y_sm, **keys) -> pd.DataFrame:
+    # LOWESS returns one point per observation; tied x share the same fit,
+    # so keeping one row per x is lossless and keeps the tables small
+    rows = pd.DataFrame({"x": x_sm, "y": y_sm}).drop_duplicates("x")
+    return rows.assign(**keys)
+
+
+def _band_rows(x_ci, lower, upper, **keys) -> pd.DataFrame:
+    return pd.DataFrame({**keys, "x": x_ci, "lower": lower, "upper": upper})
+
+
+def _concat(frames: list[pd.DataFrame], columns: list[str]) -> pd.DataFrame:
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)[columns]
+
+
+# ----------- Compute stage -----------
+def compute_expected_q() -> pd.DataFrame:
+    """Curves of plot_four: per-type LOWESS plus the simulated black baseline."""
+    from curves import black_top_low, build_top_low, lowess_line
+    from loaders import read_black_setting, read_main
+
+    df_main = read_main()
+    frames = []
+    for st, rnds in SETTINGS.items():
+        if st <= 2:
+            sub = df_main[df_main["round"].isin(rnds) & (df_main["agent_id"] == 0)]
+            for itype in range(6):
+                piece = sub[sub["interpret_type"] == itype]
+                if piece.empty:
+                    continue
+                x_sm, y_sm = lowess_line(piece["time"].values, piece["ExpectedQvalue"].values)
+                frames.append(
+                    _curve_rows(x_sm, y_sm, setting=st, series="main",
+                                interpret_type=itype, group="all")
+                )
+        else:
+            sub = build_top_low(df_main, rnds)
+            for itype in range(6):
+                for grp in ("top", "low"):
+                    piece = sub[(sub["interpret_type"] == itype) & (sub["group"] == grp)]
+                    if piece.empty:
+                        continue
+                    x_sm, y_sm = lowess_line(piece["time"].values, piece["ExpectedQvalue"].values)
+                    frames.append(
+                        _curve_rows(x_sm, y_sm, setting=st, series="main",
+                                    interpret_type=itype, group=grp)
+                    )
+
+        black_df = read_black_setting(st)
+        if black_df.empty:
+            continue
+        if st <= 2:
+            black_df = black_df[black_df["agentid"] == 0]
+            x_sm, y_sm = lowess_line(black_df["time"].values, black_df["ExpectedQvalue"].values)
+            frames.append(
+                _curve_rows(x_sm, y_sm, setting=st, series="black",
+                            interpret_type=-1, group="all")
+            )
+        else:
+            black_df = black_top_low(black_df)
+            for grp in ("top", "low"):
+                bsub = black_df[black_df["group"] == grp]
+                if bsub.empty:
+                    continue
+                x_sm, y_sm = lowess_line(bsub["time"].values, bsub["ExpectedQvalue"].values)
+                frames.append(
+                    _curve_rows(x_sm, y_sm, setting=st, series="black",
+                                interpret_type=-1, group=grp)
+                )
+
+    return _concat(frames, ["setting", "series", "interpret_type", "group", "x", "y"])
+
+
+def compute_delta_ci() -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Curves and bootstrap bands of plot_one_type, relative to the black baseline."""
+    from curves import build_top_low, delta_line, lowess_line, lowess_with_ci
+    from loaders import build_black_df, read_pooled_q, read_pooled_stats, select_colored
+
+    stats = read_pooled_stats()
+    q_df = read_pooled_q()
+    empty = (np.array([]), np.array([]))
+
+    # Baselines do not depend on the interpretation type; compute them once
+    base_lines = {}
+    for st, rnds in SETTINGS.items():
+        black_df = build_black_df(rnds)
+        base_lines[st] = {}
+        if black_df.empty:
+            continue
+        if st <= 2:
+            b = black_df[black_df["agent_id"] == 0]
+            base_lines[st]["all"] = lowess_line(b["time"].values, b["ExpectedQvalue"].values)
+        else:
+            bsub = build_top_low(black_df, rnds)
+            for grp in ("top", "low"):
+                b = bsub[bsub["group"] == grp]
+                base_lines[st][grp] = lowess_line(b["time"].values, b["ExpectedQvalue"].values)
+
+    curve_frames, band_frames = [], []
+    for itype in range(6):
+        for st, rnds in SETTINGS.items():
+            for series, (lower, upper) in DELTA_GROUPS.items():
+                colored = select_colored(stats, q_df, rnds, itype, lower, upper)
+                if colored.empty:
+                    continue
+                if st <= 2:
+                    pieces = [("all", colored[colored["agent_id"] == 0])]
+                else:
+                    csub = build_top_low(colored, rnds)
+                    pieces = [(grp, csub[csub["group"] == grp]) for grp in ("top", "low")]
+
+                for grp, piece in pieces:
+                    x_sm, y_sm, x_ci, lower_ci, upper_ci = lowess_with_ci(
+                        piece["time"].values, piece["ExpectedQvalue"].values
+                    )
+                    if not x_sm.size:
+                        continue
+                    base = base_lines[st].get(grp, empty)
+                    x_sm, y_sm = delta_line(x_sm, y_sm, *base)
+                    x_ci, lower_ci = delta_line(x_ci, lower_ci, *base)
+                    x_ci, upper_ci = delta_line(x_ci, upper_ci, *base)
+                    keys = dict(interpret_type=itype, setting=st, series=series, group=grp)
+                    curve_frames.append(_curve_rows(x_sm, y_sm, **keys))
+                    band_frames.append(_band_rows(x_ci, lower_ci, upper_ci, **keys))
+
+    key_cols = ["interpret_type", "setting", "series", "group"]
+    return (
+        _concat(curve_frames, key_cols + ["x", "y"]),
+        _concat(band_frames, key_cols + ["x", "lower", "upper"]),
+    )
+
+
+def compute(figure: str) -> None:
+    """Run the statistics for `figure` and persist its tables."""
+    TABLE_DIR.mkdir(exist_ok=True)
+    if figure in ("expected_q", "all"):
+        curves = compute_expected_q()
+        curves.to_csv(TABLE_DIR / "expected_q_curves.csv", index=False)
+        print(f"expected_q: {len(curves)} curve rows")
+    if figure in ("delta_ci", "all"):
+        curves, bands = compute_delta_ci()
+        curves.to_csv(TABLE_DIR / "delta_ci_curves.csv", index=False)
+        bands.to_csv(TABLE_DIR / "delta_ci_bands.csv", index=False)
+        print(f"delta_ci: {len(curves)} curve rows, {len(bands)} band rows")
+    print(f"Tables saved to: {TABLE_DIR}")
+
+
+# ----------- Render stage -----------
+def _read_table(name: str) -> pd.DataFrame:
+    path = TABLE_DIR / name
+    if not path.exists():
+        raise FileNotFoundError(f"{path} not found; run the compute stage first")
+    return pd.read_csv(path)
+
+
+def render_expected_q(dpi: int = DEFAULT_DPI) -> str:
+    import matplotlib.pyplot as plt
+
+    curves = _read_table("expected_q_curves.csv")
+    fig, axes = plt.subplots(1, 4, figsize=(24, 6))
+
+    for ax, st in zip(axes, SETTINGS):
+        sub = curves[curves["setting"] == st]
+        for (series, itype, grp), piece in sub.groupby(
+            ["series", "interpret_type", "group"], sort=False
+        ):
+            if series == "black":
+                ax.plot(piece["x"], piece["y"], color="black", linewidth=1.2,
+                        linestyle=GROUP_LINESTYLES[grp])
+                continue
+            label = get_type_name(itype) if grp == "all" else f"{get_type_name(itype)}-{grp}"
+            ax.plot(piece["x"], piece["y"], color=TYPE_COLORS[itype], linewidth=2.5,
+                    linestyle=GROUP_LINESTYLES[grp], label=label)
+
+        ax.set_title(f"setting{st}", fontsize=14)
+        ax.set_xlabel("Time", fontsize=12)
+        ax.set_ylabel("Expected Q Value", fontsize=12)
+        ax.grid(True, alpha=0.3)
+        if st <= 2:
+            ax.legend(fontsize=9)
+        else:
+            handles, labels = ax.get_legend_handles_labels()
+            short = [(h, lab) for h, lab in zip(handles, labels) if lab.endswith("-top")]
+            if short:
+                ax.legend(*zip(*short), fontsize=9)
+
+    plt.tight_layout()
+    out_path = os.path.join(FIGURE_DIR, "expected_q_lowess.png")
+    plt.savefig(out_path, dpi=dpi)
+    plt.close(fig)
+    return out_path
+
+
+def render_delta_ci(dpi: int = DEFAULT_DPI) -> list[str]:
+    import matplotlib.pyplot as plt
+
+    curves = _read_table("delta_ci_curves.csv")
+    bands = _read_table("delta_ci_bands.csv")
+    keys = ["setting", "series", "group"]
+    out_paths = []
+
+    for itype in range(6):
+        fig, axes = plt.subplots(1, 4, figsize=(24, 6))
+        c_type = curves[curves["interpret_type"] == itype]
+        b_type = bands[bands["interpret_type"] == itype]
+
+        for ax, st in zip(axes, SETTINGS):
+            for (_, series, grp), band in b_type[b_type["setting"] == st].groupby(keys, sort=False):
+                suffix = "" if grp == "all" else f"-{grp}"
+                ax.fill_between(band["x"], band["lower"], band["upper"], color=series,
+                                alpha=0.2, label=f"{series.upper()}{suffix} 95% CI")
+            for (_, series, grp), line in c_type[c_type["setting"] == st].groupby(keys, sort=False):
+                suffix = "" if grp == "all" else f"-{grp}"
+                ax.plot(line["x"], line["y"], color=series, linewidth=2.5,
+                        linestyle=GROUP_LINESTYLES[grp], label=f"{series.upper()}{suffix}")
+
+            ax.axhline(0, color="black", linewidth=1.5, linestyle="-")
+            if st != 1:
+                ax.set_yticklabels([])
+            ax.set_title(SETTING_TITLES[st], fontsize=24, fontweight="bold")
+            ax.set_xlabel("Time", fontsize=24, fontweight="bold")
+            if st == 1:
+                ax.set_ylabel("Expected Reward Difference", fontsize=24, fontweight="bold")
+            ax.grid(True, alpha=0.3)
+            ax.tick_params(axis="both", which="major", labelsize=24)
+
+        # Shared adaptive y range across the four panels
+        y_all = [lim for axi in axes for lim in axi.get_ylim()]
+        y_min, y_max = min(y_all), max(y_all)
+        margin = (y_max - y_min) * 0.05
+        for axi in axes:
+            axi.set_ylim(y_min - margin, y_max + margin)
+
+        plt.tight_layout()
+        out_path = os.path.join(FIGURE_DIR, f"{get_type_name(itype)}_{itype}_with_ci.png")
+        plt.savefig(out_path, dpi=dpi)
+        plt.close(fig)
+        out_paths.append(out_path)
+    return out_paths
+
+
+def render(figure: str, dpi: int = DEFAULT_DPI) -> None:
+    """Draw `figure` from its persisted tables."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.rcParams["font.sans-serif"] = FONT_FAMILY
+    plt.rcParams["axes.unicode_minus"] = False
+
+    out_paths = []
+    if figure in ("expected_q", "all"):
+        out_paths.append(render_expected_q(dpi))
+    if figure in ("delta_ci", "all"):
+        out_paths.extend(render_delta_ci(dpi))
+    for path in out_paths:
+        print(f"Figure saved to: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("stage", choices=["compute", "render", "all"])
+    parser.add_argument("figure", nargs="?", default="all", choices=FIGURES + ("all",))
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI,
+                        help="render resolution (use ~100 while iterating on style)")
+    args = parser.parse_args()
+
+    if args.stage in ("compute", "all"):
+        compute(args.figure)
+    if args.stage in ("render", "all"):
+        render(args.figure, args.dpi)
+
+
+if __name__ == "__main__":
+    profiling.rerun_profiled()
+    main()
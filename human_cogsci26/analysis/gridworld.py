@@ -0,0 +1,212 @@
+"""Grid world, action set and TD rule of the experiment's Q-learning agent.
+
+Python port of the pieces of src/Roombas/QLearningAgent2.ts,
+src/components/ExpectedQvalue.jsx and src/Roombas/PolicyTeacher.ts that the
+replay and model-based analyses need, vectorized over a batch of Q-tables.
+
+States are tiles indexed x * 8 + y (the order the agent builds its table
+in), actions follow the AgentAction enum. The TD update keeps the agent's
+quirks: falsy (zero or missing) Q entries are skipped, the bootstrap action
+set depends on the *next* tile through the AGENT_W/AGENT_H comparisons, and
+a next state absent from the table resets the updated entry to -2.
+"""
+
+import numpy as np
+
+from common import GRID_SIZE, PELLET_TILES
+
+N_STATES = GRID_SIZE * GRID_SIZE
+N_ACTIONS = 9
+
+# AgentAction enum
+UP, DOWN, LEFT, RIGHT, UPLEFT, UPRIGHT, DOWNLEFT, DOWNRIGHT, NOMOVE = range(N_ACTIONS)
+ACTION_NAMES = (
+    "UP",
+    "DOWN",
+    "LEFT",
+    "RIGHT",
+    "UPLEFT",
+    "UPRIGHT",
+    "DOWNLEFT",
+    "DOWNRIGHT",
+    "NOMOVE",
+)
+# (dx, dy) of each action; UP decreases y
+ACTION_DELTAS = np.array(
+    [[0, -1], [0, 1], [-1, 0], [1, 0], [-1, -1], [1, -1], [-1, 1], [1, 1], [0, 0]]
+)
+DIAGONAL_ACTIONS = (UPLEFT, UPRIGHT, DOWNLEFT, DOWNRIGHT)
+STEP_COST_MULTIPLIER = np.array([1, 1, 1, 1, 1.414, 1.414, 1.414, 1.414, 0.0])
+
+# Experiment parameters (src/utils/index.tsx, QLearnAgent2 defaults)
+ALPHA = 0.1
+GAMMA = 0.9
+Q_INIT = 1.0
+Q_STEP_COST = -1.0
+HUM_INT_FB = -12.0
+PELLET_FEEDBACK = 6.0
+EXPECTED_PELLET_TIME = 0.5  # seconds between pellet arrivals
+AGENT_EPS = 0.3
+MOVE_TIME = 2.0  # seconds per self move
+MISSING_Q = -2.0  # value runLearn restarts from when no next action is found
+
+AGENT_W = 1
+AGENT_H = 1
+
+
+def state_index(x, y):
+    """Tile (x, y) -> state index; works on scalars and arrays."""
+    return np.asarray(x) * GRID_SIZE + np.asarray(y)
+
+
+def state_xy(s):
+    """State index -> (x, y)."""
+    s = np.asarray(s)
+    return s // GRID_SIZE, s % GRID_SIZE
+
+
+def in_grid(x, y):
+    x, y = np.asarray(x), np.asarray(y)
+    return (x >= 0) & (x < GRID_SIZE) & (y >= 0) & (y < GRID_SIZE)
+
+
+def infer_action(dx, dy):
+    """QLearnAgent2.inferAct / calculateAction on arrays of displacements."""
+    sx, sy = np.sign(dx).astype(int), np.sign(dy).astype(int)
+    table = np.empty((3, 3), dtype=int)  # [sx + 1, sy + 1]
+    table[2] = [UPRIGHT, RIGHT, DOWNRIGHT]
+    table[0] = [UPLEFT, LEFT, DOWNLEFT]
+    table[1] = [UP, NOMOVE, DOWN]
+    return table[sx + 1, sy + 1]
+
+
+def valid_action_mask() -> np.ndarray:
+    """(64, 9) moves that stay on the grid (getPolicy's isValidAction)."""
+    xs, ys = state_xy(np.arange(N_STATES))
+    nx = xs[:, None] + ACTION_DELTAS[None, :, 0]
+    ny = ys[:, None] + ACTION_DELTAS[None, :, 1]
+    return in_grid(nx, ny)
+
+
+def _bootstrap_order() -> np.ndarray:
+    """(64, 8) actions runLearn considers from each next tile, in push order.
+
+    Unused slots are -1. The comparisons use AGENT_W/AGENT_H = 1, so tiles
+    in column/row 1 lose their LEFT/UP moves and rows 0-1 only look down.
+    """
+    order = np.full((N_STATES, 8), -1, dtype=int)
+    for s in range(N_STATES):
+        x, y = state_xy(s)
+        acts = []
+        if y > AGENT_H:
+            acts.append(UP)
+            if x > AGENT_W:
+                acts.append(UPLEFT)
+            if x < GRID_SIZE - AGENT_W:
+                acts.append(UPRIGHT)
+        elif y < GRID_SIZE - AGENT_H:
+            acts.append(DOWN)
+            if x > AGENT_W:
+                acts.append(DOWNLEFT)
+            if x < GRID_SIZE - AGENT_W:
+                acts.append(DOWNRIGHT)
+        if x > AGENT_W:
+            acts.append(LEFT)
+        if x < GRID_SIZE - AGENT_W:
+            acts.append(RIGHT)
+        order[s, : len(acts)] = acts
+    return order
+
+
+BOOTSTRAP_ORDER = _bootstrap_order()
+
+
+def td_update(q, batch, s, a, s_next, fb, next_known=None):
+    """Apply one runLearn update per batch row, in place.
+
+    q           (B, 64, 9) Q-tables
+    batch       (n,) rows of q to update
+    s, a        (n,) updated state/action
+    s_next      (n,) next tile used for the bootstrap
+    fb          (n,) feedback
+    next_known  (n,) False where the next state is not a table key (a drag's
+                mid-move position); those rows take the MISSING_Q branch.
+
+    Returns the new values written.
+    """
+    batch = np.asarray(batch)
+    s, a, s_next = np.asarray(s), np.asarray(a), np.asarray(s_next)
+    fb = np.asarray(fb, dtype=float)
+    if next_known is None:
+        next_known = np.ones(batch.shape, dtype=bool)
+
+    q_old = q[batch, s, a].copy()
+    order = BOOTSTRAP_ORDER[s_next]  # (n, 8)
+    vals = q[batch[:, None], s_next[:, None], np.maximum(order, 0)]
+    usable = (order >= 0) & (vals != 0) & next_known[:, None]
+    vals = np.where(usable, vals, -np.inf)
+    pick = vals.argmax(axis=1)  # first maximum, as the strict '>' scan
+    best_val = vals[np.arange(len(pick)), pick]
+    best_act = order[np.arange(len(pick)), pick]
+    mult = STEP_COST_MULTIPLIER[best_act]
+
+    missing_old = q_old == 0
+    q_old = np.where(missing_old, Q_INIT, q_old)
+    mult = np.where(missing_old, 1.0, mult)
+
+    no_next = ~np.isfinite(best_val)
+    q_old = np.where(no_next, MISSING_Q, q_old)
+    best_val = np.where(no_next, 0.0, best_val)
+    mult = np.where(no_next, 1.0, mult)
+
+    td = fb + Q_STEP_COST * mult + GAMMA * best_val - q_old
+    new = q_old + ALPHA * td
+    q[batch, s, a] = new
+    return new
+
+
+def greedy_actions(q: np.ndarray) -> np.ndarray:
+    """getPolicy: the valid move with the highest non-zero Q.
+
+    q is (..., 64, 9); ties go to the first action (the agent breaks them at
+    random). States with no usable entry fall back to UP.
+    """
+    valid = valid_action_mask()
+    vals = np.where(valid & (q != 0), q, -np.inf)
+    best = vals.argmax(axis=-1)
+    return np.where(np.isfinite(vals.max(axis=-1)), best, UP)
+
+
+def pellet_grid(layout: str) -> np.ndarray:
+    """(8, 8) probability of a new pellet landing on each tile."""
+    tiles = np.array(PELLET_TILES[layout])
+    grid = np.zeros((GRID_SIZE, GRID_SIZE))
+    grid[tiles[:, 0], tiles[:, 1]] = 1.0 / len(tiles)
+    return grid
+
+
+def expected_probabilities(layout: str) -> np.ndarray:
+    """(64, 9) ExpectedProbabilityCalculator.findActionProbability.
+
+    Probability mass of the destination tile, plus half of each side tile
+    for diagonal moves; 0 for NOMOVE and off-grid moves.
+    """
+    grid = pellet_grid(layout)
+    xs, ys = state_xy(np.arange(N_STATES))
+    out = np.zeros((N_STATES, N_ACTIONS))
+    for a in range(N_ACTIONS - 1):
+        dx, dy = ACTION_DELTAS[a]
+        nx, ny = xs + dx, ys + dy
+        ok = in_grid(nx, ny)
+        p = np.zeros(N_STATES)
+        p[ok] = grid[nx[ok], ny[ok]]
+        if a in DIAGONAL_ACTIONS:
+            p[ok] += grid[nx[ok], ys[ok]] / 2 + grid[xs[ok], ny[ok]] / 2
+        out[:, a] = p
+    return out
+
+
+def teacher_optimal_mask(layout: str) -> np.ndarray:
+    """(64, 9) PolicyTeacher's best actions (ties included, NOMOVE counts)."""
+    probs = expected_probabilities(layout)
+    return probs == probs.max(axis=1, keepdims=True)
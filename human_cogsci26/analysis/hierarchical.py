@@ -0,0 +1,223 @@
+"""Empirical-Bayes fit of the H1-H4 drop-target weights across participants.
+
+analyze_user_data fits one lambda per hypothesis for each user, and the fits
+are unstable for users with a handful of drags. Here every drag target of
+user u is drawn from a mixture of the four hypotheses and a uniform tile,
+
+    p(target) = sum_k w_uk p_k(target),    w_u ~ Dirichlet(alpha)
+
+with p_k from hypothesis_model.hypothesis_probabilities (uniform: 1/64).
+The population prior alpha and every user's posterior Dirichlet(gamma_u)
+are fitted together by variational empirical Bayes. Each iteration is three
+array updates over all users at once: the responsibilities of every drag,
+gamma (one bincount) and alpha (a fixed-point step on the Dirichlet
+evidence). A user with few drags stays close to the population weights;
+one with many drags gets weights close to their own.
+
+    python analysis/hierarchical.py                 # random and smooth layouts
+    python analysis/hierarchical.py --compare       # vs. analyze_user_data winners
+"""
+
+import argparse
+import time
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy.special import digamma, polygamma
+
+import profiling
+from common import PELLET_TILES
+from hypothesis_model import (
+    HYPOTHESES,
+    N_TILES,
+    analyze_user_data,
+    hypothesis_probabilities,
+)
+from loaders import read_study_tables
+
+USER_KEYS = ["data_source", "user_id"]
+COMPONENTS = [*HYPOTHESES, "uniform"]
+MAX_ITERATIONS = 500
+TOLERANCE = 1e-3  # largest change of any gamma (in drags) between iterations
+
+
+def _inverse_digamma(y: np.ndarray, steps: int = 5) -> np.ndarray:
+    """x with digamma(x) = y, by Newton's method from Minka's starting point."""
+    x = np.where(y >= -2.22, np.exp(y) + 0.5, -1 / (y - digamma(1)))
+    for _ in range(steps):
+        x -= (digamma(x) - y) / polygamma(1, x)
+    return x
+
+
+def _expected_log_weights(gamma: np.ndarray) -> np.ndarray:
+    return digamma(gamma) - digamma(gamma.sum(axis=1, keepdims=True))
+
+
+def fit_weights(
+    probs, users, n_users=None, max_iter=MAX_ITERATIONS, tol=TOLERANCE
+) -> tuple[np.ndarray, np.ndarray, int, bool]:
+    """(alpha, gamma, iterations, converged) of the hierarchical mixture.
+
+    `probs` is (drags, components), the target probability of each drag
+    under each component; `users` the user row (0 .. n_users - 1) of each drag.
+    Stopping at max_iter with a gamma change of tol or more warns with a
+    RuntimeWarning and returns converged=False.
+    """
+    probs = np.asarray(probs, dtype=float)
+    users = np.asarray(users)
+    n_users = users.max() + 1 if n_users is None else n_users
+    k = probs.shape[1]
+    # a user's drags with the same probabilities enter as one weighted row
+    rows, weight = np.unique(
+        np.column_stack([users, probs]), axis=0, return_counts=True
+    )
+    users, probs = rows[:, 0].astype(int), rows[:, 1:]
+    cells = (users[:, None] * k + np.arange(k)).ravel()
+
+    def user_sums(values):
+        flat = np.bincount(cells, weights=values.ravel(), minlength=n_users * k)
+        return flat.reshape(n_users, k)
+
+    alpha = np.ones(k)
+    gamma = alpha + user_sums(np.repeat(weight[:, None] / k, k, axis=1))
+    for iteration in range(1, max_iter + 1):
+        # E-step: expected drags per (user, component) under q(w_u) = Dir(gamma_u)
+        elog = _expected_log_weights(gamma)
+        e = np.exp(elog - elog.max(axis=1, keepdims=True))
+        z = np.einsum("ik,ik->i", probs, e[users])
+        counts = e * user_sums(probs * (weight / z)[:, None])
+
+        # alpha maximizes the expected Dirichlet log density of the users' weights
+        mean_elog = _expected_log_weights(alpha + counts).mean(axis=0)
+        for _ in range(5):
+            alpha = _inverse_digamma(digamma(alpha.sum()) + mean_elog)
+
+        new_gamma = alpha + counts
+        change = np.abs(new_gamma - gamma).max()
+        gamma = new_gamma
+        if change < tol:
+            return alpha, gamma, iteration, True
+    warnings.warn(
+        f"fit_weights did not converge in {max_iter} iterations "
+        f"(last gamma change {change:.3g} >= tol {tol:g})",
+        RuntimeWarning,
+        stacklevel=2,
+    )
+    return alpha, gamma, max_iter, False
+
+
+def component_probabilities(drags: pd.DataFrame, pellet_tiles) -> np.ndarray:
+    """(drags, components) target probabilities of a likelihood-script table."""
+    probs = hypothesis_probabilities(
+        drags[["agent_ini_pos_x", "agent_ini_pos_y"]].values,
+        drags[["agent_end_pos_x", "agent_end_pos_y"]].values,
+        pellet_tiles,
+    )
+    return np.column_stack([probs, np.full(len(probs), 1 / N_TILES)])
+
+
+@dataclass
+class HierarchicalFit:
+    users: pd.DataFrame  # USER_KEYS per user row
+    n_drags: np.ndarray  # (users,)
+    alpha: np.ndarray  # (components,) population Dirichlet prior
+    gamma: np.ndarray  # (users, components) posterior Dirichlet of each user
+    iterations: int
+    converged: bool
+
+    @classmethod
+    def from_drags(cls, drags: pd.DataFrame, pellet_tiles, **kwargs):
+        """Fit of a random.csv / smooth.csv table; no data_source gets ""."""
+        if "data_source" not in drags.columns:
+            drags = drags.assign(data_source="")
+        index = pd.MultiIndex.from_frame(drags[USER_KEYS])
+        codes, keys = index.factorize(sort=True)
+        users = keys.to_frame(index=False, name=USER_KEYS)
+        alpha, gamma, iterations, converged = fit_weights(
+            component_probabilities(drags, pellet_tiles), codes, len(users), **kwargs
+        )
+        n_drags = np.bincount(codes, minlength=len(users))
+        return cls(users, n_drags, alpha, gamma, iterations, converged)
+
+    def prior_weights(self) -> np.ndarray:
+        """Population mean weights of the components."""
+        return self.alpha / self.alpha.sum()
+
+    def weights(self) -> np.ndarray:
+        """(users, components) posterior mean weights."""
+        return self.gamma / self.gamma.sum(axis=1, keepdims=True)
+
+    def table(self) -> pd.DataFrame:
+        """Per user: drags, posterior mean and sd of each weight, best hypothesis."""
+        w = self.weights()
+        sd = np.sqrt(w * (1 - w) / (self.gamma.sum(axis=1, keepdims=True) + 1))
+        table = self.users.assign(n_drags=self.n_drags)
+        for j, name in enumerate(COMPONENTS):
+            table[f"w_{name}"] = w[:, j]
+        for j, name in enumerate(COMPONENTS):
+            table[f"sd_{name}"] = sd[:, j]
+        best = w[:, : len(HYPOTHESES)].argmax(axis=1)
+        table["best_hypothesis"] = np.array(HYPOTHESES)[best]
+        return table
+
+
+def in_sample_winners(drags: pd.DataFrame, pellet_tiles) -> pd.Series:
+    """analyze_user_data's best hypothesis per user (slow: 4 fits per user)."""
+    return drags.groupby(USER_KEYS).apply(
+        lambda g: analyze_user_data(g, pellet_tiles)[0]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--layout", choices=list(PELLET_TILES), help="one layout (default: both)"
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="also run the per-user analyze_user_data fits",
+    )
+    parser.add_argument("--out", help="write the per-user table (CSV)")
+    args = parser.parse_args()
+
+    layouts = [args.layout] if args.layout else list(PELLET_TILES)
+    tables = read_study_tables(layouts)
+    results = []
+    for layout in layouts:
+        drags = tables[layout]
+        start = time.perf_counter()
+        fit = HierarchicalFit.from_drags(drags, PELLET_TILES[layout])
+        seconds = time.perf_counter() - start
+        print(
+            f"\n[{layout}] {len(fit.users)} users, {len(drags)} drags: "
+            f"{fit.iterations} iterations, {seconds:.2f}s"
+            + ("" if fit.converged else " (NOT converged)")
+        )
+        prior = ", ".join(
+            f"{name} {w:.3f}" for name, w in zip(COMPONENTS, fit.prior_weights())
+        )
+        print(f"Population weights: {prior} (concentration {fit.alpha.sum():.2f})")
+
+        table = fit.table().assign(layout=layout)
+        if args.compare:
+            winners = in_sample_winners(drags, PELLET_TILES[layout])
+            table = table.merge(
+                winners.rename("in_sample_best").reset_index(), on=USER_KEYS
+            )
+            agree = table["best_hypothesis"] == table["in_sample_best"]
+            print(f"Same best hypothesis as analyze_user_data: {agree.mean():.1%}")
+            print(pd.crosstab(table["in_sample_best"], table["best_hypothesis"]))
+        print("Best hypothesis:", table["best_hypothesis"].value_counts().to_dict())
+        results.append(table)
+
+    if args.out:
+        pd.concat(results, ignore_index=True).to_csv(args.out, index=False)
+        print(f"\nSaved to {args.out}")
+
+
+if __name__ == "__main__":
+    profiling.rerun_profiled()
+    main()
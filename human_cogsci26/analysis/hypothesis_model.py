@@ -0,0 +1,229 @@
+"""Intervention-target hypothesis model (H1-H4) and its per-user fit.
+
+Importable version of the model in study_data/data/{clean,pilot}/
+likehood_*_user.py, which run their analysis at import time. The pellet
+layout is an argument instead of a module global; results are identical.
+
+    H1 Undoing                  target is the drag start tile
+    H2 Correction               pellet tiles in the 5x5 neighbourhood
+    H3 Exploration-encouraging  non-pellet tiles of the 5x5 neighbourhood
+                                with a pellet in their own 3x3 neighbourhood
+    H4 Restart                  the remaining non-pellet 5x5 tiles
+
+A target in S_H has probability lambda/N_H + (1-lambda)/64, any other tile
+(1-lambda)/64; an empty S_H gives the uniform 1/64.
+
+hypothesis_probabilities() gives each drag's target probability under every
+pure hypothesis (lambda = 1) at once; any fit over many users or lambdas is
+then array arithmetic on that (drags, hypotheses) table.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+
+from common import GRID_SIZE
+
+N_TILES = GRID_SIZE**2
+HYPOTHESES = ["H1", "H2", "H3", "H4"]
+HYPOTHESIS_NAMES = {
+    "H1": "Undoing",
+    "H2": "Correction",
+    "H3": "Exploration-encouraging",
+    "H4": "Restart",
+}
+# Starting lambda of the L-BFGS-B search for each hypothesis
+INITIAL_LAMBDA = {"H1": 0.8, "H2": 0.5, "H3": 0.7, "H4": 0.7}
+BISECTION_STEPS = 40  # fit_lambdas brackets lambda to 2**-40
+
+
+def get_neighborhood(center, size: int) -> list[tuple[int, int]]:
+    """All in-grid tiles of the size x size square centred on `center`."""
+    x, y = center
+    radius = size // 2
+    neighbors = []
+    for dx in range(-radius, radius + 1):
+        for dy in range(-radius, radius + 1):
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < GRID_SIZE and 0 <= ny < GRID_SIZE:
+                neighbors.append((nx, ny))
+    return neighbors
+
+
+def has_adjacent_pellet(tile, pellets: set) -> bool:
+    """Whether the 3x3 neighbourhood of `tile` contains a pellet tile."""
+    return any(t in pellets for t in get_neighborhood(tile, 3))
+
+
+def compute_SH(hypothesis: str, start_pos, pellet_tiles) -> list[tuple[int, int]]:
+    """Tiles predicted by `hypothesis` for a drag starting at `start_pos`."""
+    pellets = {tuple(int(v) for v in t) for t in pellet_tiles}
+    start = tuple(int(v) for v in start_pos)
+
+    if hypothesis == "H1":
+        return [start]
+
+    neighborhood = get_neighborhood(start, 5)
+    if hypothesis == "H2":
+        return [t for t in neighborhood if t in pellets]
+    if hypothesis == "H3":
+        return [
+            t
+            for t in neighborhood
+            if t not in pellets and has_adjacent_pellet(t, pellets)
+        ]
+    if hypothesis == "H4":
+        return [
+            t
+            for t in neighborhood
+            if t not in pellets and not has_adjacent_pellet(t, pellets)
+        ]
+    raise ValueError(f"Unknown hypothesis: {hypothesis}")
+
+
+def negative_log_likelihood(lambda_H, interventions, targets, hypothesis, pellet_tiles):
+    """Negative log-likelihood of the drag targets under one hypothesis."""
+    lambda_H = float(np.squeeze(lambda_H))
+    total = 0.0
+    for start_pos, target_pos in zip(interventions, targets):
+        S_H = compute_SH(hypothesis, start_pos, pellet_tiles)
+        N_H = len(S_H)
+
+        target_pos = tuple(int(v) for v in target_pos)
+        if N_H > 0:
+            if target_pos in S_H:
+                prob = lambda_H / N_H + (1 - lambda_H) / N_TILES
+            else:
+                prob = (1 - lambda_H) / N_TILES
+        else:
+            prob = 1.0 / N_TILES
+
+        total -= np.log(max(prob, 1e-10))
+    return total
+
+
+@lru_cache(maxsize=None)
+def _membership(pellets: tuple, size: int) -> np.ndarray:
+    """(hypotheses, size**2, size**2) S_H membership of positions x * size + y."""
+    masks = np.zeros((len(HYPOTHESES), size * size, size * size), dtype=bool)
+    for start in range(size * size):
+        for h, hypo in enumerate(HYPOTHESES):
+            S_H = compute_SH(hypo, divmod(start, size), pellets)
+            masks[h, start, [x * size + y for x, y in S_H]] = True
+    return masks
+
+
+def _pellet_key(pellet_tiles) -> tuple:
+    return tuple(tuple(int(v) for v in t) for t in pellet_tiles)
+
+
+def hypothesis_masks(pellet_tiles) -> np.ndarray:
+    """(hypotheses, 64, 64) S_H membership by start and target tile (x * 8 + y)."""
+    return _membership(_pellet_key(pellet_tiles), GRID_SIZE)
+
+
+def hypothesis_probabilities(interventions, targets, pellet_tiles) -> np.ndarray:
+    """(drags, hypotheses) probability of each target under each pure hypothesis.
+
+    1/N_H if the target is in S_H, 0 if not, and 1/64 for an empty S_H, so that
+    negative_log_likelihood(lam, ..., hypothesis) equals
+    -sum(log(max(lam * p + (1 - lam) / 64, 1e-10))) over that hypothesis' column.
+    Positions are truncated to tiles as in compute_SH; the one-past-the-edge
+    positions of the logs are kept.
+    """
+    starts = np.asarray(interventions, dtype=float).astype(int).reshape(-1, 2)
+    ends = np.asarray(targets, dtype=float).astype(int).reshape(-1, 2)
+    if (starts < 0).any() or (ends < 0).any():
+        raise ValueError("drag positions must be non-negative")
+    size = max(GRID_SIZE, starts.max(initial=0) + 1, ends.max(initial=0) + 1)
+
+    masks = _membership(_pellet_key(pellet_tiles), size)
+    n_h = masks.sum(axis=2, keepdims=True)
+    table = np.where(n_h > 0, masks / np.maximum(n_h, 1), 1 / N_TILES)
+    start = starts[:, 0] * size + starts[:, 1]
+    end = ends[:, 0] * size + ends[:, 1]
+    return table[:, start, end].T
+
+
+def fit_lambdas(probs, users, n_users=None) -> tuple[np.ndarray, np.ndarray]:
+    """Maximum-likelihood lambda of every (user, hypothesis) at once.
+
+    `probs` are the hypothesis_probabilities of the drags and `users` the user
+    row (0 .. n_users - 1) of each. Returns (lambdas, log-likelihoods), both
+    (users, hypotheses), the batched counterpart of analyze_user_data's
+    "lambda" and "likelihood". A drag's probability is
+    (1 + lambda * (64 p - 1)) / 64, so each user enters only through counts of
+    their distinct p values; the log-likelihood is concave in lambda and the
+    zero of its derivative is bisected on [0, 1] for all users together.
+    """
+    probs = np.asarray(probs, dtype=float)
+    users = np.asarray(users)
+    n_users = users.max() + 1 if n_users is None else n_users
+    values, codes = np.unique(probs, return_inverse=True)
+    h, v = probs.shape[1], len(values)
+    cells = (users[:, None] * h + np.arange(h)) * v + codes.reshape(probs.shape)
+    counts = np.bincount(cells.ravel(), minlength=n_users * h * v)
+    counts = counts.reshape(n_users, h, v).astype(float)
+    slope = values * N_TILES - 1
+
+    def derivative(lam):
+        return (counts * slope / (1 + lam[..., None] * slope)).sum(axis=-1)
+
+    lo, hi = np.zeros((n_users, h)), np.ones((n_users, h))
+    for _ in range(BISECTION_STEPS):
+        mid = (lo + hi) / 2
+        rising = derivative(mid) > 0
+        lo, hi = np.where(rising, mid, lo), np.where(rising, hi, mid)
+    lam = np.where(derivative(np.zeros((n_users, h))) > 0, (lo + hi) / 2, 0.0)
+
+    prob = np.maximum((1 + lam[..., None] * slope) / N_TILES, 1e-10)
+    return lam, (counts * np.log(prob)).sum(axis=-1)
+
+
+def log_likelihoods(lambdas, probs, users, n_users=None) -> np.ndarray:
+    """(users, hypotheses) log-likelihood of the drags at the given lambdas.
+
+    `lambdas` is (users, hypotheses), e.g. fitted by fit_lambdas on other
+    drags of the same users; `probs` and `users` are as for fit_lambdas.
+    """
+    probs = np.asarray(probs, dtype=float)
+    users = np.asarray(users)
+    n_users = len(lambdas) if n_users is None else n_users
+    lam = np.asarray(lambdas)[users]
+    prob = np.maximum(lam * probs + (1 - lam) / N_TILES, 1e-10)
+    h = probs.shape[1]
+    flat = np.bincount(
+        (users[:, None] * h + np.arange(h)).ravel(),
+        weights=np.log(prob).ravel(),
+        minlength=n_users * h,
+    )
+    return flat.reshape(n_users, h)
+
+
+def analyze_user_data(user_data: pd.DataFrame, pellet_tiles):
+    """Fit lambda for every hypothesis on one user's drags.
+
+    Returns (best_hypothesis, {hypothesis: {lambda, likelihood, success}}).
+    """
+    interventions = user_data[["agent_ini_pos_x", "agent_ini_pos_y"]].values
+    targets = user_data[["agent_end_pos_x", "agent_end_pos_y"]].values
+
+    results = {}
+    for hypo in HYPOTHESES:
+        res = minimize(
+            negative_log_likelihood,
+            x0=INITIAL_LAMBDA[hypo],
+            args=(interventions, targets, hypo, pellet_tiles),
+            bounds=[(0, 1)],
+            method="L-BFGS-B",
+        )
+        results[hypo] = {
+            "lambda": res.x[0],
+            "likelihood": -res.fun,
+            "success": res.success,
+        }
+
+    best_hypo = max(results, key=lambda h: results[h]["likelihood"])
+    return best_hypo, results
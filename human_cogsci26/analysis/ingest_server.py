@@ -0,0 +1,661 @@
+"""Asynchronous ingestion of the frontend's trajectory uploads.
+
+Local stand-in for the /api/upload/mongo backend, storing into SQLite and
+exporting straight to the study CSV schema:
+
+    python analysis/ingest_server.py serve --db uploads.sqlite [--port 8123]
+    python analysis/ingest_server.py export --db uploads.sqlite OUT_DIR
+
+    POST /api/upload/mongo     {"_id": "<user>_<round>", "data": [[traj, ...], ...]}
+                               (DataLog.testDataFunc, one list per agent)
+    POST /api/upload/batch     NDJSON, one {"_id", "agent_id", "seq", "traj"} per
+                               line; seq is the trajectory's index for its agent
+    GET  /api/export/<table>   one study table as CSV
+
+Bodies may be gzip-compressed (Content-Encoding: gzip) and chunked; NDJSON
+lines are stored as they stream in. The global states carried by every
+trajectory are stored per round as a keyframe + delta chain
+(state_codec.py), agent objects once per distinct content, and a re-posted
+trajectory is ignored. One writer commits
+everything that is pending in a single transaction, and each request is
+answered once its rows are committed.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from common import PELLET_TILES, layout_of
+from state_codec import StateChain, canonical, decode
+
+# state field -> the time it was taken
+STATE_FIELDS = {"start_state": "st_time", "cur_state": "end_time"}
+SNAPSHOT_FIELDS = ("agent_type",)
+FLUSH_ROWS = 5000
+FLUSH_SECONDS = 0.05
+MAX_HEADER_BYTES = 64 * 1024
+ROUND_SECONDS = 100
+SAMPLE_PERIOD = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    hash TEXT PRIMARY KEY,
+    body BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS states (
+    upload_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    base INTEGER,
+    body BLOB NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (upload_id, idx)
+);
+CREATE TABLE IF NOT EXISTS trajs (
+    upload_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    round INTEGER NOT NULL,
+    agent_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    doc TEXT NOT NULL,
+    start_state INTEGER,
+    cur_state INTEGER,
+    agent_type TEXT,
+    PRIMARY KEY (upload_id, agent_id, seq)
+);
+"""
+
+# Study CSV columns, as uploaded by Timer(old).tsx
+ACTION_COLUMNS = [
+    "agent_st_pos_x", "agent_st_pos_y", "agent_end_pos_x", "agent_end_pos_y",
+    "agent_ini_pos_x", "agent_ini_pos_y", "agent_id", "duration", "user_id",
+    "round", "st_time_relative", "end_time_relative", "is_optimal", "q_value",
+    "expected_q_value",
+]
+TRY_COLUMNS = [
+    "user_id", "round", "agent_id", "agent_st_pos_x", "agent_st_pos_y",
+    "q_value", "expected_q_value", "is_optimal",
+]
+END_COUNT_COLUMNS = ["user_id", "round", "agent_id", "tile_x", "tile_y", "cnt"]
+SCORE_COLUMNS = ["score", "agent_id", "time", "user_id", "round"]
+
+
+def parse_upload_id(upload_id: str) -> tuple[str, int]:
+    """`${user_id}_${round}` -> (user_id, round)."""
+    user_id, _, round_id = str(upload_id).rpartition("_")
+    if not user_id or not round_id.isdigit():
+        raise ValueError(f"Bad upload id: {upload_id!r}")
+    return user_id, int(round_id)
+
+
+def check_item(upload_id, agent_id, seq, traj) -> tuple[str, int, int, dict]:
+    """An uploaded trajectory with integer agent_id and seq; ValueError if bad."""
+    if not isinstance(traj, dict):
+        raise ValueError(f"trajectory is not an object: {str(traj)[:40]!r}")
+    parse_upload_id(upload_id)
+    try:
+        return str(upload_id), int(agent_id), int(seq), traj
+    except TypeError as e:
+        raise ValueError(f"bad agent_id or seq: {e}") from e
+
+
+# ==================== Storage ====================
+
+
+def _timestamp(value) -> float:
+    """Seconds of an ISO time; states without one sort first."""
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return float("-inf")
+
+
+class TrajStore:
+    """SQLite document store; all calls come from the single writer thread.
+
+    The start/end states of each round go into `states` as a keyframe +
+    delta chain (state_codec.py); trajectories refer to them by index.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.known = {h for (h,) in self.conn.execute("SELECT hash FROM snapshots")}
+        self.chains: dict[str, StateChain] = {}
+
+    def chain(self, upload_id) -> StateChain:
+        if upload_id not in self.chains:
+            records = self.conn.execute(
+                "SELECT idx, base, body, hash FROM states WHERE upload_id = ?",
+                (upload_id,),
+            ).fetchall()
+            self.chains[upload_id] = StateChain.resume(records)
+        return self.chains[upload_id]
+
+    def store(self, items) -> set:
+        """Encode and insert items; returns the keys of the new trajectories.
+
+        The chains advance on copies that replace self.chains only once the
+        transaction has committed, so after a failure no later delta is
+        based on a state that was never stored.
+        """
+        chains = {}
+        new = self.write(*self.encode(items, chains))
+        self.chains.update(chains)
+        return new
+
+    def encode(self, items, chains) -> tuple[list, list, list]:
+        """(upload_id, agent_id, seq, traj) items -> trajs, snapshot, state rows.
+
+        Each round's new states are chained in time order (start states at
+        st_time, end states at end_time), whatever order they arrive in.
+        The chains used are copies, collected in `chains`.
+        """
+        rows, snapshots, pending = [], [], {}
+        # new hashes join self.known only once write() has committed them
+        new_hashes = set()
+        for upload_id, agent_id, seq, traj in items:
+            user_id, round_id = parse_upload_id(upload_id)
+            doc = {
+                k: v
+                for k, v in traj.items()
+                if k not in SNAPSHOT_FIELDS and k not in STATE_FIELDS
+            }
+            row = [upload_id, user_id, round_id, agent_id, seq, json.dumps(doc)]
+            for field, time_field in STATE_FIELDS.items():
+                state = traj.get(field)
+                if state is not None:
+                    time = _timestamp(traj.get(time_field) or traj.get("st_time"))
+                    pending.setdefault(upload_id, []).append((time, len(rows), len(row)))
+                row.append(state)
+            for field in SNAPSHOT_FIELDS:
+                value = traj.get(field)
+                if value is not None:
+                    body = canonical(value)
+                    value = hashlib.sha1(body).hexdigest()
+                    if value not in self.known and value not in new_hashes:
+                        new_hashes.add(value)
+                        snapshots.append((value, zlib.compress(body)))
+                row.append(value)
+            rows.append(row)
+
+        states = []
+        for upload_id, refs in pending.items():
+            if upload_id not in chains:
+                base = self.chain(upload_id)
+                chains[upload_id] = StateChain(
+                    base.hashes, base.tail, base.tail_idx, base.since_keyframe
+                )
+            chain = chains[upload_id]
+            for _, i, j in sorted(refs, key=lambda ref: ref[0]):
+                rows[i][j], record = chain.add(rows[i][j])
+                if record is not None:
+                    states.append((upload_id, *record))
+        return [tuple(row) for row in rows], snapshots, states
+
+    def write(self, rows, snapshots, states) -> set:
+        """Insert in one transaction; returns the keys of the new trajectories."""
+        existing = set()
+        for upload_id in {row[0] for row in rows}:
+            existing.update(
+                (upload_id, agent_id, seq)
+                for agent_id, seq in self.conn.execute(
+                    "SELECT agent_id, seq FROM trajs WHERE upload_id = ?", (upload_id,)
+                )
+            )
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO snapshots VALUES (?, ?)", snapshots
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO states VALUES (?, ?, ?, ?, ?)", states
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO trajs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        self.known.update(digest for digest, _ in snapshots)
+        return {(row[0], row[3], row[4]) for row in rows} - existing
+
+
+class BulkWriter:
+    """Queues rows from many requests and commits them together."""
+
+    def __init__(self, store: TrajStore):
+        self.store = store
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, items) -> int:
+        """Store (upload_id, agent_id, seq, traj) items; returns how many were new.
+
+        Items must have passed check_item().
+        """
+        done = asyncio.get_running_loop().create_future()
+        await self.queue.put((items, done))
+        return await done
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + FLUSH_SECONDS
+            while sum(len(items) for items, _ in batch) < FLUSH_ROWS:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                counts = await loop.run_in_executor(self.executor, self._write, batch)
+            except Exception as e:
+                for *_, done in batch:
+                    if not done.done():
+                        done.set_exception(e)
+                continue
+            for (*_, done), count in zip(batch, counts):
+                if not done.done():
+                    done.set_result(count)
+
+    def _write(self, batch) -> list[int]:
+        """Commit a batch of requests; returns the new-row count of each.
+
+        Hashing and delta encoding run here, on the writer thread, off the
+        event loop.
+        """
+        new = self.store.store([item for items, _ in batch for item in items])
+        counts = []
+        for items, _ in batch:
+            keys = {(upload_id, agent_id, seq) for upload_id, agent_id, seq, _ in items}
+            keys &= new
+            new -= keys
+            counts.append(len(keys))
+        return counts
+
+
+# ==================== HTTP ====================
+
+
+class BadRequest(Exception):
+    pass
+
+
+async def _read_head(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    if len(head) > MAX_HEADER_BYTES:
+        raise BadRequest("headers too large")
+    lines = head.decode("latin-1").split("\r\n")
+    method, path, _ = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+    return method, path, headers
+
+
+async def _body(reader, headers):
+    """Yield the decoded request body in chunks (chunked and/or gzip)."""
+    gz = (
+        zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if headers.get("content-encoding", "").lower() == "gzip"
+        else None
+    )
+
+    def decode(data):
+        return gz.decompress(data) if gz else data
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                await reader.readline()
+                break
+            data = await reader.readexactly(size)
+            await reader.readexactly(2)
+            yield decode(data)
+    else:
+        remaining = int(headers.get("content-length", 0))
+        while remaining > 0:
+            data = await reader.read(min(remaining, 1 << 20))
+            if not data:
+                raise BadRequest("truncated body")
+            remaining -= len(data)
+            yield decode(data)
+    if gz:
+        yield gz.flush()
+
+
+def _response(status: int, body: bytes, content_type="application/json") -> bytes:
+    head = (
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    )
+    return head.encode() + body
+
+
+def _json_response(status: int, payload) -> bytes:
+    return _response(status, json.dumps(payload).encode())
+
+
+class IngestServer:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.writer = BulkWriter(TrajStore(db_path))
+
+    async def upload_mongo(self, body) -> dict:
+        chunks = [chunk async for chunk in body]
+        try:
+            payload = json.loads(b"".join(chunks))
+            upload_id = payload["_id"]
+            items = [
+                check_item(upload_id, agent_id, seq, traj)
+                for agent_id, trajs in enumerate(payload["data"])
+                for seq, traj in enumerate(trajs or [])
+            ]
+        except (ValueError, KeyError, TypeError) as e:
+            raise BadRequest(f"bad upload: {e}") from e
+        return {"received": len(items), "stored": await self.writer.submit(items)}
+
+    async def upload_batch(self, body) -> dict:
+        pending, received, stored, buffer = [], 0, 0, b""
+
+        def parse(line):
+            try:
+                item = json.loads(line)
+                return check_item(
+                    item["_id"], item["agent_id"], item["seq"], item["traj"]
+                )
+            except (ValueError, KeyError, TypeError) as e:
+                raise BadRequest(f"bad line {received + 1}: {e}") from e
+
+        async for chunk in body:
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            for line in filter(bytes.strip, lines):
+                pending.append(parse(line))
+                received += 1
+            if len(pending) >= FLUSH_ROWS:
+                stored += await self.writer.submit(pending)
+                pending = []
+        if buffer.strip():
+            pending.append(parse(buffer))
+            received += 1
+        if pending:
+            stored += await self.writer.submit(pending)
+        return {"received": received, "stored": stored}
+
+    async def route(self, method, path, body) -> bytes:
+        if method == "POST" and path == "/api/upload/mongo":
+            return _json_response(200, await self.upload_mongo(body))
+        if method == "POST" and path == "/api/upload/batch":
+            return _json_response(200, await self.upload_batch(body))
+        if method == "GET" and path.startswith("/api/export/"):
+            return await self.export_table(path.rsplit("/", 1)[-1])
+        return _json_response(404, {"error": "unknown path"})
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    method, path, headers = await _read_head(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except (BadRequest, asyncio.LimitOverrunError, ValueError) as e:
+                    # an oversized or garbled head: answer, then drop the connection
+                    writer.write(_json_response(400, {"error": f"bad request: {e}"}))
+                    await writer.drain()
+                    break
+                try:
+                    out = await self.route(method, path, _body(reader, headers))
+                    close = headers.get("connection", "").lower() == "close"
+                except (
+                    BadRequest,
+                    asyncio.LimitOverrunError,
+                    ValueError,
+                    TypeError,
+                    zlib.error,
+                ) as e:
+                    # the rest of the body is unread, so the connection is dropped
+                    out, close = _json_response(400, {"error": str(e)}), True
+                writer.write(out)
+                await writer.drain()
+                if close:
+                    break
+        finally:
+            writer.close()
+
+    async def export_table(self, name) -> bytes:
+        if name not in EXPORTERS:
+            return _json_response(404, {"error": f"unknown table {name!r}"})
+        loop = asyncio.get_running_loop()
+        frame = await loop.run_in_executor(
+            self.writer.executor, lambda: export_tables(self.db_path, [name])[name]
+        )
+        return _response(200, frame.to_csv(index=False).encode(), "text/csv")
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        writer_task = asyncio.create_task(self.writer.run())
+        print(f"Ingesting into {self.db_path} on http://{host}:{port}/api/upload")
+        async with server:
+            try:
+                await server.serve_forever()
+            finally:
+                writer_task.cancel()
+
+
+# ==================== Export ====================
+
+
+# TrajDataType fields the exports read
+DOC_COLUMNS = [
+    "agent_st_pos_x", "agent_st_pos_y", "agent_end_pos_x", "agent_end_pos_y",
+    "qValue", "expected_qValue", "duration", "st_time", "end_time",
+    "was_dragP", "cancelP", "is_optimal",
+]
+
+
+def _load(db_path) -> pd.DataFrame:
+    """Stored trajectories, one row each, with nested positions flattened."""
+    if not Path(db_path).exists():
+        raise FileNotFoundError(f"No upload store at {db_path}")
+    with sqlite3.connect(db_path) as conn:
+        trajs = pd.read_sql_query(
+            "SELECT upload_id, user_id, round, agent_id, seq, doc, start_state,"
+            " cur_state FROM trajs ORDER BY upload_id, agent_id, seq",
+            conn,
+        )
+    docs = pd.json_normalize([json.loads(d) for d in trajs.pop("doc")], sep="_")
+    docs = docs.reindex(columns=docs.columns.union(DOC_COLUMNS, sort=False))
+    docs = docs.drop(columns=docs.columns.intersection(trajs.columns))
+    frame = pd.concat([trajs, docs], axis=1)
+    for col in ("st_time", "end_time"):
+        frame[col] = pd.to_datetime(frame[col], utc=True, format="ISO8601")
+    for col in ("was_dragP", "cancelP", "is_optimal"):
+        frame[col] = frame[col].astype("boolean").fillna(False).astype(bool)
+    user = pd.to_numeric(frame["user_id"], errors="coerce")
+    if user.notna().all():
+        frame["user_id"] = user.astype("int64")
+    return frame
+
+
+def _zero_times(frame) -> pd.Series:
+    """getStartTime(): agent 0's first trajectory start, per upload."""
+    ordered = frame.sort_values(["upload_id", "agent_id", "seq"])
+    first = ordered.groupby("upload_id")["st_time"].first()
+    return frame["upload_id"].map(first)
+
+
+def _relative_seconds(times, zero) -> pd.Series:
+    return (times - zero).dt.total_seconds().round(1)
+
+
+def _export_actions(frame) -> pd.DataFrame:
+    """Drags, paired by order with the same agent's cancelled moves."""
+    key = ["upload_id", "agent_id"]
+    zero = _zero_times(frame)
+    drags = frame[frame["was_dragP"]]
+    drags = drags.assign(
+        k=drags.groupby(key).cumcount(),
+        st_time_relative=_relative_seconds(drags["st_time"], zero),
+        end_time_relative=_relative_seconds(drags["end_time"], zero),
+    )
+    cancels = frame[frame["cancelP"]]
+    cancels = cancels.assign(k=cancels.groupby(key).cumcount())
+    cancels = cancels[key + ["k", "agent_st_pos_x", "agent_st_pos_y", "is_optimal",
+                             "qValue", "expected_qValue"]]
+    cancels = cancels.rename(
+        columns={
+            "agent_st_pos_x": "agent_ini_pos_x",
+            "agent_st_pos_y": "agent_ini_pos_y",
+            "qValue": "q_value",
+            "expected_qValue": "expected_q_value",
+        }
+    )
+    actions = drags.drop(columns=["is_optimal"]).merge(cancels, on=key + ["k"], how="left")
+    actions["is_optimal"] = actions["is_optimal"].astype("boolean").astype("Int64")
+    return actions[ACTION_COLUMNS]
+
+
+def _export_tries(frame) -> pd.DataFrame:
+    """getTryTraj(): every trajectory without an end position."""
+    tries = frame[frame["agent_end_pos_x"].isna()]
+    tries = tries.rename(columns={"qValue": "q_value", "expected_qValue": "expected_q_value"})
+    tries = tries.assign(is_optimal=tries["is_optimal"].astype(int))
+    return tries[TRY_COLUMNS].reset_index(drop=True)
+
+
+def _export_end_counts(frame) -> pd.DataFrame:
+    """Completed moves and drags ending on each pellet tile of the layout."""
+    ends = frame[frame["agent_end_pos_x"].notna()]
+    counts = ends.groupby(
+        ["upload_id", "agent_id", "agent_end_pos_x", "agent_end_pos_y"]
+    ).size()
+    rows = []
+    for upload_id, group in frame.groupby("upload_id"):
+        user_id, round_id = group["user_id"].iloc[0], int(group["round"].iloc[0])
+        for agent_id in sorted(group["agent_id"].unique()):
+            for x, y in PELLET_TILES[layout_of(round_id)]:
+                cnt = counts.get((upload_id, agent_id, x, y), 0)
+                rows.append((user_id, round_id, agent_id, x, y, int(cnt)))
+    return pd.DataFrame(rows, columns=END_COUNT_COLUMNS)
+
+
+def read_states(db_path, upload_ids=None) -> dict[str, list]:
+    """Decoded state chains per upload; trajs' state columns index into them."""
+    query = "SELECT upload_id, idx, base, body FROM states ORDER BY upload_id, idx"
+    chains = {}
+    with sqlite3.connect(db_path) as conn:
+        for upload_id, idx, base, body in conn.execute(query):
+            if upload_ids is None or upload_id in upload_ids:
+                chains.setdefault(upload_id, []).append((idx, base, body))
+    return {upload_id: decode(records) for upload_id, records in chains.items()}
+
+
+def _export_scores(frame, db_path) -> pd.DataFrame:
+    """Per-agent score every 0.5 s, read off the stored states.
+
+    The client sampled its live score; here each sample takes the latest
+    state (start state at st_time, end state at end_time) before it.
+    """
+    chains = read_states(db_path, set(frame["upload_id"]))
+    zero = _zero_times(frame)
+    points = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "upload_id": frame["upload_id"],
+                    "t": _relative_seconds(frame[time_col], zero),
+                    "state": frame[state_col],
+                }
+            )
+            for time_col, state_col in (("st_time", "start_state"), ("end_time", "cur_state"))
+        ],
+        ignore_index=True,
+    ).dropna()
+    points["scores"] = [
+        chains[upload_id][int(idx)].get("agent_scores")
+        for upload_id, idx in zip(points["upload_id"], points["state"])
+    ]
+    points = points.dropna()
+
+    grid = np.arange(1, int(ROUND_SECONDS / SAMPLE_PERIOD) + 1) * SAMPLE_PERIOD
+    meta = frame.groupby("upload_id")[["user_id", "round"]].first()
+    rows = []
+    for upload_id, group in points.sort_values("t", kind="stable").groupby("upload_id"):
+        user_id, round_id = meta.loc[upload_id]
+        values = group["scores"].to_numpy()
+        idx = np.searchsorted(group["t"].to_numpy(), grid, side="right") - 1
+        for time, i in zip(grid, idx):
+            current = values[i] if i >= 0 else [0] * len(values[0])
+            for agent_id, score in enumerate(current):
+                rows.append((score, agent_id, time, user_id, int(round_id)))
+    return pd.DataFrame(rows, columns=SCORE_COLUMNS)
+
+
+EXPORTERS = {
+    "user_data_action": lambda frame, db: _export_actions(frame),
+    "user_data_try": lambda frame, db: _export_tries(frame),
+    "user_data_end_counts": lambda frame, db: _export_end_counts(frame),
+    "user_data": _export_scores,
+}
+EXPORT_COLUMNS = {
+    "user_data_action": ACTION_COLUMNS,
+    "user_data_try": TRY_COLUMNS,
+    "user_data_end_counts": END_COUNT_COLUMNS,
+    "user_data": SCORE_COLUMNS,
+}
+
+
+def export_tables(db_path, names=None) -> dict[str, pd.DataFrame]:
+    frame = _load(db_path)
+    if frame.empty:
+        return {name: pd.DataFrame(columns=EXPORT_COLUMNS[name]) for name in names or EXPORTERS}
+    return {name: EXPORTERS[name](frame, db_path) for name in names or EXPORTERS}
+
+
+def export(db_path, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    for name, table in export_tables(db_path).items():
+        table.to_csv(Path(out_dir) / f"{name}.csv", index=False)
+        print(f"{name}.csv: {len(table)} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve")
+    serve.add_argument("--db", default="uploads.sqlite")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8123)
+    out = sub.add_parser("export")
+    out.add_argument("--db", default="uploads.sqlite")
+    out.add_argument("out_dir")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        try:
+            asyncio.run(IngestServer(args.db).serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        export(args.db, args.out_dir)
+
+
+if __name__ == "__main__":
+    main()
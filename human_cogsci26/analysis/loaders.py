@@ -0,0 +1,171 @@
+"""Readers for the study tables used by the expected-Q figures.
+
+Mirrors the loading code of study_data/data/expected_q.py and
+yuanbao_python_20251003_WjTaCE.py, but each table is read once and the
+per-type / per-setting selections are done in memory.
+"""
+
+import os
+
+import pandas as pd
+
+from common import DATA_DIR, DATA_FOLDERS, get_interpret_type
+
+
+def read_main(data_dir=DATA_DIR) -> pd.DataFrame:
+    """user_data_q.csv of clean + pilot, restricted to each folder's valid users."""
+    parts = []
+    for folder in DATA_FOLDERS:
+        path = os.path.join(data_dir, folder)
+        stats = os.path.join(path, "user_round_statistics.csv")
+        data = os.path.join(path, "user_data_q.csv")
+        if not (os.path.exists(stats) and os.path.exists(data)):
+            continue
+        valid = pd.read_csv(stats)["user_id"].unique()
+        df = pd.read_csv(data)
+        df = df[df["user_id"].isin(valid)].copy()
+        df["interpret_type"] = df["user_id"].apply(get_interpret_type)
+        df["data_source"] = folder
+        parts.append(df)
+    if not parts:
+        raise RuntimeError(f"No main data found under {data_dir}")
+    return pd.concat(parts, ignore_index=True)
+
+
+def read_study_tables(names, data_dir=DATA_DIR) -> dict[str, pd.DataFrame]:
+    """Participant tables (e.g. "user_data_try") of clean + pilot.
+
+    Each table is restricted to its folder's valid users and tagged with a
+    `data_source` column; user ids are only unique within a folder.
+    """
+    parts = {name: [] for name in names}
+    for folder in DATA_FOLDERS:
+        path = os.path.join(data_dir, folder)
+        stats = os.path.join(path, "user_round_statistics.csv")
+        if not os.path.exists(stats):
+            continue
+        valid = pd.read_csv(stats)["user_id"].unique()
+        for name in names:
+            file = os.path.join(path, f"{name}.csv")
+            if not os.path.exists(file):
+                continue
+            df = pd.read_csv(file)
+            df = df[df["user_id"].isin(valid)].copy()
+            df["data_source"] = folder
+            parts[name].append(df)
+    missing = [name for name, dfs in parts.items() if not dfs]
+    if missing:
+        raise RuntimeError(f"No {', '.join(missing)} tables found under {data_dir}")
+    return {name: pd.concat(dfs, ignore_index=True) for name, dfs in parts.items()}
+
+
+def iter_study_table(name: str, chunksize: int, data_dir=DATA_DIR):
+    """read_study_tables for one table, streamed in chunks of `chunksize` rows.
+
+    Yields the chunks of clean, then pilot, in file order, filtered to the
+    folder's valid users and tagged with `data_source`.
+    """
+    found = False
+    for folder in DATA_FOLDERS:
+        path = os.path.join(data_dir, folder)
+        stats = os.path.join(path, "user_round_statistics.csv")
+        file = os.path.join(path, f"{name}.csv")
+        if not (os.path.exists(stats) and os.path.exists(file)):
+            continue
+        found = True
+        valid = pd.read_csv(stats)["user_id"].unique()
+        for chunk in pd.read_csv(file, chunksize=chunksize):
+            chunk = chunk[chunk["user_id"].isin(valid)].copy()
+            chunk["data_source"] = folder
+            yield chunk
+    if not found:
+        raise RuntimeError(f"No {name} tables found under {data_dir}")
+
+
+def read_black_setting(setting: int, data_dir=DATA_DIR) -> pd.DataFrame:
+    """Simulated no-intervention runs (black/setting<n>/run_<k>.csv), steps <= 33."""
+    spath = os.path.join(data_dir, "black", f"setting{setting}")
+    runs = []
+    for run_id in range(1, 51):
+        file = os.path.join(spath, f"run_{run_id}.csv")
+        if not os.path.exists(file):
+            continue
+        df = pd.read_csv(file)
+        df = df[df["step"] <= 33].copy()
+        df["time"] = df["step"] * 3
+        df["run_id"] = run_id
+        runs.append(df[["time", "ExpectedQvalue", "agentid", "run_id"]])
+    return pd.concat(runs, ignore_index=True) if runs else pd.DataFrame()
+
+
+def read_pooled_stats(data_dir=DATA_DIR) -> pd.DataFrame:
+    """user_round_statistics.csv of clean + pilot stacked together."""
+    paths = [
+        os.path.join(data_dir, folder, "user_round_statistics.csv")
+        for folder in DATA_FOLDERS
+    ]
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        return pd.DataFrame()
+    return pd.concat([pd.read_csv(p) for p in paths], ignore_index=True)
+
+
+def read_pooled_q(data_dir=DATA_DIR) -> pd.DataFrame:
+    """user_data_q.csv of clean + pilot stacked together, ids coerced to int."""
+    paths = [
+        os.path.join(data_dir, folder, "user_data_q.csv") for folder in DATA_FOLDERS
+    ]
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        return pd.DataFrame()
+    df = pd.concat([pd.read_csv(p) for p in paths], ignore_index=True)
+    df["user_id"] = pd.to_numeric(df["user_id"], errors="coerce")
+    return df.dropna(subset=["user_id"]).astype({"user_id": "int64", "round": "int64"})
+
+
+def build_black_df(rounds: list[int], data_dir=DATA_DIR) -> pd.DataFrame:
+    """Q trajectories of the no-intervention participants/rounds (val <= 0)."""
+    detailed = pd.read_csv(os.path.join(data_dir, "black", "user_round_counts_detailed.csv"))
+    round_cols = [f"round_{r}" for r in rounds]
+    detailed = detailed[["user_id"] + round_cols].melt(
+        id_vars="user_id", var_name="round_col", value_name="val"
+    )
+    detailed = detailed[detailed["val"] <= 0]
+    detailed["round"] = detailed["round_col"].str.extract(r"round_(\d+)").astype(int)
+
+    black_keys = detailed[["user_id", "round"]].drop_duplicates()
+    black_keys["user_id"] = pd.to_numeric(black_keys["user_id"], errors="coerce")
+    black_keys = black_keys.dropna().astype({"user_id": "int64", "round": "int64"})
+
+    data_path = os.path.join(data_dir, "black", "user_data_q.csv")
+    if not os.path.exists(data_path):
+        return pd.DataFrame()
+    df = pd.read_csv(data_path)
+    df["user_id"] = pd.to_numeric(df["user_id"], errors="coerce")
+    df = df.dropna(subset=["user_id"]).astype({"user_id": "int64", "round": "int64"})
+    return df.merge(black_keys, on=["user_id", "round"], how="inner")
+
+
+def select_colored(
+    stats: pd.DataFrame,
+    q_df: pd.DataFrame,
+    rounds: list[int],
+    itype: int,
+    lower: int,
+    upper: int | None,
+) -> pd.DataFrame:
+    """Q rows of one interpretation type whose mean interventions over `rounds`
+    fall in (lower, upper] (upper=None means unbounded)."""
+    round_cols = [f"round_{r}" for r in rounds]
+    if stats.empty or q_df.empty or not set(round_cols).issubset(stats.columns):
+        return pd.DataFrame()
+    avg_inter = stats[round_cols].mean(axis=1)
+    keep = avg_inter > lower
+    if upper is not None:
+        keep &= avg_inter <= upper
+    ok_users = stats.loc[keep, "user_id"].astype("int64").drop_duplicates()
+    ok_users = ok_users[ok_users.apply(lambda uid: get_interpret_type(uid) == itype)]
+    if ok_users.empty:
+        return pd.DataFrame()
+    df = q_df[q_df["round"].isin(rounds)]
+    return df.merge(ok_users.to_frame("user_id"), on="user_id", how="inner")
@@ -0,0 +1,255 @@
+"""Tile occupancy of every (user, round, agent) from user_data_end_counts.csv.
+
+user_data_end_counts.csv counts, for each pellet tile of the round's layout,
+the completed moves and drags that ended there. Occupancy stores them as an
+int32 tensor of shape (users, rounds, agents, 8, 8), zero off the pellet
+tiles, with a mask of the episodes that were logged. From it, all at once:
+
+    entropy     (users, rounds, agents)   bits of the end-tile distribution
+    coverage    (users, rounds, agents)   share of pellet tiles ended on
+    heatmaps    (types, rounds, agents, 8, 8)   mean counts per type
+
+The arrays of the study data are cached in analysis/figure_tables/occupancy.npz
+for plotting, keyed on the data directory and the mtimes of its source CSVs:
+
+    python analysis/occupancy.py                      # compute, cache, summary
+    python analysis/occupancy.py --plot heatmaps.png  # per-type heatmaps
+"""
+
+import argparse
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from common import (
+    ANALYSIS_DIR,
+    DATA_DIR,
+    DATA_FOLDERS,
+    GRID_SIZE,
+    INTERPRETATION_TYPES,
+    SETTINGS,
+    SETTING_TITLES,
+    get_interpret_type,
+    layout_of,
+)
+from gridworld import pellet_grid
+from loaders import read_study_tables
+from tensors import axis_index
+
+CACHE_PATH = ANALYSIS_DIR / "figure_tables" / "occupancy.npz"
+USER_KEYS = ["data_source", "user_id"]
+TYPES = np.array(sorted(INTERPRETATION_TYPES))
+
+
+@dataclass
+class Occupancy:
+    counts: np.ndarray  # (users, rounds, agents, 8, 8) int32
+    logged: np.ndarray  # (users, rounds, agents) bool
+    users: pd.DataFrame  # data_source, user_id, interpret_type per user row
+    rounds: np.ndarray
+    agents: np.ndarray
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "Occupancy":
+        """Count tensor of a user_data_end_counts table."""
+        users = df[USER_KEYS].drop_duplicates().sort_values(USER_KEYS)
+        users = users.reset_index(drop=True)
+        users["interpret_type"] = users["user_id"].map(get_interpret_type)
+        rounds = np.sort(df["round"].unique())
+        agents = np.sort(df["agent_id"].unique())
+
+        u = pd.MultiIndex.from_frame(users[USER_KEYS]).get_indexer(
+            pd.MultiIndex.from_frame(df[USER_KEYS])
+        )
+        r = np.searchsorted(rounds, df["round"].to_numpy())
+        a = np.searchsorted(agents, df["agent_id"].to_numpy())
+        x, y = df["tile_x"].to_numpy(), df["tile_y"].to_numpy()
+
+        shape = (len(users), len(rounds), len(agents))
+        counts = np.zeros(shape + (GRID_SIZE, GRID_SIZE), dtype=np.int32)
+        np.add.at(counts, (u, r, a, x, y), df["cnt"].to_numpy(dtype=np.int32))
+        logged = np.zeros(shape, dtype=bool)
+        logged[u, r, a] = True
+        return cls(counts, logged, users, rounds, agents)
+
+    def round_index(self, rounds) -> np.ndarray:
+        return axis_index(self.rounds, rounds, "round")
+
+    def pellet_masks(self) -> np.ndarray:
+        """(rounds, 8, 8) pellet tiles of each round's layout."""
+        return np.stack([pellet_grid(layout_of(r)) > 0 for r in self.rounds])
+
+    # ---------- metrics ----------
+
+    def entropy(self) -> np.ndarray:
+        """Entropy (bits) of each episode's end tiles; NaN without any."""
+        flat = self.counts.reshape(self.logged.shape + (-1,)).astype(float)
+        total = flat.sum(axis=-1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            p = flat / total[..., None]
+            h = -np.where(p > 0, p * np.log2(p), 0.0).sum(axis=-1)
+        return np.where(self.logged & (total > 0), h, np.nan)
+
+    def coverage(self) -> np.ndarray:
+        """Share of the layout's pellet tiles ended on; NaN if not logged."""
+        pellets = self.pellet_masks()[None, :, None]
+        covered = ((self.counts > 0) & pellets).sum(axis=(-2, -1))
+        share = covered / pellets.sum(axis=(-2, -1))
+        return np.where(self.logged, share, np.nan)
+
+    def heatmaps(self) -> np.ndarray:
+        """(types, rounds, agents, 8, 8) mean counts over each type's users.
+
+        NaN where no user of the type logged the episode.
+        """
+        t = np.searchsorted(TYPES, self.users["interpret_type"].to_numpy())
+        sums = np.zeros((len(TYPES),) + self.counts.shape[1:])
+        n = np.zeros((len(TYPES),) + self.logged.shape[1:])
+        np.add.at(sums, t, self.counts * self.logged[..., None, None])
+        np.add.at(n, t, self.logged)
+        with np.errstate(invalid="ignore"):
+            return sums / n[..., None, None]
+
+    def summary(self) -> pd.DataFrame:
+        """One row per logged episode with its entropy and coverage."""
+        u, r, a = np.nonzero(self.logged)
+        rows = self.users.iloc[u].reset_index(drop=True)
+        return rows.assign(
+            round=self.rounds[r],
+            agent_id=self.agents[a],
+            visits=self.counts[u, r, a].sum(axis=(-2, -1)),
+            entropy=self.entropy()[u, r, a],
+            coverage=self.coverage()[u, r, a],
+        )
+
+    # ---------- cache ----------
+
+    def save(self, path=CACHE_PATH, **stamp) -> None:
+        """Write the tensor and its metrics to one .npz file.
+
+        `stamp` arrays (see read_occupancy) are stored alongside.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez_compressed(
+            path,
+            counts=self.counts,
+            logged=self.logged,
+            data_source=self.users["data_source"].to_numpy(dtype=str),
+            user_id=self.users["user_id"].to_numpy(),
+            rounds=self.rounds,
+            agents=self.agents,
+            entropy=self.entropy(),
+            coverage=self.coverage(),
+            heatmaps=self.heatmaps(),
+            **stamp,
+        )
+
+    @classmethod
+    def load(cls, path=CACHE_PATH) -> "Occupancy":
+        with np.load(path) as f:
+            users = pd.DataFrame(
+                {"data_source": f["data_source"], "user_id": f["user_id"]}
+            )
+            users["interpret_type"] = users["user_id"].map(get_interpret_type)
+            return cls(f["counts"], f["logged"], users, f["rounds"], f["agents"])
+
+
+def source_stamp(data_dir=DATA_DIR) -> dict[str, np.ndarray]:
+    """Resolved data_dir and the mtimes of the CSVs read_occupancy reads.
+
+    RuntimeError if no folder has both end counts and round statistics.
+    """
+    sources = [
+        os.path.join(data_dir, folder, f"{name}.csv")
+        for folder in DATA_FOLDERS
+        for name in ("user_round_statistics", "user_data_end_counts")
+    ]
+    mtimes = [os.stat(p).st_mtime_ns if os.path.exists(p) else -1 for p in sources]
+    if not any(min(pair) >= 0 for pair in zip(mtimes[::2], mtimes[1::2])):
+        raise RuntimeError(f"No user_data_end_counts tables found under {data_dir}")
+    return {
+        "data_dir": np.array(os.path.realpath(data_dir)),
+        "mtimes": np.array(mtimes, dtype=np.int64),
+    }
+
+
+def _is_fresh(cache, stamp: dict[str, np.ndarray]) -> bool:
+    """Whether the cache was written from the same files, unchanged since."""
+    if not os.path.exists(cache):
+        return False
+    with np.load(cache) as f:
+        return all(k in f and np.array_equal(f[k], v) for k, v in stamp.items())
+
+
+def read_occupancy(data_dir=DATA_DIR, cache=None, refresh=False) -> Occupancy:
+    """Occupancy of clean + pilot under data_dir.
+
+    The cache (default: CACHE_PATH for the study data, none otherwise) is
+    used only if it was written from the same directory and source mtimes.
+    """
+    stamp = source_stamp(data_dir)
+    if cache is None and os.path.realpath(data_dir) == os.path.realpath(DATA_DIR):
+        cache = CACHE_PATH
+    if cache is not None and not refresh and _is_fresh(cache, stamp):
+        return Occupancy.load(cache)
+    df = read_study_tables(["user_data_end_counts"], data_dir)["user_data_end_counts"]
+    occupancy = Occupancy.from_frame(df)
+    if cache is not None:
+        occupancy.save(cache, **stamp)
+    return occupancy
+
+
+def plot_heatmaps(occupancy: Occupancy, out_path, dpi=150) -> None:
+    """Types x settings grid of mean end counts (agents summed, rounds averaged)."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    heat = np.nansum(occupancy.heatmaps(), axis=2)  # (types, rounds, 8, 8)
+    fig, axes = plt.subplots(
+        len(TYPES), len(SETTINGS), figsize=(3 * len(SETTINGS), 3 * len(TYPES))
+    )
+    for j, (setting, rounds) in enumerate(SETTINGS.items()):
+        r = occupancy.round_index(rounds)
+        for i, itype in enumerate(TYPES):
+            ax = axes[i, j]
+            # x runs left to right, y top to bottom as on the board
+            ax.imshow(heat[i, r].mean(axis=0).T, cmap="viridis")
+            ax.set_xticks([])
+            ax.set_yticks([])
+            if i == 0:
+                ax.set_title(SETTING_TITLES[setting], fontsize=10)
+            if j == 0:
+                ax.set_ylabel(INTERPRETATION_TYPES[itype])
+    fig.tight_layout()
+    fig.savefig(out_path, dpi=dpi)
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--refresh", action="store_true", help="ignore the cache")
+    parser.add_argument("--plot", help="save per-type heatmaps to this PNG")
+    args = parser.parse_args()
+
+    occupancy = read_occupancy(refresh=args.refresh)
+    print(f"Occupancy {occupancy.counts.shape}, cached in {CACHE_PATH}")
+
+    summary = occupancy.summary()
+    summary["interpret_type"] = summary["interpret_type"].map(INTERPRETATION_TYPES)
+    table = summary.groupby("interpret_type")[["visits", "entropy", "coverage"]]
+    print("\nPer episode, by interpretation type:")
+    print(table.mean().round(3).to_string())
+
+    if args.plot:
+        plot_heatmaps(occupancy, args.plot)
+        print(f"\nHeatmaps saved to {args.plot}")
+
+
+if __name__ == "__main__":
+    profiling.rerun_profiled()
+    main()
@@ -0,0 +1,292 @@
+"""Policy service behind the frontend's /policy proxy (localhost:5000).
+
+Loads every src/policy/trainedPolicy*.json once into a (64, 9) array and
+serves it from memory, so the agent's starting Q-table can be swapped
+without rebuilding the frontend:
+
+    python analysis/policy_server.py [--port 5000]
+    python analysis/policy_server.py --check   # served JSON == the files
+
+    GET  /policy                       available policies and their ETags
+    GET  /policy/<name>                MyMap JSON, trainedPolicy<name>.json as is
+    GET  /policy/<name>/qtable         {"q": 64 x 9 rows, state = x * 8 + y}
+    GET  /policy/<name>/greedy         {"actions": greedy action per state}
+    POST /policy/generate?trainer=value_iteration&layout=smooth[&name=...]
+    POST /policy/generate?trainer=q_learning&episodes=20[&seed=...]
+                                       train a new policy and serve it
+
+Responses are encoded once per policy version. Clients get an ETag and a
+matching If-None-Match is answered with 304. gzip is used when accepted.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from common import GRID_SIZE, POLICY_DIR
+from gridworld import N_ACTIONS, N_STATES, greedy_actions, state_xy
+
+POLICY_PATTERN = "trainedPolicy*.json"
+NAME_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+# ==================== MyMap JSON ====================
+
+
+def _key(x: int, y: int, action: int) -> str:
+    key = {"myPos": {"x": x, "y": y}, "action": action}
+    return json.dumps(key, separators=(",", ":"))
+
+
+def read_policy(path) -> tuple[np.ndarray, np.ndarray]:
+    """(Q, last_action) of a MyMap JSON file.
+
+    Q is the (64, 9) table, entries it lacks stay 0; last_action the _keys
+    action of each tile, NOMOVE where it has none.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    q = np.zeros((N_STATES, N_ACTIONS))
+    for key, value in data["_ogMap"]:
+        k = json.loads(key)
+        q[k["myPos"]["x"] * GRID_SIZE + k["myPos"]["y"], k["action"]] = value
+    last_action = np.full(N_STATES, N_ACTIONS - 1)
+    for k in data.get("_keys", []):
+        last_action[k["myPos"]["x"] * GRID_SIZE + k["myPos"]["y"]] = k["action"]
+    return q, last_action
+
+
+def _js_number(value):
+    """JSON.stringify writes integral numbers without a decimal point."""
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def to_mymap(q: np.ndarray, last_action=None) -> dict:
+    """MyMap.toJSON() of a (64, 9) table, in the agent's insertion order.
+
+    _keys holds the last action set on each tile; a freshly loaded table has
+    NOMOVE everywhere.
+    """
+    if last_action is None:
+        last_action = np.full(N_STATES, N_ACTIONS - 1)
+    xs, ys = state_xy(np.arange(N_STATES))
+    entries = [
+        [_key(int(x), int(y), a), _js_number(q[s, a])]
+        for s, (x, y) in enumerate(zip(xs, ys))
+        for a in range(N_ACTIONS)
+    ]
+    keys = [
+        {"myPos": {"x": int(x), "y": int(y)}, "action": int(a)}
+        for x, y, a in zip(xs, ys, last_action)
+    ]
+    return {"_ogMap": entries, "_keys": keys}
+
+
+# ==================== Trainers ====================
+
+
+def _value_iteration(layout="random", **_):
+    from value_iteration import optimal_tables
+
+    q = np.array(optimal_tables(layout)[0])
+    return np.where(np.isfinite(q), q, 0.0)
+
+
+def _q_learning(layout="random", episodes="20", seed="0", **_):
+    from pretrain import train
+
+    episodes = int(episodes)
+    if episodes < 1:
+        raise ValueError("episodes must be >= 1")
+    result = train(layout, agents=1, episodes=episodes, seed=int(seed))
+    return result.checkpoints[episodes].q[0]
+
+
+# name -> callable(**query params) -> (64, 9) Q-table
+TRAINERS = {"value_iteration": _value_iteration, "q_learning": _q_learning}
+
+
+# ==================== Store ====================
+
+
+class _Encoded:
+    """One response body, encoded once, with its ETag and gzip variant."""
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload, separators=(",", ":")).encode()
+        self.gzip = gzip.compress(self.body, compresslevel=6)
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:16] + '"'
+
+
+class PolicyStore:
+    """In-memory policies and their pre-encoded responses."""
+
+    def __init__(self, policy_dir=POLICY_DIR):
+        self._lock = threading.Lock()
+        self._tables: dict[str, np.ndarray] = {}
+        self._responses: dict[tuple[str, str], _Encoded] = {}
+        self._index = None
+        self.files: dict[str, Path] = {}
+        for path in sorted(Path(policy_dir).glob(POLICY_PATTERN)):
+            name = path.stem[len("trainedPolicy"):] or "default"
+            self.add(name, *read_policy(path))
+            self.files[name] = path
+
+    def add(self, name: str, q: np.ndarray, last_action=None):
+        if not NAME_RE.match(name):
+            raise ValueError(f"Invalid policy name: {name!r}")
+        q = np.asarray(q, dtype=float).reshape(N_STATES, N_ACTIONS)
+        responses = {
+            (name, ""): _Encoded(to_mymap(q, last_action)),
+            (name, "qtable"): _Encoded({"q": q.tolist()}),
+            (name, "greedy"): _Encoded({"actions": greedy_actions(q).tolist()}),
+        }
+        with self._lock:
+            self._tables[name] = q
+            self._responses.update(responses)
+            self._index = None
+
+    def names(self) -> list[str]:
+        return sorted(self._tables)
+
+    def table(self, name: str) -> np.ndarray:
+        return self._tables[name]
+
+    def response(self, name: str, view: str = "") -> _Encoded | None:
+        if name == "" and view == "":
+            with self._lock:
+                if self._index is None:
+                    self._index = _Encoded(
+                        {n: self._responses[(n, "")].etag for n in self.names()}
+                    )
+                return self._index
+        return self._responses.get((name, view))
+
+    def mismatches(self) -> list[str]:
+        """Loaded policies whose GET /policy/<name> body differs from the file."""
+        return [
+            name
+            for name, path in self.files.items()
+            if self._responses[(name, "")].body != path.read_bytes()
+        ]
+
+    def generate(self, trainer: str, name: str | None = None, **params) -> str:
+        if trainer not in TRAINERS:
+            raise KeyError(f"Unknown trainer: {trainer!r}")
+        if name is None:
+            name = "_".join([trainer, *(str(v) for v in params.values())])
+        self.add(name, TRAINERS[trainer](**params))
+        return name
+
+
+# ==================== HTTP ====================
+
+
+class PolicyHandler(BaseHTTPRequestHandler):
+    store: PolicyStore = None
+    protocol_version = "HTTP/1.1"
+    # one write per response on kept-alive connections
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, encoded: _Encoded, cache=True):
+        self.send_response(status)
+        body = encoded.body
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = encoded.gzip
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", encoded.etag)
+        self.send_header("Cache-Control", "no-cache" if cache else "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, _Encoded({"error": message}), cache=False)
+
+    def do_GET(self):
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if parts[0] != "policy" or len(parts) > 3:
+            return self._error(HTTPStatus.NOT_FOUND, "unknown path")
+        name = parts[1] if len(parts) > 1 else ""
+        view = parts[2] if len(parts) > 2 else ""
+        encoded = self.store.response(name, view)
+        if encoded is None:
+            return self._error(HTTPStatus.NOT_FOUND, f"no policy {name!r}/{view!r}")
+        if self.headers.get("If-None-Match") == encoded.etag:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", encoded.etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._send(HTTPStatus.OK, encoded)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if url.path.rstrip("/") != "/policy/generate":
+            return self._error(HTTPStatus.NOT_FOUND, "unknown path")
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        trainer = params.pop("trainer", "value_iteration")
+        name = params.pop("name", None)
+        try:
+            name = self.store.generate(trainer, name, **params)
+        except (KeyError, ValueError, TypeError) as e:
+            message = str(e.args[0]) if e.args else repr(e)
+            return self._error(HTTPStatus.BAD_REQUEST, message)
+        encoded = _Encoded({"name": name, "etag": self.store.response(name).etag})
+        self._send(HTTPStatus.CREATED, encoded, cache=False)
+
+
+def serve(host="127.0.0.1", port=5000, policy_dir=POLICY_DIR):
+    store = PolicyStore(policy_dir)
+    handler = type("Handler", (PolicyHandler,), {"store": store})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Serving {len(store.names())} policies on http://{host}:{port}/policy")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--policy-dir", default=POLICY_DIR, type=Path)
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="check that every served MyMap JSON equals its file, then exit",
+    )
+    args = parser.parse_args()
+    if args.check:
+        store = PolicyStore(args.policy_dir)
+        bad = store.mismatches()
+        print(f"{len(store.files) - len(bad)}/{len(store.files)} policies served as is")
+        if bad:
+            raise SystemExit(f"Served JSON differs from the file: {', '.join(bad)}")
+        return
+    serve(args.host, args.port, args.policy_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""Vectorized Q-learning pretraining of the agent's starting Q-tables.
+
+The src/policy/trainedPolicy*.json tables were trained outside this repo.
+This script trains many agents at once in a tile-level version of the task
+and writes MyMap JSON checkpoints that MyMap.fromJSON (and
+policy_server.py) load as they are:
+
+    python analysis/pretrain.py --agents 10 --levels 4,20,100 --out-dir /tmp/policies
+
+Every agent starts from Q_INIT everywhere and plays whole rounds of
+ROUND_STEPS moves from a random tile. With probability AGENT_EPS a move is
+random (RandAgent: one of the 8 moves that stay on the grid); otherwise it
+is the greedy getPolicy move, ties broken at random. Pellets arrive as in
+the pellet saga, a Poisson stream on the layout's pellet tiles, and stay
+until collected. A move collects the pellets on its destination tile, and
+each pellet on a side tile of a diagonal with probability 1/2. The
+feedback is PELLET_FEEDBACK per pellet, learned with the runLearn update
+(gridworld.td_update). All agents step together, one array operation per
+move.
+
+Progress is the reward per round, smoothed by a rolling mean over WINDOW
+rounds. Its trend at a round is how much it changed over the previous
+WINDOW rounds, relative to its current value. Training has converged at
+the first round from which the trend stays within --tol for WINDOW rounds.
+The test never looks more than WINDOW rounds ahead, so a longer run
+reports the same round; a run without such a stretch is not converged.
+The mean V* - Q*(s, greedy(s)) over all tiles (value_iteration.py) is
+reported as well. It is not used for convergence, because value iteration
+credits arrivals per move and ignores the pellets that pile up on tiles the
+agent neglects.
+"""
+
+import argparse
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from gridworld import (
+    ACTION_DELTAS,
+    AGENT_EPS,
+    DIAGONAL_ACTIONS,
+    MOVE_TIME,
+    EXPECTED_PELLET_TIME,
+    N_ACTIONS,
+    N_STATES,
+    NOMOVE,
+    PELLET_FEEDBACK,
+    Q_INIT,
+    UP,
+    pellet_grid,
+    state_index,
+    state_xy,
+    td_update,
+    valid_action_mask,
+)
+from policy_server import to_mymap
+from value_iteration import regret, transitions
+
+ROUND_STEPS = 65  # median agent steps per 100 s round in user_data_try.csv
+DECIMALS = 4  # as in the checked-in trainedPolicy files
+WINDOW = 20  # rounds of the rolling reward
+
+VALID = valid_action_mask()
+NEXT = transitions()
+# side tiles a diagonal move sweeps past; -1 for straight moves
+_xs, _ys = state_xy(np.arange(N_STATES))
+SIDE_TILES = np.full((N_STATES, N_ACTIONS, 2), -1)
+for _a in DIAGONAL_ACTIONS:
+    _dx, _dy = ACTION_DELTAS[_a]
+    _ok = VALID[:, _a]
+    SIDE_TILES[_ok, _a, 0] = state_index(_xs[_ok] + _dx, _ys[_ok])
+    SIDE_TILES[_ok, _a, 1] = state_index(_xs[_ok], _ys[_ok] + _dy)
+
+
+@dataclass
+class Checkpoint:
+    episode: int
+    q: np.ndarray  # (agents, 64, 9)
+    last_action: np.ndarray  # (agents, 64) last action written per tile
+
+
+@dataclass
+class Training:
+    layout: str
+    checkpoints: dict[int, Checkpoint] = field(default_factory=dict)
+    history: pd.DataFrame | None = None  # one row per (episode, agent)
+    seconds: float = 0.0
+
+
+# ==================== Policy ====================
+
+
+def _greedy(q, s, rng) -> np.ndarray:
+    """getPolicy at states s of each agent: best truthy valid Q, random ties."""
+    vals = q[np.arange(len(s)), s]
+    vals = np.where(VALID[s] & (vals != 0), vals, -np.inf)
+    ties = vals == vals.max(axis=1, keepdims=True)
+    pick = np.argmax(ties * rng.random(ties.shape), axis=1)
+    return np.where(np.isfinite(vals.max(axis=1)), pick, UP)
+
+
+def _random_moves(s, rng) -> np.ndarray:
+    """RandAgent.getMove: a uniform move that stays on the grid, never NOMOVE."""
+    moves = VALID[s].copy()
+    moves[:, NOMOVE] = False
+    return np.argmax(moves * rng.random(moves.shape), axis=1)
+
+
+def greedy_regret(q, layout) -> np.ndarray:
+    """Mean regret of the greedy policy over all tiles, per agent."""
+    greedy = np.where(VALID & (q != 0), q, -np.inf).argmax(axis=-1)
+    return regret(layout, np.arange(N_STATES), greedy).mean(axis=-1)
+
+
+# ==================== Training ====================
+
+
+def train(
+    layout="random",
+    agents=10,
+    episodes=100,
+    levels=(),
+    eps=AGENT_EPS,
+    seed=0,
+) -> Training:
+    """Train `agents` Q-tables for `episodes` rounds each, all in lockstep.
+
+    Checkpoints are kept after each round listed in `levels` and after the
+    last one.
+    """
+    rng = np.random.default_rng(seed)
+    tiles = np.flatnonzero(pellet_grid(layout).ravel())
+    arrivals = MOVE_TIME / EXPECTED_PELLET_TIME
+    rows = np.arange(agents)
+    q = np.full((agents, N_STATES, N_ACTIONS), Q_INIT)
+    last_action = np.full((agents, N_STATES), N_ACTIONS - 1)
+    result = Training(layout)
+    levels = set(levels) | {episodes}
+    history = []
+
+    start = time.perf_counter()
+    for episode in range(1, episodes + 1):
+        s = rng.integers(N_STATES, size=agents)
+        pellets = np.zeros((agents, N_STATES), dtype=int)
+        reward = np.zeros(agents)
+        for _ in range(ROUND_STEPS):
+            a = np.where(
+                rng.random(agents) < eps, _random_moves(s, rng), _greedy(q, s, rng)
+            )
+            s_next = NEXT[s, a]
+            new = rng.multinomial(rng.poisson(arrivals, agents), np.full(len(tiles), 1 / len(tiles)))
+            pellets[:, tiles] += new
+
+            got = pellets[rows, s_next]
+            pellets[rows, s_next] = 0
+            side = SIDE_TILES[s, a]
+            for k in range(2):
+                has = side[:, k] >= 0
+                cells = np.where(has, side[:, k], 0)
+                swept = np.where(has, rng.binomial(pellets[rows, cells], 0.5), 0)
+                pellets[rows, cells] -= swept
+                got += swept
+            fb = PELLET_FEEDBACK * got
+
+            td_update(q, rows, s, a, s_next, fb)
+            last_action[rows, s] = a
+            reward += fb
+            s = s_next
+
+        for agent, (r, k) in enumerate(zip(reward, greedy_regret(q, layout))):
+            history.append((episode, agent, r, k))
+        if episode in levels:
+            result.checkpoints[episode] = Checkpoint(
+                episode, q.copy(), last_action.copy()
+            )
+    result.seconds = time.perf_counter() - start
+    result.history = pd.DataFrame(
+        history, columns=["episode", "agent", "reward", "regret"]
+    )
+    return result
+
+
+def learning_curve(history: pd.DataFrame, window=WINDOW) -> pd.Series:
+    """Rolling mean of the cohort's mean reward per round; NaN before a full window."""
+    mean = history.groupby("episode")["reward"].mean()
+    return mean.rolling(window).mean()
+
+
+def convergence(history: pd.DataFrame, tol=0.05, window=WINDOW) -> int | None:
+    """First round from which the rolling reward's trend stays within tol.
+
+    The trend at a round is the relative change of the rolling reward over
+    the previous window. None if no run of `window` flat rounds was played.
+    """
+    curve = learning_curve(history, window)
+    trend = ((curve - curve.shift(window)) / curve).abs().to_numpy()
+    flat = trend <= tol  # False before two full windows (NaN)
+    if len(flat) < window:
+        return None
+    stays = np.lib.stride_tricks.sliding_window_view(flat, window).all(axis=1)
+    first = np.flatnonzero(stays)
+    return int(curve.index[first[0]]) if len(first) else None
+
+
+# ==================== Output ====================
+
+
+def write_policies(checkpoint: Checkpoint, out_dir) -> list[Path]:
+    """trainedPolicy1.json ... trainedPolicyN.json, one per agent."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for agent, (q, keys) in enumerate(zip(checkpoint.q, checkpoint.last_action)):
+        path = Path(out_dir) / f"trainedPolicy{agent + 1}.json"
+        with open(path, "w") as f:
+            json.dump(to_mymap(np.round(q, DECIMALS), keys), f, separators=(",", ":"))
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--layout", default="random", choices=["random", "smooth"])
+    parser.add_argument("--agents", type=int, default=10)
+    parser.add_argument("--episodes", type=int, default=None,
+                        help="rounds per agent (default: the highest level)")
+    parser.add_argument("--levels", default="4,20,100",
+                        help="comma-separated rounds at which to save checkpoints")
+    parser.add_argument("--eps", type=float, default=AGENT_EPS)
+    parser.add_argument("--tol", type=float, default=0.05,
+                        help="convergence tolerance: relative change per window")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-dir", help="write level<N>/trainedPolicy*.json here")
+    args = parser.parse_args()
+
+    levels = sorted({int(x) for x in args.levels.split(",") if x})
+    episodes = args.episodes or max(levels)
+    result = train(args.layout, args.agents, episodes, levels, args.eps, args.seed)
+    steps = args.agents * episodes * ROUND_STEPS
+    print(
+        f"{args.agents} agents x {episodes} rounds on {args.layout}: "
+        f"{steps:,} updates in {result.seconds:.2f}s"
+    )
+
+    by_round = result.history.groupby("episode")[["reward", "regret"]].mean()
+    curve = learning_curve(result.history)
+    print("\nRound  reward  rolling  regret")
+    for episode in levels:
+        if episode <= episodes:
+            reward, k = by_round.loc[episode]
+            print(f"{episode:5d}  {reward:6.1f}  {curve.loc[episode]:7.1f}  {k:6.3f}")
+
+    rounds = convergence(result.history, args.tol)
+    if rounds is None:
+        print(
+            f"\nNot converged: the rolling reward never changed by less than "
+            f"{args.tol:.0%} per {WINDOW} rounds for {WINDOW} rounds in a row"
+        )
+    else:
+        print(
+            f"\nConverged (rolling reward changes by less than {args.tol:.0%} "
+            f"per {WINDOW} rounds) after {rounds} rounds, "
+            f"{result.seconds * rounds / episodes:.2f}s"
+        )
+
+    if args.out_dir:
+        for episode, checkpoint in sorted(result.checkpoints.items()):
+            if episode in levels:
+                out = Path(args.out_dir) / f"level{episode}"
+                write_policies(checkpoint, out)
+                print(f"Saved {args.agents} policies to {out}")
+
+
+if __name__ == "__main__":
+    profiling.rerun_profiled()
+    main()
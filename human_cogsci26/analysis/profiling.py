@@ -0,0 +1,485 @@
+"""
+Opt-in stage profiler for the analysis scripts.
+
+Runs any script of the repository unchanged while timing the stages that
+dominate its runtime:
+
+    load       pandas.read_csv / read_excel / read_json, and load*/read_* functions
+    smooth     statsmodels lowess, and *lowess* / *smooth* functions
+    bootstrap  *bootstrap* and *_ci functions
+    fit        scipy.optimize.minimize, and *likelihood* / *fit* functions
+    aggregate  pandas groupby(...).apply
+    render     Figure.savefig, and *plot* / *draw* / *render* functions
+
+Library entry points are wrapped in place. Functions defined in the
+repository's own modules (the script itself and anything it imports from
+human_cogsci26/) are matched by name and decorated at import time; the
+source files are not modified. Each span records wall time. With
+COGSCI26_PROFILE=mem it also records the peak of traced allocations; tracemalloc
+slows Python-heavy code several times over and skews the stage shares, so
+take timings from a run without it.
+
+At exit a flame-style tree is printed to stderr and written, together with a
+Chrome trace (chrome://tracing, Perfetto) and a folded-stack file
+(flamegraph.pl, speedscope), to analysis/profiles/ or $COGSCI26_PROFILE_DIR.
+
+Usage (from human_cogsci26/):
+    python analysis/profiling.py study_data/data/expected_q.py
+    COGSCI26_PROFILE=mem python analysis/profiling.py analysis/figure_pipeline.py compute
+    COGSCI26_PROFILE=1 python analysis/build.py expected_q   # every build node
+    COGSCI26_PROFILE=1 python analysis/crossval.py           # scripts with the hook
+
+The environment flag alone only reaches scripts that call rerun_profiled()
+first in their `if __name__ == "__main__":` block (the analysis/ scripts);
+any other script is profiled through this wrapper or build.py.
+"""
+
+import ast
+import builtins
+import functools
+import importlib.abc
+import importlib.machinery
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from common import ANALYSIS_DIR, ROOT_DIR
+
+ENV_FLAG = "COGSCI26_PROFILE"
+ENV_DIR = "COGSCI26_PROFILE_DIR"
+ENV_ACTIVE = "COGSCI26_PROFILE_ACTIVE"  # set inside the profiler's process
+PROFILE_DIR = ANALYSIS_DIR / "profiles"
+
+# Name patterns of repository functions, first match wins
+STAGE_PATTERNS = [
+    ("bootstrap", re.compile(r"bootstrap|_ci$")),
+    ("fit", re.compile(r"likelihood|fit|analyze_user")),
+    ("smooth", re.compile(r"lowess|smooth")),
+    ("load", re.compile(r"^(load|read)_?")),
+    ("render", re.compile(r"plot|draw|render")),
+]
+
+# Chrome trace events shorter than this are only aggregated
+MIN_EVENT_SECONDS = 0.001
+MAX_EVENTS = 50_000
+SUMMARY_MIN_SHARE = 0.005
+
+_DECORATOR = "__cogsci26_stage__"
+
+
+def enabled() -> bool:
+    """Whether profiling was requested through the environment."""
+    return os.environ.get(ENV_FLAG, "").strip().lower() not in ("", "0", "false", "no")
+
+
+def memory_enabled() -> bool:
+    """Whether allocation tracking was requested (COGSCI26_PROFILE=mem)."""
+    return os.environ.get(ENV_FLAG, "").strip().lower() == "mem"
+
+
+def rerun_profiled():
+    """Re-run the calling script under the profiler if COGSCI26_PROFILE is set.
+
+    Library hooks must be installed before the script's imports, so the
+    script runs again in a child `python analysis/profiling.py script ...`
+    and this process exits with its status. Does nothing when profiling is
+    off or already active.
+    """
+    if not enabled() or os.environ.get(ENV_ACTIVE):
+        return
+    script = os.path.abspath(sys.argv[0])
+    proc = subprocess.run([sys.executable, __file__, script, *sys.argv[1:]])
+    sys.exit(proc.returncode)
+
+
+class _Frame:
+    __slots__ = ("path", "start", "child_seconds", "start_mem", "peak")
+
+    def __init__(self, path, start, start_mem):
+        self.path = path
+        self.start = start
+        self.child_seconds = 0.0
+        self.start_mem = start_mem
+        self.peak = start_mem
+
+
+class _Node:
+    __slots__ = ("calls", "seconds", "self_seconds", "peak_bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.self_seconds = 0.0
+        self.peak_bytes = 0
+
+
+class Recorder:
+    """Aggregates nested spans by call path; optionally tracks allocations."""
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.nodes = defaultdict(_Node)
+        self.events = []
+        self.dropped_events = 0
+        self.stack = []
+        self.t0 = time.perf_counter()
+
+    def _mem(self):
+        return tracemalloc.get_traced_memory() if self.memory else (0, 0)
+
+    def enter(self, label: str):
+        current, peak = self._mem()
+        if self.stack:
+            parent = self.stack[-1]
+            parent.peak = max(parent.peak, peak)
+            path = parent.path + (label,)
+        else:
+            path = (label,)
+        if self.memory:
+            tracemalloc.reset_peak()
+        self.stack.append(_Frame(path, time.perf_counter(), current))
+
+    def exit(self):
+        end = time.perf_counter()
+        frame = self.stack.pop()
+        _, peak = self._mem()
+        peak = max(frame.peak, peak)
+        elapsed = end - frame.start
+
+        node = self.nodes[frame.path]
+        node.calls += 1
+        node.seconds += elapsed
+        node.self_seconds += elapsed - frame.child_seconds
+        node.peak_bytes = max(node.peak_bytes, peak - frame.start_mem)
+
+        if self.stack:
+            parent = self.stack[-1]
+            parent.child_seconds += elapsed
+            parent.peak = max(parent.peak, peak)
+
+        if elapsed >= MIN_EVENT_SECONDS:
+            if len(self.events) < MAX_EVENTS:
+                stage, _, name = frame.path[-1].partition(":")
+                self.events.append(
+                    {
+                        "name": name,
+                        "cat": stage,
+                        "ph": "X",
+                        "ts": round((frame.start - self.t0) * 1e6),
+                        "dur": round(elapsed * 1e6),
+                        "pid": os.getpid(),
+                        "tid": 0,
+                    }
+                )
+            else:
+                self.dropped_events += 1
+
+    # ==================== reports ====================
+    def stage_totals(self) -> dict[str, float]:
+        """Self time per stage; time outside any stage span is 'other'."""
+        totals = defaultdict(float)
+        for path, node in self.nodes.items():
+            stage = path[-1].split(":", 1)[0]
+            totals[stage] += node.self_seconds
+        if "script" in totals:
+            totals["other"] = totals.pop("script")
+        return dict(sorted(totals.items(), key=lambda kv: -kv[1]))
+
+    def tree(self) -> list[dict]:
+        """Flat list of call paths in depth-first order, children by time."""
+        children = defaultdict(list)
+        for path in self.nodes:
+            children[path[:-1]].append(path)
+
+        rows = []
+
+        def visit(parent):
+            for path in sorted(children[parent], key=lambda p: -self.nodes[p].seconds):
+                node = self.nodes[path]
+                rows.append(
+                    {
+                        "path": list(path),
+                        "calls": node.calls,
+                        "seconds": node.seconds,
+                        "self_seconds": node.self_seconds,
+                        "peak_mb": node.peak_bytes / 2**20,
+                    }
+                )
+                visit(path)
+
+        visit(())
+        return rows
+
+    def folded(self) -> str:
+        """Folded stacks (one 'a;b;c <microseconds>' line per path)."""
+        return "".join(
+            f"{';'.join(path)} {round(node.self_seconds * 1e6)}\n"
+            for path, node in self.nodes.items()
+            if node.self_seconds > 0
+        )
+
+    def summary(self, total: float) -> str:
+        lines = [f"Profile: {total:.2f}s wall"]
+        lines.append(
+            "  stages: "
+            + ", ".join(
+                f"{stage} {secs:.2f}s ({secs / total:.0%})"
+                for stage, secs in self.stage_totals().items()
+                if total
+            )
+        )
+        lines.append(f"  {'share':>6} {'total':>9} {'self':>9} {'calls':>7} {'peak':>9}")
+        for row in self.tree():
+            share = row["seconds"] / total if total else 0
+            if share < SUMMARY_MIN_SHARE:
+                continue
+            depth = len(row["path"]) - 1
+            bar = "#" * max(1, round(share * 20))
+            peak = f"{row['peak_mb']:.1f}MB" if self.memory else "-"
+            lines.append(
+                f"  {share:6.1%} {row['seconds']:8.2f}s {row['self_seconds']:8.2f}s "
+                f"{row['calls']:>7} {peak:>9}  {'  ' * depth}{row['path'][-1]}  {bar}"
+            )
+        if self.dropped_events:
+            lines.append(f"  ({self.dropped_events} trace events over the cap were dropped)")
+        return "\n".join(lines)
+
+
+_RECORDER: Recorder | None = None
+
+
+def span(stage: str, name: str):
+    """Decorator recording every call of the function as a `stage` span."""
+    label = f"{stage}:{name}"
+
+    def decorate(fn):
+        if getattr(fn, "__cogsci26_wrapped__", False):
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            recorder = _RECORDER
+            if recorder is None:
+                return fn(*args, **kwargs)
+            recorder.enter(label)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                recorder.exit()
+
+        wrapper.__cogsci26_wrapped__ = True
+        return wrapper
+
+    return decorate
+
+
+def stage_of(name: str) -> str | None:
+    for stage, pattern in STAGE_PATTERNS:
+        if pattern.search(name):
+            return stage
+    return None
+
+
+def _stage_decorator(name: str):
+    """Decorator inserted by the source transform (looked up in builtins)."""
+    stage = stage_of(name)
+    return span(stage, name) if stage else (lambda fn: fn)
+
+
+# ==================== source transform ====================
+def decorate_tree(tree: ast.Module) -> ast.Module:
+    """Prepend the stage decorator to stage-named top-level functions/methods."""
+
+    def visit(body):
+        for node in body:
+            if isinstance(node, ast.ClassDef):
+                visit(node.body)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                if stage_of(node.name):
+                    call = ast.Call(
+                        func=ast.Name(id=_DECORATOR, ctx=ast.Load()),
+                        args=[ast.Constant(node.name)],
+                        keywords=[],
+                    )
+                    # outermost, so it sees the fully decorated function
+                    node.decorator_list.insert(0, ast.copy_location(call, node))
+
+    visit(tree.body)
+    return ast.fix_missing_locations(tree)
+
+
+def _is_repo_source(path: str | None) -> bool:
+    if not path or not path.endswith(".py"):
+        return False
+    resolved = Path(path).resolve()
+    return ROOT_DIR in resolved.parents and resolved != Path(__file__).resolve()
+
+
+class _StageLoader(importlib.machinery.SourceFileLoader):
+    """Compiles repository modules with the stage decorators (no bytecode cache)."""
+
+    def get_code(self, fullname):
+        source = self.get_data(self.path)
+        tree = decorate_tree(ast.parse(source, self.path))
+        return compile(tree, self.path, "exec", dont_inherit=True)
+
+
+class _StageFinder(importlib.abc.MetaPathFinder):
+    def find_spec(self, fullname, path, target=None):
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path)
+        if spec is None or not _is_repo_source(spec.origin):
+            return None
+        spec.loader = _StageLoader(fullname, spec.origin)
+        return spec
+
+
+# ==================== library hooks ====================
+def _patch(owner, attr: str, stage: str, name: str | None = None):
+    original = getattr(owner, attr, None)
+    if original is None:
+        return
+    setattr(owner, attr, span(stage, name or attr)(original))
+
+
+def install_library_hooks():
+    """Wrap the pandas/statsmodels/scipy/matplotlib entry points in place.
+
+    Must run before the profiled code does its `from x import y` imports.
+    """
+    try:
+        import pandas as pd
+        from pandas.core.groupby import generic
+    except ImportError:
+        pass
+    else:
+        for reader in ("read_csv", "read_excel", "read_json", "read_parquet"):
+            _patch(pd, reader, "load")
+        _patch(generic.DataFrameGroupBy, "apply", "aggregate", "groupby.apply")
+        _patch(generic.SeriesGroupBy, "apply", "aggregate", "groupby.apply")
+
+    try:
+        from statsmodels.nonparametric import smoothers_lowess
+    except ImportError:
+        pass
+    else:
+        _patch(smoothers_lowess, "lowess", "smooth")
+        # re-exported as sm.nonparametric.lowess
+        import statsmodels.nonparametric.api as nonparametric_api
+
+        nonparametric_api.lowess = smoothers_lowess.lowess
+
+    try:
+        import scipy.optimize
+    except ImportError:
+        pass
+    else:
+        _patch(scipy.optimize, "minimize", "fit")
+
+    try:
+        from matplotlib.figure import Figure
+    except ImportError:
+        pass
+    else:
+        _patch(Figure, "savefig", "render")
+
+
+def install(memory: bool = False) -> Recorder:
+    """Start recording; later imports of repository modules get stage spans."""
+    global _RECORDER
+    if _RECORDER is not None:
+        return _RECORDER
+    builtins.__dict__[_DECORATOR] = _stage_decorator
+    sys.meta_path.insert(0, _StageFinder())
+    install_library_hooks()
+    if memory:
+        tracemalloc.start()
+    _RECORDER = Recorder(memory=memory)
+    return _RECORDER
+
+
+# ==================== runner ====================
+def run_script(script: str, argv: list[str]):
+    """Execute `script` as __main__ (like `python script ...`) with stage spans."""
+    path = Path(script).resolve()
+    source = path.read_bytes()
+    code = compile(decorate_tree(ast.parse(source, str(path))), str(path), "exec")
+
+    module = types.ModuleType("__main__")
+    module.__file__ = str(path)
+    module.__builtins__ = builtins
+    old_main, old_argv, old_path0 = sys.modules["__main__"], sys.argv, sys.path[0]
+    sys.modules["__main__"] = module
+    sys.argv = [str(path)] + argv
+    sys.path[0] = str(path.parent)
+    try:
+        exec(code, module.__dict__)
+    finally:
+        sys.modules["__main__"] = old_main
+        sys.argv = old_argv
+        sys.path[0] = old_path0
+
+
+def write_reports(recorder: Recorder, script: str, argv: list[str], total: float, status):
+    out_dir = Path(os.environ.get(ENV_DIR) or PROFILE_DIR)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stem = f"{Path(script).stem}-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+
+    trace = {
+        "traceEvents": recorder.events,
+        "displayTimeUnit": "ms",
+        "otherData": {
+            "script": script,
+            "argv": argv,
+            "status": status,
+            "wall_seconds": total,
+            "memory": recorder.memory,
+            "stages": recorder.stage_totals(),
+            "tree": recorder.tree(),
+            "dropped_events": recorder.dropped_events,
+        },
+    }
+    json_path = out_dir / f"{stem}.json"
+    json_path.write_text(json.dumps(trace))
+    (out_dir / f"{stem}.folded").write_text(recorder.folded())
+    return json_path
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help"):
+        print(__doc__.strip())
+        return 0 if len(sys.argv) >= 2 else 2
+
+    script, argv = sys.argv[1], sys.argv[2:]
+    os.environ[ENV_ACTIVE] = "1"
+    recorder = install(memory=memory_enabled())
+
+    status = 0
+    recorder.enter(f"script:{Path(script).name}")
+    started = time.perf_counter()
+    try:
+        run_script(script, argv)
+    except SystemExit as exc:
+        status = exc.code if isinstance(exc.code, int) else (0 if exc.code is None else 1)
+    except BaseException:
+        status = 1
+        raise
+    finally:
+        total = time.perf_counter() - started
+        while recorder.stack:
+            recorder.exit()
+        print(recorder.summary(total), file=sys.stderr)
+        path = write_reports(recorder, script, argv, total, status)
+        print(f"Profile trace written to {path}", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""Parameter recovery of the H1-H4 lambda model on synthetic participants.
+
+Each simulated user gets a true hypothesis (uniform over H1-H4) and a true
+lambda (uniform on --lambda-range). They drag as many times as a participant
+resampled from the study's random.csv / smooth.csv, from start tiles
+resampled from the same table. Every target follows the model:
+
+    with probability lambda   a uniform tile of S_H (any tile if S_H is empty)
+    otherwise                 a uniform tile of the grid
+
+All users are refitted with hypothesis_model.fit_lambdas, the batched form
+of analyze_user_data, in chunks of CHUNK_USERS. The report gives the
+confusion matrix of the fitted best hypothesis and the lambda error of the
+true hypothesis, by number of drags:
+
+    python analysis/recovery.py                         # 100k users per layout
+    python analysis/recovery.py --users 20000 --out recovery.csv
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from common import PELLET_TILES
+from gridworld import N_STATES, in_grid, state_index, state_xy
+from hypothesis_model import (
+    HYPOTHESES,
+    fit_lambdas,
+    hypothesis_masks,
+    hypothesis_probabilities,
+)
+from loaders import read_study_tables
+
+N_USERS = 100_000
+CHUNK_USERS = 10_000
+LAMBDA_RANGE = (0.0, 1.0)
+DRAG_BINS = [0, 10, 25, 50, 100, 200, np.inf]
+DRAG_LABELS = ["<10", "10-24", "25-49", "50-99", "100-199", "200+"]
+
+
+@dataclass
+class StudyDesign:
+    """What is resampled from the study: drags per user and start tiles."""
+
+    drags_per_user: np.ndarray
+    start_states: np.ndarray  # in-grid start tile of every logged drag
+
+    @classmethod
+    def from_drags(cls, drags: pd.DataFrame) -> "StudyDesign":
+        if "data_source" not in drags.columns:
+            drags = drags.assign(data_source="")
+        x = drags["agent_ini_pos_x"].to_numpy(dtype=float).astype(int)
+        y = drags["agent_ini_pos_y"].to_numpy(dtype=float).astype(int)
+        return cls(
+            drags.groupby(["data_source", "user_id"]).size().to_numpy(),
+            state_index(x, y)[in_grid(x, y)],
+        )
+
+
+def simulate_users(rng, design: StudyDesign, n_users: int, pellet_tiles, lambdas):
+    """(truth, users, starts, targets) of n_users synthetic participants.
+
+    `truth` has one row per user (hypothesis, lambda, n_drags); the other
+    three are per drag, with positions as (x, y) tiles.
+    """
+    hypothesis = rng.integers(0, len(HYPOTHESES), n_users)
+    lam = rng.uniform(*lambdas, n_users)
+    n_drags = rng.choice(design.drags_per_user, n_users)
+    users = np.repeat(np.arange(n_users), n_drags)
+    s = rng.choice(design.start_states, len(users))
+
+    # S_H tiles of each (hypothesis, start) first, so a uniform one is
+    # order[h, s, floor(u * size)]
+    masks = hypothesis_masks(pellet_tiles)
+    order = np.argsort(~masks, axis=-1, kind="stable")
+    size = masks.sum(axis=-1)
+    h = hypothesis[users]
+    n_h = size[h, s]
+    pick = np.floor(rng.random(len(users)) * np.maximum(n_h, 1)).astype(int)
+    on_hypothesis = (rng.random(len(users)) < lam[users]) & (n_h > 0)
+    target = np.where(
+        on_hypothesis, order[h, s, pick], rng.integers(0, N_STATES, len(users))
+    )
+
+    truth = pd.DataFrame(
+        {"true_hypothesis": hypothesis, "true_lambda": lam, "n_drags": n_drags}
+    )
+    return truth, users, np.column_stack(state_xy(s)), np.column_stack(state_xy(target))
+
+
+def recover(
+    rng, design: StudyDesign, n_users: int, pellet_tiles, lambdas=LAMBDA_RANGE
+) -> pd.DataFrame:
+    """Truth and batched refit of n_users synthetic users, one row each."""
+    parts = []
+    for first in range(0, n_users, CHUNK_USERS):
+        n = min(CHUNK_USERS, n_users - first)
+        truth, users, starts, targets = simulate_users(
+            rng, design, n, pellet_tiles, lambdas
+        )
+        probs = hypothesis_probabilities(starts, targets, pellet_tiles)
+        lam, loglik = fit_lambdas(probs, users, n)
+        rows = np.arange(n)
+        parts.append(
+            truth.assign(
+                best_hypothesis=loglik.argmax(axis=1),
+                fitted_lambda=lam[rows, truth["true_hypothesis"]],
+            )
+        )
+    return pd.concat(parts, ignore_index=True)
+
+
+def confusion(results: pd.DataFrame) -> pd.DataFrame:
+    """Share of each true hypothesis' users fitted to each hypothesis."""
+    table = pd.crosstab(
+        results["true_hypothesis"], results["best_hypothesis"], normalize="index"
+    )
+    table = table.reindex(
+        index=range(len(HYPOTHESES)), columns=range(len(HYPOTHESES)), fill_value=0
+    )
+    table.index = pd.Index(HYPOTHESES, name="true")
+    table.columns = pd.Index(HYPOTHESES, name="fitted")
+    return table
+
+
+def lambda_errors(results: pd.DataFrame) -> pd.DataFrame:
+    """Bias, MAE and RMSE of the true hypothesis' lambda, by drags per user."""
+    error = results["fitted_lambda"] - results["true_lambda"]
+    bins = pd.cut(results["n_drags"], DRAG_BINS, right=False, labels=DRAG_LABELS)
+    grouped = error.groupby(bins, observed=True)
+    return pd.DataFrame(
+        {
+            "users": grouped.size(),
+            "bias": grouped.mean(),
+            "mae": grouped.apply(lambda e: e.abs().mean()),
+            "rmse": grouped.apply(lambda e: np.sqrt((e**2).mean())),
+            "correct": (results["best_hypothesis"] == results["true_hypothesis"])
+            .groupby(bins, observed=True)
+            .mean(),
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=N_USERS, help="per layout")
+    parser.add_argument(
+        "--lambda-range",
+        type=float,
+        nargs=2,
+        default=LAMBDA_RANGE,
+        metavar=("LOW", "HIGH"),
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the per-user results (CSV)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    tables = read_study_tables(list(PELLET_TILES))
+    results = []
+    for layout, pellets in PELLET_TILES.items():
+        design = StudyDesign.from_drags(tables[layout])
+        start = time.perf_counter()
+        result = recover(rng, design, args.users, pellets, args.lambda_range)
+        seconds = time.perf_counter() - start
+        print(
+            f"\n[{layout}] {args.users:,} users, {result['n_drags'].sum():,} drags "
+            f"(median {result['n_drags'].median():.0f} per user): {seconds:.1f}s"
+        )
+        with pd.option_context("display.precision", 3, "display.width", 120):
+            print("Best hypothesis by true hypothesis:")
+            print(confusion(result))
+            print("Lambda of the true hypothesis, by drags per user:")
+            print(lambda_errors(result))
+        results.append(result.assign(layout=layout))
+
+    if args.out:
+        out = pd.concat(results, ignore_index=True)
+        for column in ("true_hypothesis", "best_hypothesis"):
+            out[column] = np.array(HYPOTHESES)[out[column]]
+        out.to_csv(args.out, index=False)
+        print(f"\nSaved to {args.out}")
+
+
+if __name__ == "__main__":
+    profiling.rerun_profiled()
+    main()
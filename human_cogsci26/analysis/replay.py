@@ -0,0 +1,686 @@
+"""Offline replay of each participant's agent learning.
+
+Rebuilds the 64x9 Q-table trajectory of every (user, round, agent) episode
+from the logged tables, in one batched pass over all episodes:
+
+    python analysis/replay.py                  # replay clean + pilot, report fidelity
+    python analysis/replay.py --out q.npz      # also save the trajectories
+    python analysis/replay.py --counterfactual rules.csv   # all six rules
+
+The agent's moves are read off user_data_try.csv: every self move logs its
+start tile together with the live Q(s, a) of the chosen move, and a move
+cancelled by a drag logs the same record twice. Drags are paired with those
+cancelled moves in order (user_data_action.csv), and the feedback of each
+move, cancel and release is recovered from the per-agent score series
+(user_data.csv) with a timing model anchored on the drag times. Each event
+is then replayed with the learning rule of the participant's interpretation
+type (QLearnAgent2.runLearn).
+
+The try tile of a cancelled move is not logged; it is inferred as the move
+whose replayed Q and expected probability match the logged q_value and
+expected_q_value. The logged q_value of every completed move is the check:
+the replay is exact when the replayed Q(s, a) equals it. The report gives
+this share twice: one step ahead (replay_study's resync, every updated entry
+re-anchored to its logged value first) and free-running (no resync, errors
+carry over to later events).
+
+Trajectories are stored as one (entry, value) write per event, so the table
+before any event is recovered by replaying those writes (`table_at`).
+"""
+
+import argparse
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from common import INTERPRETATION_TYPES, get_interpret_type, layout_of
+from gridworld import (
+    ACTION_DELTAS,
+    HUM_INT_FB,
+    N_ACTIONS,
+    N_STATES,
+    NOMOVE,
+    Q_INIT,
+    expected_probabilities,
+    greedy_actions,
+    in_grid,
+    infer_action,
+    state_index,
+    state_xy,
+    td_update,
+    teacher_optimal_mask,
+    valid_action_mask,
+)
+from loaders import read_study_tables
+
+EPISODE_KEYS = ["data_source", "user_id", "round", "agent_id"]
+
+# Event kinds
+MOVE, DRAG, CANCEL, TAIL = range(4)
+KIND_NAMES = ("MOVE", "DRAG", "CANCEL", "TAIL")
+
+# Interpretation types (HumIntInterp)
+SUGGESTION, RESET, INTERRUPT, TRANSITION, DISRUPT, IMPEDE = sorted(INTERPRETATION_TYPES)
+
+# Quality of an inferred try action
+TRY_MATCHED, TRY_PROB_ONLY, TRY_GUESSED = range(3)
+
+Q_TOLERANCE = 1e-3
+PROB_TOLERANCE = 1e-6
+SAMPLE_PERIOD = 0.5  # seconds between score samples
+
+LAYOUTS = ("random", "smooth")
+EXPECTED = np.stack([expected_probabilities(layout) for layout in LAYOUTS])
+TEACHER_OPTIMAL = np.stack([teacher_optimal_mask(layout) for layout in LAYOUTS])
+VALID_MOVES = valid_action_mask()
+VALID_MOVES[:, NOMOVE] = False
+
+
+# ==================== Events ====================
+
+
+@dataclass
+class Events:
+    """Replay events of a set of episodes, padded to (B, T).
+
+    `episodes` has one row per episode (EPISODE_KEYS, interpret_type,
+    layout, n_events). Per-event arrays are (B, T); padding has kind -1.
+    `s`/`dest` are state indices (-1 off the grid); `dest` is the next start
+    tile of a move and the drop tile of a drag. `try_row` indexes the start
+    record in the try table the events were parsed from.
+    """
+
+    episodes: pd.DataFrame
+    kind: np.ndarray
+    s: np.ndarray
+    dest: np.ndarray
+    try_row: np.ndarray
+    q_logged: np.ndarray
+    prob_logged: np.ndarray
+    t_down: np.ndarray
+    t_up: np.ndarray
+    start: np.ndarray = None
+    fb_move: np.ndarray = None
+    fb_cancel: np.ndarray = None
+    fb_release: np.ndarray = None
+    unmatched_drags: int = 0
+
+    @property
+    def shape(self):
+        return self.kind.shape
+
+    @property
+    def layout_index(self) -> np.ndarray:
+        return self.episodes["layout"].map(LAYOUTS.index).to_numpy()
+
+
+def _tile_state(x, y):
+    x, y = np.asarray(x, dtype=int), np.asarray(y, dtype=int)
+    return np.where(in_grid(x, y), state_index(x, y), -1)
+
+
+def _parse_episode(tries: pd.DataFrame, drags: pd.DataFrame) -> tuple[list, int]:
+    """Events of one episode from its try rows and its drags (by start time).
+
+    A start record followed by an identical record is a cancelled move; it is
+    a DRAG when the next unmatched drag picked the agent up on that tile, a
+    CANCEL (round end) otherwise. Returns (events, unmatched drag count).
+    """
+    xs = tries["agent_st_pos_x"].to_numpy()
+    ys = tries["agent_st_pos_y"].to_numpy()
+    q = tries["q_value"].to_numpy()
+    prob = tries["expected_q_value"].to_numpy()
+    rows = tries.index.to_numpy()
+    ini_x = drags["agent_ini_pos_x"].to_numpy()
+    ini_y = drags["agent_ini_pos_y"].to_numpy()
+    drop = _tile_state(
+        np.floor(drags["agent_end_pos_x"].to_numpy()),
+        np.floor(drags["agent_end_pos_y"].to_numpy()),
+    )
+    t_down = drags["st_time_relative"].to_numpy()
+    t_up = drags["end_time_relative"].to_numpy()
+
+    events = []
+    n, d, i = len(rows), 0, 0
+    while i < n:
+        s = int(_tile_state(xs[i], ys[i]))
+        base = (s, rows[i], q[i], prob[i])
+        repeated = (
+            i + 1 < n
+            and xs[i + 1] == xs[i]
+            and ys[i + 1] == ys[i]
+            and q[i + 1] == q[i]
+            and prob[i + 1] == prob[i]
+        )
+        if repeated and d < len(ini_x) and ini_x[d] == xs[i] and ini_y[d] == ys[i]:
+            events.append((DRAG, *base, int(drop[d]), t_down[d], t_up[d]))
+            d += 1
+            i += 2
+        elif repeated:
+            events.append((CANCEL, *base, -1, np.nan, np.nan))
+            i += 2
+        elif i + 1 < n:
+            dest = int(_tile_state(xs[i + 1], ys[i + 1]))
+            events.append((MOVE, *base, dest, np.nan, np.nan))
+            i += 1
+        else:
+            events.append((TAIL, *base, -1, np.nan, np.nan))
+            i += 1
+    return events, len(ini_x) - d
+
+
+def parse_events(tries: pd.DataFrame, actions: pd.DataFrame) -> Events:
+    """Parse every episode of the try/action tables into padded events."""
+    drags_by_episode = {
+        key: group.sort_values("st_time_relative", kind="stable")
+        for key, group in actions.groupby(EPISODE_KEYS, sort=False)
+    }
+    no_drags = actions.iloc[:0]
+
+    keys, parsed, unmatched = [], [], 0
+    for key, group in tries.groupby(EPISODE_KEYS, sort=True):
+        events, lost = _parse_episode(group, drags_by_episode.get(key, no_drags))
+        keys.append(key)
+        parsed.append(events)
+        unmatched += lost
+
+    episodes = pd.DataFrame(keys, columns=EPISODE_KEYS)
+    episodes["interpret_type"] = episodes["user_id"].map(get_interpret_type)
+    episodes["layout"] = episodes["round"].map(layout_of)
+    episodes["n_events"] = [len(events) for events in parsed]
+
+    n_ep, n_t = len(parsed), max(episodes["n_events"].max(), 1)
+    columns = [
+        ("kind", -1, np.int8),
+        ("s", -1, np.int16),
+        ("try_row", -1, np.int64),
+        ("q_logged", np.nan, float),
+        ("prob_logged", np.nan, float),
+        ("dest", -1, np.int16),
+        ("t_down", np.nan, float),
+        ("t_up", np.nan, float),
+    ]
+    arrays = {name: np.full((n_ep, n_t), fill, dtype=dt) for name, fill, dt in columns}
+    for b, events in enumerate(parsed):
+        if not events:
+            continue
+        for (name, _, _), values in zip(columns, zip(*events)):
+            arrays[name][b, : len(events)] = values
+    return Events(episodes=episodes, unmatched_drags=unmatched, **arrays)
+
+
+# ==================== Timing and feedback ====================
+
+
+def _event_starts(kind, t_down, t_up, n, t_end) -> np.ndarray:
+    """Start time of each event, anchored on the drags and the round end.
+
+    The event after a drag starts at its mouse-up. The events between two
+    anchors share the gap evenly, with the next anchor (a drag's mouse-down
+    or the end of the round) half-way through the last of them.
+    """
+    start = np.empty(n)
+    anchor, anchor_t = 0, 0.0
+    for k in [*np.flatnonzero(kind[:n] == DRAG), n - 1]:
+        m = k - anchor
+        if m < 0:
+            break
+        stop = t_end if k == n - 1 and kind[k] != DRAG else t_down[k]
+        d = max(stop - anchor_t, 0.0) / (m + 0.5)
+        start[anchor : k + 1] = anchor_t + np.arange(m + 1) * d
+        anchor, anchor_t = k + 1, t_up[k]
+    return start
+
+
+def _score_gains(scores: pd.DataFrame) -> dict:
+    """(times, gains) per episode key, from the first upload of each series."""
+    scores = scores.drop_duplicates(EPISODE_KEYS + ["time"], keep="first")
+    scores = scores.sort_values(EPISODE_KEYS + ["time"])
+    out = {}
+    for key, group in scores.groupby(EPISODE_KEYS, sort=False):
+        values = group["score"].to_numpy(dtype=float)
+        out[key] = (group["time"].to_numpy(), np.diff(values, prepend=0.0))
+    return out
+
+
+def assign_feedback(events: Events, scores: pd.DataFrame) -> Events:
+    """Fill in event start times and the move/cancel/release feedback.
+
+    A score gain sampled at time tau happened during (tau - 0.5, tau] and
+    goes to the event running at tau - 0.25: to the move, or for a drag to
+    the cancelled move before mouse-down. While an agent is held its own
+    series only holds other agents' pellets (collisions are credited by
+    index among the agents not being dragged) and nothing is learnt from
+    them. The release score is credited to agent 0 at mouse-up; when agent 0
+    itself is dropped it is not part of any move.
+    """
+    shape = events.shape
+    events.start = np.full(shape, np.nan)
+    events.fb_move = np.zeros(shape)
+    events.fb_cancel = np.zeros(shape)
+    events.fb_release = np.zeros(shape)
+    gains = _score_gains(scores)
+    empty = (np.empty(0), np.empty(0))
+
+    rounds = events.episodes.groupby(EPISODE_KEYS[:3], sort=False).indices
+    for rows in rounds.values():
+        series = {}
+        for b in rows:
+            key = tuple(events.episodes.loc[b, EPISODE_KEYS])
+            times, g = gains.get(key, empty)
+            series[key[-1]] = (times, g.copy())
+
+        times0, gains0 = series.get(0, empty)
+        for b in rows:
+            drags = np.flatnonzero(events.kind[b] == DRAG)
+            j = np.searchsorted(times0, events.t_up[b, drags], side="left")
+            ok = j < len(times0)
+            events.fb_release[b, drags[ok]] = gains0[j[ok]]
+            if events.episodes.at[b, "agent_id"] == 0:
+                gains0[j[ok]] = 0.0
+
+        for b in rows:
+            n = int(events.episodes.at[b, "n_events"])
+            kind, t_down = events.kind[b], events.t_down[b]
+            times, g = series[events.episodes.at[b, "agent_id"]]
+            t_end = times[-1] if len(times) else 0.0
+            start = _event_starts(kind, t_down, events.t_up[b], n, t_end)
+            events.start[b, :n] = start
+
+            hit = g != 0
+            mid, g = times[hit] - SAMPLE_PERIOD / 2, g[hit]
+            e = np.clip(np.searchsorted(start, mid, side="right") - 1, 0, n - 1)
+            dragged = kind[e] == DRAG
+            cancel = dragged & (mid < t_down[e])
+            np.add.at(events.fb_move[b], e[~dragged], g[~dragged])
+            np.add.at(events.fb_cancel[b], e[cancel], g[cancel])
+    return events
+
+
+# ==================== Replay ====================
+
+
+@dataclass
+class Replay:
+    """Batched Q-table trajectories.
+
+    Row b replays episode `episode[b]` under learning rule `rule[b]`. Event t
+    of row b wrote `value[b, t]` to flat entry `entry[b, t]` (state * 9 +
+    action, -1 if the event did not learn). `q_before[b, t]` is the replayed
+    Q of the logged move before the event, comparable with
+    events.q_logged; `try_action`/`try_quality` describe the inferred try
+    move of drags and cancels.
+    """
+
+    events: Events
+    episode: np.ndarray
+    rule: np.ndarray
+    entry: np.ndarray
+    value: np.ndarray
+    q_before: np.ndarray
+    try_action: np.ndarray
+    try_quality: np.ndarray
+    final: np.ndarray = field(repr=False, default=None)
+
+    def table_at(self, b: int, t: int) -> np.ndarray:
+        """(64, 9) Q-table of row b before event t (t = n_events: final)."""
+        q = np.full(N_STATES * N_ACTIONS, Q_INIT)
+        entry, value = self.entry[b, :t], self.value[b, :t]
+        wrote = entry >= 0
+        entry, value = entry[wrote][::-1], value[wrote][::-1]
+        entry, last = np.unique(entry, return_index=True)
+        q[entry] = value[last]
+        return q.reshape(N_STATES, N_ACTIONS)
+
+    def tables(self, b: int) -> np.ndarray:
+        """(n_events + 1, 64, 9) dense trajectory of row b."""
+        n = int(self.events.episodes.at[self.episode[b], "n_events"])
+        out = np.empty((n + 1, N_STATES * N_ACTIONS))
+        out[0] = Q_INIT
+        for t in range(n):
+            out[t + 1] = out[t]
+            if self.entry[b, t] >= 0:
+                out[t + 1, self.entry[b, t]] = self.value[b, t]
+        return out.reshape(n + 1, N_STATES, N_ACTIONS)
+
+    def event_frame(self) -> pd.DataFrame:
+        """One row per (replay row, event) with the logged and replayed Q."""
+        ev = self.events
+        b, t = np.nonzero(ev.kind[self.episode] >= 0)
+        e = self.episode[b]
+        frame = ev.episodes.iloc[e][EPISODE_KEYS].reset_index(drop=True)
+        frame["rule"] = self.rule[b]
+        frame["event"] = t
+        frame["kind"] = np.asarray(KIND_NAMES)[ev.kind[e, t]]
+        frame["try_row"] = ev.try_row[e, t]
+        frame["q_logged"] = ev.q_logged[e, t]
+        frame["q_replayed"] = self.q_before[b, t]
+        frame["try_quality"] = self.try_quality[b, t]
+        return frame
+
+    def save(self, path):
+        ev = self.events
+        episodes = {f"episodes_{c}": ev.episodes[c].to_numpy() for c in ev.episodes}
+        np.savez_compressed(
+            path,
+            **episodes,
+            **{
+                name: getattr(ev, name)
+                for name in (
+                    "kind", "s", "dest", "try_row", "q_logged", "prob_logged",
+                    "t_down", "t_up", "start", "fb_move", "fb_cancel", "fb_release",
+                )
+            },
+            unmatched_drags=ev.unmatched_drags,
+            episode=self.episode,
+            rule=self.rule,
+            entry=self.entry,
+            value=self.value,
+            q_before=self.q_before,
+            try_action=self.try_action,
+            try_quality=self.try_quality,
+            final=self.final,
+        )
+
+    @classmethod
+    def load(cls, path) -> "Replay":
+        with np.load(path, allow_pickle=True) as data:
+            episodes = pd.DataFrame(
+                {k[len("episodes_"):]: data[k] for k in data if k.startswith("episodes_")}
+            )
+            fields = {k: data[k] for k in data if not k.startswith("episodes_")}
+        events = Events(
+            episodes=episodes,
+            unmatched_drags=int(fields.pop("unmatched_drags")),
+            **{
+                k: fields.pop(k)
+                for k in (
+                    "kind", "s", "dest", "try_row", "q_logged", "prob_logged",
+                    "t_down", "t_up", "start", "fb_move", "fb_cancel", "fb_release",
+                )
+            },
+        )
+        return cls(events=events, **fields)
+
+
+def _infer_try(q, s, layout, q_logged, prob_logged):
+    """Try action of cancelled moves from the logged Q and probability.
+
+    q is (n, 9) rows of the replayed tables at s. Prefers the greedy move
+    among the candidates; falls back to a probability-only match, then to
+    the greedy move.
+    """
+    valid = VALID_MOVES[s]
+    prob_ok = valid & (np.abs(EXPECTED[layout, s] - prob_logged[:, None]) < PROB_TOLERANCE)
+    both = prob_ok & (np.abs(q - q_logged[:, None]) < Q_TOLERANCE)
+    greedy = np.where(valid & (q != 0), q, -np.inf).argmax(axis=1)
+    rows = np.arange(len(s))
+
+    action = greedy.copy()
+    quality = np.full(len(s), TRY_GUESSED, dtype=np.int8)
+    for ok, level in ((prob_ok, TRY_PROB_ONLY), (both, TRY_MATCHED)):
+        found = ok.any(axis=1)
+        pick = np.where(ok[rows, greedy], greedy, ok.argmax(axis=1))
+        action = np.where(found, pick, action)
+        quality = np.where(found, level, quality)
+    return action, quality
+
+
+def _drag_updates(rule, s, a_try, dest, fb_cancel, fb_release):
+    """Per-type runLearn update of a drag: (learns, a, s_next, fb, next_known).
+
+    Rules that learn toward the drop tile bootstrap from the agent's
+    mid-move position, which is not a table key.
+    """
+    xs, ys = state_xy(s)
+    try_next = state_index(xs + ACTION_DELTAS[a_try, 0], ys + ACTION_DELTAS[a_try, 1])
+    dx, dy = state_xy(np.maximum(dest, 0))
+    to_drop = infer_action(dx - xs, dy - ys)
+    moved = (dest != s) & (dest >= 0)
+
+    use_try = (rule == RESET) | (rule == IMPEDE) | ((rule == TRANSITION) & ~moved)
+    use_drop = moved & ((rule == SUGGESTION) | (rule == TRANSITION) | (rule == DISRUPT))
+    fb = np.select(
+        [rule == RESET, rule == IMPEDE, rule == SUGGESTION, rule == DISRUPT, use_try],
+        [fb_cancel, HUM_INT_FB, fb_release, HUM_INT_FB, HUM_INT_FB],
+        default=-HUM_INT_FB,
+    )
+    a = np.where(use_try, a_try, to_drop)
+    s_next = np.where(use_try, try_next, 0)
+    return use_try | use_drop, a, s_next, fb, use_try
+
+
+def replay(
+    events: Events, rules=None, episode=None, try_action=None, resync=False
+) -> Replay:
+    """Replay events under the given learning rules, all rows in lock step.
+
+    `episode` selects (and may repeat) episodes, `rules` gives each row's
+    interpretation type (default: the participant's own). Without
+    `try_action` the try moves are inferred from the logged values, which
+    is only meaningful under the participant's own rule.
+
+    With `resync`, an entry whose replayed value disagrees with the logged
+    q_value is reset to the logged value before the event updates it, so a
+    misplaced reward does not carry over into later events. `q_before`
+    still holds the replayed value.
+    """
+    if episode is None:
+        episode = np.arange(len(events.episodes))
+    episode = np.asarray(episode)
+    if rules is None:
+        rules = events.episodes["interpret_type"].to_numpy()[episode]
+    rules = np.asarray(rules)
+    infer = try_action is None
+
+    n_rows, n_t = len(episode), events.shape[1]
+    kind = events.kind[episode]
+    s_all = events.s[episode].astype(int)
+    dest_all = events.dest[episode].astype(int)
+    layout = events.layout_index[episode]
+
+    q = np.full((n_rows, N_STATES, N_ACTIONS), Q_INIT)
+    entry = np.full((n_rows, n_t), -1, dtype=np.int16)
+    value = np.full((n_rows, n_t), np.nan)
+    q_before = np.full((n_rows, n_t), np.nan)
+    quality = np.full((n_rows, n_t), -1, dtype=np.int8)
+    if infer:
+        try_action = np.full((n_rows, n_t), -1, dtype=np.int8)
+
+    for t in range(n_t):
+        k, s, dest = kind[:, t], s_all[:, t], dest_all[:, t]
+        on_grid = s >= 0
+
+        moves = np.flatnonzero((k == MOVE) & on_grid & (dest >= 0))
+        a_move = infer_action(*(np.subtract(state_xy(dest[moves]), state_xy(s[moves]))))
+        q_before[moves, t] = q[moves, s[moves], a_move]
+
+        cut = np.flatnonzero(((k == DRAG) | (k == CANCEL)) & on_grid)
+        e = episode[cut]
+        if infer:
+            a_try, quality[cut, t] = _infer_try(
+                q[cut, s[cut]],
+                s[cut],
+                layout[cut],
+                events.q_logged[e, t],
+                events.prob_logged[e, t],
+            )
+            try_action[cut, t] = a_try
+        a_try = try_action[cut, t].astype(int)
+        q_before[cut, t] = q[cut, s[cut], a_try]
+
+        drags = cut[k[cut] == DRAG]
+        e = episode[drags]
+        learns, a_drag, next_drag, fb_drag, known = _drag_updates(
+            rules[drags],
+            s[drags],
+            try_action[drags, t].astype(int),
+            dest[drags],
+            events.fb_cancel[e, t],
+            events.fb_release[e, t],
+        )
+
+        batch = np.concatenate([moves, drags[learns]])
+        if len(batch) == 0:
+            continue
+        upd_s = s[batch]
+        upd_a = np.concatenate([a_move, a_drag[learns]])
+        upd_next = np.concatenate([dest[moves], next_drag[learns]])
+        fb = np.concatenate([events.fb_move[episode[moves], t], fb_drag[learns]])
+        if resync:
+            logged = events.q_logged[episode[batch], t]
+            a_logged = np.concatenate([a_move, try_action[drags[learns], t]])
+            off = (upd_a == a_logged) & ~(np.abs(q[batch, upd_s, upd_a] - logged) < Q_TOLERANCE)
+            q[batch[off], upd_s[off], upd_a[off]] = logged[off]
+        next_known = np.concatenate([np.ones(len(moves), dtype=bool), known[learns]])
+        value[batch, t] = td_update(q, batch, upd_s, upd_a, upd_next, fb, next_known)
+        entry[batch, t] = upd_s * N_ACTIONS + upd_a
+
+    return Replay(
+        events=events,
+        episode=episode,
+        rule=rules,
+        entry=entry,
+        value=value,
+        q_before=q_before,
+        try_action=try_action,
+        try_quality=quality,
+        final=q,
+    )
+
+
+def replay_study(data_dir=None, resync=True) -> Replay:
+    """Parse, time and replay every episode of clean + pilot."""
+    names = ["user_data_try", "user_data_action", "user_data"]
+    kwargs = {} if data_dir is None else {"data_dir": data_dir}
+    tables = read_study_tables(names, **kwargs)
+    events = parse_events(tables["user_data_try"], tables["user_data_action"])
+    assign_feedback(events, tables["user_data"])
+    return replay(events, resync=resync)
+
+
+# ==================== Counterfactual rules ====================
+
+RULES = np.array(sorted(INTERPRETATION_TYPES))
+
+
+def counterfactual(factual: Replay) -> Replay:
+    """Replay every episode under all six interpretation rules at once.
+
+    Rows are rule-major: row r * B + b is episode b learnt with rule r, so
+    `.final.reshape(6, B, 64, 9)` is the rule x episode tensor of final
+    tables. `factual` is the replay of all episodes under the participants'
+    own rules; its path and try moves are reused, so only what the agent
+    learns from them changes.
+    """
+    n_ep = len(factual.events.episodes)
+    return replay(
+        factual.events,
+        rules=np.repeat(RULES, n_ep),
+        episode=np.tile(np.arange(n_ep), len(RULES)),
+        try_action=np.tile(factual.try_action, (len(RULES), 1)),
+    )
+
+
+def policy_quality(result: Replay) -> pd.DataFrame:
+    """Quality of each row's final greedy policy on the states it visited.
+
+    optimal_share   share of visited states where the greedy move is one of
+                    the teacher's best moves
+    expected_ratio  mean expected pellet probability of the greedy move
+                    relative to the best move, over visited states next to
+                    pellets
+    """
+    ev = result.events
+    e = result.episode
+    layout = ev.layout_index[e]
+    greedy = greedy_actions(result.final)  # (R, 64)
+
+    visited = np.zeros((len(e), N_STATES), dtype=bool)
+    rows, steps = np.nonzero((ev.kind[e] >= 0) & (ev.s[e] >= 0))
+    visited[rows, ev.s[e][rows, steps]] = True
+
+    states = np.arange(N_STATES)
+    optimal = TEACHER_OPTIMAL[layout[:, None], states, greedy]
+    prob = EXPECTED[layout[:, None], states, greedy]
+    best = EXPECTED[layout].max(axis=2)
+    scored = visited & (best > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.where(scored, prob / best, 0.0).sum(axis=1) / scored.sum(axis=1)
+
+    frame = ev.episodes.iloc[e][EPISODE_KEYS + ["interpret_type"]].reset_index(drop=True)
+    frame["rule"] = result.rule
+    frame["optimal_share"] = (optimal & visited).sum(axis=1) / visited.sum(axis=1)
+    frame["expected_ratio"] = ratio
+    return frame
+
+
+def rule_table(quality: pd.DataFrame, column="optimal_share") -> pd.DataFrame:
+    """Participant-averaged `column` by own type (rows) and replay rule (columns)."""
+    per_user = quality.groupby(
+        ["data_source", "user_id", "interpret_type", "rule"], as_index=False
+    )[column].mean()
+    table = per_user.pivot_table(index="interpret_type", columns="rule", values=column)
+    table.index = [INTERPRETATION_TYPES[t] for t in table.index]
+    table.columns = [INTERPRETATION_TYPES[r] for r in table.columns]
+    return table
+
+
+# ==================== Reporting ====================
+
+
+def fidelity(result: Replay) -> pd.DataFrame:
+    """Share of completed moves whose replayed Q matches the logged q_value, by type."""
+    frame = result.event_frame()
+    moves = frame[frame["kind"] == "MOVE"].copy()
+    moves["match"] = (moves["q_replayed"] - moves["q_logged"]).abs() < Q_TOLERANCE
+    cuts = frame[frame["kind"].isin(["DRAG", "CANCEL"])]
+    table = moves.groupby("rule").agg(moves=("match", "size"), exact=("match", "mean"))
+    table["try_matched"] = cuts.groupby("rule")["try_quality"].apply(
+        lambda x: (x == TRY_MATCHED).mean()
+    )
+    table.index = [INTERPRETATION_TYPES[r] for r in table.index]
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", help="save the trajectories to this .npz file")
+    parser.add_argument(
+        "--counterfactual",
+        metavar="CSV",
+        help="also replay every episode under all six rules and write the "
+        "per-episode policy quality to CSV",
+    )
+    args = parser.parse_args()
+
+    result = replay_study()
+    events = result.events
+    counts = pd.Series(events.kind[events.kind >= 0]).map(dict(enumerate(KIND_NAMES)))
+    print(f"{len(events.episodes)} episodes, {events.shape[1]} steps max")
+    print(counts.value_counts().to_string())
+    print(f"unmatched drags: {events.unmatched_drags}")
+    print(f"off-grid events: {int(((events.kind >= 0) & (events.s < 0)).sum())}")
+    print()
+    # one step: each event starts from the logged value; free: from the replay
+    table = fidelity(result).rename(columns={"exact": "exact_one_step"})
+    table.insert(2, "exact_free", fidelity(replay(events))["exact"])
+    print(table.round(3).to_string())
+    if args.out:
+        result.save(args.out)
+        print(f"\nSaved to {args.out}")
+
+    if args.counterfactual:
+        quality = policy_quality(counterfactual(result))
+        quality.to_csv(args.counterfactual, index=False)
+        for column in ("optimal_share", "expected_ratio"):
+            print(f"\n{column}: own type (rows) x replayed rule (columns)")
+            print(rule_table(quality, column).round(3).to_string())
+        print(f"\nSaved to {args.counterfactual}")
+
+
+if __name__ == "__main__":
+    profiling.rerun_profiled()
+    main()
@@ -30,6 +30,8 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 
+import profiling
+
 
 def run_analysis(data_dir: str = "study_data"):
     """Run the complete Q-value x frequency analysis."""
@@ -160,4 +162,5 @@ def run_analysis(data_dir: str = "study_data"):
 
 
 if __name__ == "__main__":
+    profiling.rerun_profiled()
     run_analysis()
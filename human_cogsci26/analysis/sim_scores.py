@@ -0,0 +1,81 @@
+"""Smoothed score curves of the simulated intervention runs.
+
+Importable copies of the helpers in supporting_sim_scores/0.25.py (whose
+file name cannot be imported). Behaviour, including the unseeded per-step
+bootstrap, is unchanged.
+"""
+
+import numpy as np
+import pandas as pd
+from statsmodels.nonparametric.smoothers_lowess import lowess
+
+
+def calculate_lowess_smooth(df, x_col="step", y_col="CumulativeReward", frac=0.3):
+    """LOWESS (it=0) of the per-step mean; returns (smoothed Series, steps)."""
+    if df.empty:
+        return pd.Series([], dtype=float), []
+
+    grouped = df.groupby(x_col)[y_col].mean().reset_index()
+    if len(grouped) < 2:
+        return pd.Series([], dtype=float), []
+
+    try:
+        lowess_result = lowess(grouped[y_col], grouped[x_col], frac=frac, it=0)
+    except Exception as e:
+        print(f"LOWESS calculation error: {e}")
+        return pd.Series([], dtype=float), []
+    smoothed = pd.Series(lowess_result[:, 1], index=grouped[x_col])
+    return smoothed, grouped[x_col].values
+
+
+def calculate_difference_with_ci(
+    intervention_data,
+    baseline_data,
+    x_col="step",
+    y_col="CumulativeReward",
+    confidence=0.95,
+    n_bootstrap=1000,
+):
+    """Smoothed intervention-minus-baseline curve with per-step bootstrap CI.
+
+    Returns (difference, ci_lower, ci_upper, common_steps).
+    """
+    empty = pd.Series([], dtype=float)
+    if intervention_data.empty or baseline_data.empty:
+        return empty, empty, empty, []
+
+    smoothed_int, _ = calculate_lowess_smooth(intervention_data, x_col, y_col)
+    smoothed_base, _ = calculate_lowess_smooth(baseline_data, x_col, y_col)
+    if smoothed_int.empty or smoothed_base.empty:
+        return empty, empty, empty, []
+
+    common_steps = smoothed_int.index.intersection(smoothed_base.index)
+    if len(common_steps) == 0:
+        return empty, empty, empty, []
+
+    difference = smoothed_int.loc[common_steps] - smoothed_base.loc[common_steps]
+
+    alpha = (1 - confidence) / 2
+    ci_lower_values = []
+    ci_upper_values = []
+    for step in common_steps:
+        int_vals = intervention_data[intervention_data[x_col] == step][y_col].values
+        base_vals = baseline_data[baseline_data[x_col] == step][y_col].values
+
+        if len(int_vals) > 1 and len(base_vals) > 1:
+            bootstrap_diffs = []
+            for _ in range(n_bootstrap):
+                sample_int = np.random.choice(int_vals, size=len(int_vals), replace=True)
+                sample_base = np.random.choice(
+                    base_vals, size=len(base_vals), replace=True
+                )
+                bootstrap_diffs.append(np.mean(sample_int) - np.mean(sample_base))
+            ci_lower_values.append(np.percentile(bootstrap_diffs, alpha * 100))
+            ci_upper_values.append(np.percentile(bootstrap_diffs, (1 - alpha) * 100))
+        else:
+            ci_lower_values.append(np.nan)
+            ci_upper_values.append(np.nan)
+
+    ci_lower = pd.Series(ci_lower_values, index=common_steps)
+    ci_upper = pd.Series(ci_upper_values, index=common_steps)
+    return difference, ci_lower, ci_upper, common_steps
@@ -0,0 +1,196 @@
+"""Keyframe + delta encoding of the frontend's IGlobalState snapshots.
+
+Every trajectory carries its full start and end state (agent and pellet
+positions, scores, and the extradata.qResults list, which grows by one
+entry per move). Consecutive states of a round differ in a few fields, so a
+round's states are stored as a chain: a full keyframe, then deltas against
+the previous state, with a new keyframe every KEYFRAME_INTERVAL states so
+that decoding any one state replays at most that many deltas.
+
+A delta is a list of ops on JSON paths:
+
+    ["s", path, value]                 set (path [] replaces the whole state)
+    ["d", path]                        delete a dict key
+    ["l", path, start, stop, items]    list[start:stop] = items
+
+Decoded states share unchanged containers with the states before them and
+must be treated as read-only.
+"""
+
+import hashlib
+import json
+import operator
+import zlib
+
+KEYFRAME_INTERVAL = 64
+
+
+def canonical(obj) -> bytes:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()
+
+
+# ==================== Diff / patch ====================
+
+
+def _same(a, b) -> bool:
+    """Equal as JSON: == alone treats True as 1 and 1.0 as 1."""
+    if isinstance(a, (dict, list)):
+        return a == b and canonical(a) == canonical(b)
+    return type(a) is type(b) and a == b
+
+
+def _common_run(a, b, stop, same) -> tuple[int, int]:
+    """Lengths of the common prefix and (non-overlapping) suffix of a and b."""
+    start = 0
+    while start < stop and same(a[start], b[start]):
+        start += 1
+    tail = 0
+    while tail < stop - start and same(a[-1 - tail], b[-1 - tail]):
+        tail += 1
+    return start, tail
+
+
+def diff(a, b, path=()) -> list:
+    """Ops turning a into b."""
+    if _same(a, b):
+        return []
+    if isinstance(a, dict) and isinstance(b, dict):
+        ops = []
+        for key, value in b.items():
+            if key in a:
+                ops += diff(a[key], value, path + (key,))
+            else:
+                ops.append(["s", [*path, key], value])
+        ops += [["d", [*path, key]] for key in a if key not in b]
+        return ops
+    if isinstance(a, list) and isinstance(b, list):
+        if len(a) == len(b):
+            ops = []
+            for i, (x, y) in enumerate(zip(a, b)):
+                ops += diff(x, y, path + (i,))
+            return ops
+        # one changed run: pellets appended or picked up, qResults appended
+        stop = min(len(a), len(b))
+        start, tail = _common_run(a, b, stop, operator.eq)
+        if not _same(a[:start], b[:start]) or not _same(
+            a[len(a) - tail :], b[len(b) - tail :]
+        ):
+            start, tail = _common_run(a, b, stop, _same)
+        return [["l", list(path), start, len(a) - tail, b[start : len(b) - tail]]]
+    return [["s", list(path), b]]
+
+
+def _copy(obj):
+    return dict(obj) if isinstance(obj, dict) else list(obj)
+
+
+def patch(state, ops):
+    """Apply ops to state without modifying it; untouched parts are shared."""
+    root = state
+    copied = set()
+    for op in ops:
+        kind, path = op[0], op[1]
+        if kind == "s" and not path:
+            root = op[2]
+            copied = set()
+            continue
+        if id(root) not in copied:
+            root = _copy(root)
+            copied.add(id(root))
+        walk = path if kind == "l" else path[:-1]
+        node = root
+        for key in walk:
+            child = node[key]
+            if id(child) not in copied:
+                child = _copy(child)
+                node[key] = child
+                copied.add(id(child))
+            node = child
+        if kind == "s":
+            node[path[-1]] = op[2]
+        elif kind == "d":
+            del node[path[-1]]
+        else:
+            node[op[2] : op[3]] = op[4]
+    return root
+
+
+# ==================== Chains ====================
+
+
+class StateChain:
+    """Encoder for one round's states, in the order they are added.
+
+    add() returns the state's index in the chain and, for a state not seen
+    before, the (idx, base, body) record to store: base is None and body the
+    zlib-compressed state for a keyframe, otherwise base = idx - 1 and body
+    the JSON delta.
+    """
+
+    def __init__(self, hashes=None, tail=None, tail_idx=-1, since_keyframe=0):
+        self.hashes: dict[str, int] = dict(hashes or {})
+        self.tail = tail
+        self.tail_idx = tail_idx
+        self.since_keyframe = since_keyframe
+
+    def add(self, state) -> tuple[int, tuple | None]:
+        body = canonical(state)
+        digest = hashlib.sha1(body).hexdigest()
+        if digest in self.hashes:
+            return self.hashes[digest], None
+        idx = self.tail_idx + 1
+        if self.tail is None or self.since_keyframe + 1 >= KEYFRAME_INTERVAL:
+            record = (idx, None, zlib.compress(body), digest)
+            self.since_keyframe = 0
+        else:
+            delta = json.dumps(diff(self.tail, state), separators=(",", ":"))
+            record = (idx, idx - 1, delta.encode(), digest)
+            self.since_keyframe += 1
+        self.hashes[digest] = idx
+        self.tail, self.tail_idx = state, idx
+        return idx, record
+
+    @classmethod
+    def resume(cls, records):
+        """Chain continuing stored (idx, base, body, hash) records."""
+        records = sorted(records)
+        if not records:
+            return cls()
+        states = decode(records)
+        since = 0
+        for _, base, _, _ in reversed(records):
+            if base is None:
+                break
+            since += 1
+        return cls(
+            hashes={digest: idx for idx, _, _, digest in records},
+            tail=states[-1],
+            tail_idx=records[-1][0],
+            since_keyframe=since,
+        )
+
+
+def _decode_record(base_state, base, body):
+    if base is None:
+        return json.loads(zlib.decompress(body))
+    return patch(base_state, json.loads(body))
+
+
+def decode(records) -> list:
+    """All states of a chain from its (idx, base, body, ...) records by idx."""
+    states = []
+    for idx, base, body, *_ in records:
+        states.append(_decode_record(states[base] if base is not None else None, base, body))
+    return states
+
+
+def decode_one(records, idx):
+    """One state, replaying only from its keyframe."""
+    by_idx = {r[0]: r for r in records}
+    path = [by_idx[idx]]
+    while path[-1][1] is not None:
+        path.append(by_idx[path[-1][1]])
+    state = None
+    for _, base, body, *_ in reversed(path):
+        state = _decode_record(state, base, body)
+    return state
@@ -7,6 +7,8 @@ import pandas as pd
 from scipy import stats
 import warnings
 
+from visits import VisitIndex
+
 warnings.filterwarnings("ignore")
 
 # Interpretation types mapping
@@ -37,6 +39,7 @@ print("\n[1] Loading data files...")
 action_df = pd.read_csv("study_data/user_data_action.csv")
 score_df = pd.read_csv("study_data/user_data.csv")
 qvalue_df = pd.read_csv("study_data/user_data_q.csv")
+try_df = pd.read_csv("study_data/user_data_try.csv")
 
 print(f"  - action_df: {len(action_df)} rows")
 print(f"  - score_df: {len(score_df)} rows")
@@ -146,10 +149,10 @@ def classify_teaching_hypothesis(row):
 
     H1 (Undoing): agent_end_pos == agent_ini_pos (put back to initial)
     H2 (Correcting): Intervention on suboptimal action
-    H3 (Exploration): Would need visit data to determine
+    H3 (Exploration): dropped on a tile the agent had not visited yet
     H4 (Restart): agent_end_pos is starting position (e.g., 0,0 or corner)
 
-    Simplified version based on available data.
+    Drags matching none of them are "Other".
     """
     end_x, end_y = row["agent_end_pos_x"], row["agent_end_pos_y"]
     ini_x, ini_y = row["agent_ini_pos_x"], row["agent_ini_pos_y"]
@@ -169,15 +172,25 @@ def classify_teaching_hypothesis(row):
     if is_optimal == 0:
         return "H2_Correcting"
 
-    # Default: Could be exploration or other
-    return "H3_Exploration"
+    # H3: Exploration - drop on a tile the agent has not visited yet
+    if row["unvisited_drop"]:
+        return "H3_Exploration"
+
+    return "Other"
 
 
+# Visit history from the try table (user ids are strings in the action table)
+visit_keys = action_df.assign(
+    user_id=pd.to_numeric(action_df["user_id"], errors="coerce")
+)
+visits = VisitIndex.from_tables(try_df, visit_keys)
+action_df["unvisited_drop"] = visits.unvisited_drops(visit_keys)
+
 action_df["teaching_hypothesis"] = action_df.apply(classify_teaching_hypothesis, axis=1)
 
 # Count by hypothesis
 hypothesis_counts = action_df["teaching_hypothesis"].value_counts()
-print("\nTeaching hypothesis distribution (simplified classification):")
+print("\nTeaching hypothesis distribution:")
 for hyp, count in hypothesis_counts.items():
     print(f"  {hyp}: {count} ({100 * count / total_interventions:.1f}%)")
 
@@ -0,0 +1,322 @@
+"""
+Synthetic study data for scale testing.
+
+Writes schema-identical copies of the six participant tables of
+study_data/data/{clean,pilot}/ for any number of synthetic users:
+
+    user_data_q.csv            Expected-Q samples every 0.5 s over 100 s
+    user_data.csv              Score samples on the same grid
+    user_data_action.csv       One row per drag
+    user_data_try.csv          One row per agent step
+    user_data_end_counts.csv   Pellet collections per pellet tile
+    user_round_statistics.csv  Drags per user in rounds 2-9
+
+Each episode is a small simulation so the tables agree with each other:
+the agent walks epsilon-greedily towards the nearest pellet, drags teleport
+it to a tile picked by the user's interpretation type ((user_id - 1) % 6),
+pellet collections feed both the score curve and the end counts, and the
+round statistics count the drags. Users are simulated and appended in
+batches, so memory stays flat however many users are written.
+
+Usage (from human_cogsci26/):
+    python analysis/synthetic_data.py /tmp/synthetic --users 5000
+    python analysis/synthetic_data.py /tmp/synthetic --scale 10 --seed 7
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from common import GRID_SIZE, PELLET_TILES, get_interpret_type, layout_of
+
+STUDY_USERS = 82
+ROUNDS = list(range(1, 10))
+TWO_AGENT_ROUNDS = [6, 7, 8, 9]
+ROUND_SECONDS = 100.0
+Q_SAMPLE_SECONDS = 0.5
+PELLET_FEEDBACK = 6
+AGENT_EPS = 0.3
+PELLET_RESPAWN_PROB = 0.5  # chance a visited pellet tile still holds a pellet
+MEAN_STEPS = 65  # agent steps per episode in user_data_try.csv
+BATCH_USERS = 100
+
+COLUMNS = {
+    "user_data_q.csv": ["agent_id", "time", "user_id", "round", "ExpectedQvalue"],
+    "user_data.csv": ["score", "agent_id", "time", "user_id", "round"],
+    "user_data_action.csv": [
+        "agent_st_pos_x",
+        "agent_st_pos_y",
+        "agent_end_pos_x",
+        "agent_end_pos_y",
+        "agent_ini_pos_x",
+        "agent_ini_pos_y",
+        "agent_id",
+        "duration",
+        "user_id",
+        "round",
+        "st_time_relative",
+        "end_time_relative",
+        "is_optimal",
+        "q_value",
+        "expected_q_value",
+    ],
+    "user_data_try.csv": [
+        "user_id",
+        "round",
+        "agent_id",
+        "agent_st_pos_x",
+        "agent_st_pos_y",
+        "q_value",
+        "expected_q_value",
+        "is_optimal",
+    ],
+    "user_data_end_counts.csv": ["user_id", "round", "agent_id", "tile_x", "tile_y", "cnt"],
+    "user_round_statistics.csv": ["user_id"] + [f"round_{r}" for r in range(2, 10)],
+}
+
+# Drag-target preferences per interpretation type: probabilities of
+# dropping at the start tile (H1), on a nearby pellet (H2), next to a pellet
+# (H3) or anywhere else nearby (H4), plus the mean drags per minute.
+TYPE_PROFILES = {
+    0: {"targets": [0.05, 0.70, 0.15, 0.10], "drags_per_min": 12},  # SUGGESTION
+    1: {"targets": [0.10, 0.30, 0.30, 0.30], "drags_per_min": 9},  # RESET
+    2: {"targets": [0.60, 0.20, 0.10, 0.10], "drags_per_min": 6},  # INTERRUPT
+    3: {"targets": [0.40, 0.40, 0.10, 0.10], "drags_per_min": 10},  # TRANSITION
+    4: {"targets": [0.10, 0.20, 0.30, 0.40], "drags_per_min": 8},  # DISRUPT
+    5: {"targets": [0.30, 0.20, 0.20, 0.30], "drags_per_min": 7},  # IMPEDE
+}
+
+MOVES = np.array([[0, -1], [0, 1], [-1, 0], [1, 0], [-1, -1], [1, -1], [-1, 1], [1, 1]])
+
+
+class Layout:
+    """Pellet geometry of one layout, precomputed for the walk."""
+
+    def __init__(self, name: str):
+        self.pellets = np.array(PELLET_TILES[name])
+        self.is_pellet = np.zeros((GRID_SIZE, GRID_SIZE), dtype=bool)
+        self.is_pellet[self.pellets[:, 0], self.pellets[:, 1]] = True
+        xs, ys = np.meshgrid(np.arange(GRID_SIZE), np.arange(GRID_SIZE), indexing="ij")
+        tiles = np.stack([xs.ravel(), ys.ravel()], axis=1)
+        # Chebyshev distance of every tile to every pellet
+        dist = np.abs(tiles[:, None, :] - self.pellets[None, :, :]).max(axis=2)
+        self.nearest = self.pellets[dist.argmin(axis=1)].reshape(GRID_SIZE, GRID_SIZE, 2)
+        padded = np.pad(self.is_pellet, 1)
+        adjacent = sum(
+            padded[1 + dx : 1 + dx + GRID_SIZE, 1 + dy : 1 + dy + GRID_SIZE]
+            for dx in (-1, 0, 1)
+            for dy in (-1, 0, 1)
+        )
+        self.near_pellet = (adjacent > 0) & ~self.is_pellet
+
+
+LAYOUTS = {name: Layout(name) for name in PELLET_TILES}
+
+
+def _drag_target(rng, start: np.ndarray, layout: Layout, weights) -> np.ndarray:
+    """Tile a drag from `start` is dropped on, following the H1-H4 preferences."""
+    rule = rng.choice(4, p=weights)
+    if rule == 0:
+        return start.copy()
+    lo = np.maximum(start - 2, 0)
+    hi = np.minimum(start + 2, GRID_SIZE - 1)
+    xs, ys = np.meshgrid(
+        np.arange(lo[0], hi[0] + 1), np.arange(lo[1], hi[1] + 1), indexing="ij"
+    )
+    block = np.stack([xs.ravel(), ys.ravel()], axis=1)
+    pellet = layout.is_pellet[block[:, 0], block[:, 1]]
+    near = layout.near_pellet[block[:, 0], block[:, 1]]
+    pools = [None, block[pellet], block[near], block[~pellet & ~near]]
+    pool = pools[rule]
+    if len(pool) == 0:
+        pool = block
+    return pool[rng.integers(len(pool))]
+
+
+def simulate_episode(rng, user_id: int, round_num: int, agent_id: int, profile: dict):
+    """One agent's round; returns the rows it contributes to each table."""
+    layout = LAYOUTS[layout_of(round_num)]
+    n_steps = max(3, rng.poisson(MEAN_STEPS))
+    step_times = np.sort(rng.uniform(0, ROUND_SECONDS, n_steps)).round(1)
+    drags_expected = profile["drags_per_min"] * rng.uniform(0.2, 1.8) * ROUND_SECONDS / 60
+    drag_prob = min(0.9, drags_expected / n_steps)
+
+    pos = rng.integers(0, GRID_SIZE, 2)
+    collected = np.zeros((GRID_SIZE, GRID_SIZE), dtype=int)
+    collect_times = []
+    tries, actions = [], []
+    for step in range(n_steps):
+        target = layout.nearest[pos[0], pos[1]]
+        greedy = np.clip(pos + np.sign(target - pos), 0, GRID_SIZE - 1)
+        on_pellet = layout.is_pellet[pos[0], pos[1]]
+        expected_q = (on_pellet + layout.is_pellet[greedy[0], greedy[1]]) / len(layout.pellets)
+        q_value = round(float(rng.normal(1.2, 2.0)), 5)
+
+        if rng.random() < AGENT_EPS or (greedy == pos).all():
+            nxt = np.clip(pos + MOVES[rng.integers(len(MOVES))], 0, GRID_SIZE - 1)
+        else:
+            nxt = greedy
+        is_optimal = int((nxt == greedy).all() and not (greedy == pos).all())
+        tries.append((user_id, round_num, agent_id, pos[0], pos[1], q_value, expected_q, is_optimal))
+
+        if rng.random() < drag_prob:
+            end = _drag_target(rng, pos, layout, profile["targets"])
+            start_xy = (pos + rng.uniform(0, 1, 2)).round(1)
+            duration = int(rng.gamma(4.0, 150.0))
+            st = step_times[step]
+            actions.append(
+                (
+                    start_xy[0],
+                    start_xy[1],
+                    float(end[0]),
+                    float(end[1]),
+                    pos[0],
+                    pos[1],
+                    agent_id,
+                    duration,
+                    user_id,
+                    round_num,
+                    st,
+                    round(st + duration / 1000, 1),
+                    is_optimal,
+                    q_value,
+                    expected_q,
+                )
+            )
+            nxt = end
+
+        pos = nxt
+        if layout.is_pellet[pos[0], pos[1]] and rng.random() < PELLET_RESPAWN_PROB:
+            collected[pos[0], pos[1]] += 1
+            collect_times.append(step_times[step])
+
+    sample_times = np.arange(1, int(ROUND_SECONDS / Q_SAMPLE_SECONDS) + 1) * Q_SAMPLE_SECONDS
+    score = PELLET_FEEDBACK * np.searchsorted(np.array(collect_times), sample_times, side="right")
+    ceiling = rng.uniform(50, 110) * (1 + 0.3 * len(collect_times) / n_steps)
+    rate = rng.uniform(0.02, 0.08)
+    q_curve = ceiling * (1 - np.exp(-rate * sample_times)) + rng.normal(0, 4, sample_times.size)
+    q_curve = np.maximum(q_curve, 1.0).round(6)
+
+    return {
+        "user_data_q.csv": pd.DataFrame(
+            {
+                "agent_id": agent_id,
+                "time": sample_times,
+                "user_id": user_id,
+                "round": round_num,
+                "ExpectedQvalue": q_curve,
+            }
+        ),
+        "user_data.csv": pd.DataFrame(
+            {
+                "score": score,
+                "agent_id": agent_id,
+                "time": sample_times,
+                "user_id": user_id,
+                "round": round_num,
+            }
+        ),
+        "user_data_action.csv": pd.DataFrame(
+            actions, columns=COLUMNS["user_data_action.csv"]
+        ),
+        "user_data_try.csv": pd.DataFrame(tries, columns=COLUMNS["user_data_try.csv"]),
+        "user_data_end_counts.csv": pd.DataFrame(
+            {
+                "user_id": user_id,
+                "round": round_num,
+                "agent_id": agent_id,
+                "tile_x": layout.pellets[:, 0],
+                "tile_y": layout.pellets[:, 1],
+                "cnt": collected[layout.pellets[:, 0], layout.pellets[:, 1]],
+            }
+        ),
+    }, len(actions)
+
+
+def simulate_user(rng, user_id: int) -> dict[str, list[pd.DataFrame]]:
+    """All rounds and agents of one user, plus their round-statistics row."""
+    profile = TYPE_PROFILES[get_interpret_type(user_id)]
+    parts = {name: [] for name in COLUMNS}
+    drags = {}
+    for round_num in ROUNDS:
+        n_agents = 2 if round_num in TWO_AGENT_ROUNDS else 1
+        drags[round_num] = 0
+        for agent_id in range(n_agents):
+            tables, n_drags = simulate_episode(rng, user_id, round_num, agent_id, profile)
+            for name, df in tables.items():
+                parts[name].append(df)
+            drags[round_num] += n_drags
+    stats = {"user_id": user_id}
+    stats.update({f"round_{r}": drags[r] for r in range(2, 10)})
+    parts["user_round_statistics.csv"].append(pd.DataFrame([stats]))
+    return parts
+
+
+def generate(
+    out_dir: str,
+    n_users: int,
+    seed: int = 0,
+    start_id: int = 1,
+    batch_users: int = BATCH_USERS,
+    progress: bool = True,
+) -> dict[str, int]:
+    """Write the six tables for users start_id .. start_id + n_users - 1.
+
+    Returns the number of rows written per table.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rows = {}
+    for name, columns in COLUMNS.items():
+        pd.DataFrame(columns=columns).to_csv(os.path.join(out_dir, name), index=False)
+        rows[name] = 0
+
+    rng = np.random.default_rng(seed)
+    t0 = time.perf_counter()
+    user_ids = range(start_id, start_id + n_users)
+    for b in range(0, n_users, batch_users):
+        batch = {name: [] for name in COLUMNS}
+        for user_id in user_ids[b : b + batch_users]:
+            for name, dfs in simulate_user(rng, user_id).items():
+                batch[name].extend(dfs)
+        for name, dfs in batch.items():
+            df = pd.concat(dfs, ignore_index=True)[COLUMNS[name]]
+            df.to_csv(os.path.join(out_dir, name), mode="a", header=False, index=False)
+            rows[name] += len(df)
+        if progress:
+            done = min(b + batch_users, n_users)
+            print(f"  {done}/{n_users} users ({time.perf_counter() - t0:.1f}s)")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("out_dir", help="directory receiving the six CSV files")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--users", type=int, help="number of synthetic users")
+    size.add_argument(
+        "--scale", type=float, default=1.0, help="multiple of the 82-participant study"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start-id", type=int, default=1, help="first user_id")
+    parser.add_argument("--batch-users", type=int, default=BATCH_USERS)
+    args = parser.parse_args()
+
+    n_users = args.users if args.users is not None else round(STUDY_USERS * args.scale)
+    if n_users < 1:
+        parser.error("need at least one user")
+
+    print(f"Generating {n_users} synthetic users into {args.out_dir}")
+    rows = generate(args.out_dir, n_users, args.seed, args.start_id, args.batch_users)
+    for name, count in rows.items():
+        print(f"  {name:<28} {count:>10} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    profiling.rerun_profiled()
+    sys.exit(main())
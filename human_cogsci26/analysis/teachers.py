@@ -0,0 +1,324 @@
+"""Teacher models fitted to the participants' drags, for event_sim.py.
+
+Every self move a participant watched is a chance to intervene. The moves
+are read off user_data_try.csv and paired with the drags of
+user_data_action.csv (replay.parse_events). Each participant gets two
+models:
+
+    when   logistic regression of "this move was dragged" on the move's
+           q_value, expected_q_value and is_optimal, shrunk towards the
+           pooled fit of the participant's interpretation type
+    where  mixture weights of the H1-H4 drop targets (hypothesis_model.py)
+           plus a uniform tile, fitted by EM on the drop tiles, with a
+           Dirichlet prior at the type's weights
+
+FittedTeacher samples from these models inside the batched simulator.
+A simulated user of interpretation type k plays one of the type-k
+participants, taken round-robin, so any number of users can be simulated
+per type:
+
+    python analysis/teachers.py                      # fit and summarize
+    python analysis/teachers.py --simulate 600 --rounds 2,6 --out teachers.csv
+"""
+
+import argparse
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+
+import profiling
+from common import PELLET_TILES, get_interpret_type, get_type_name, layout_of
+from event_sim import SELF_MOVE_SECONDS, MoveContext, simulate
+from gridworld import N_STATES
+from hypothesis_model import HYPOTHESES, hypothesis_masks
+from loaders import read_study_tables
+from replay import DRAG, EPISODE_KEYS, LAYOUTS, MOVE, parse_events
+
+PROFILE_KEYS = ["data_source", "user_id"]
+FEATURES = ["q_value", "expected_q_value", "is_optimal"]
+COMPONENTS = [*HYPOTHESES, "uniform"]
+SHRINKAGE = 1.0  # ridge penalty pulling a user's coefficients to the type's
+DROP_PRIOR = 2.0  # pseudo-drops spread by the type's mixture weights
+EM_ITERATIONS = 200
+
+COEF_COLUMNS = ["intercept", *(f"b_{f}" for f in FEATURES)]
+WEIGHT_COLUMNS = [f"w_{c}" for c in COMPONENTS]
+
+
+# ==================== Data ====================
+
+
+@lru_cache(maxsize=None)
+def target_masks() -> np.ndarray:
+    """(layouts, hypotheses, start, target) membership of the S_H sets."""
+    return np.stack([hypothesis_masks(PELLET_TILES[layout]) for layout in LAYOUTS])
+
+
+def offered_moves(tables=None) -> pd.DataFrame:
+    """One row per self move the participant could have dragged.
+
+    `dragged` marks the moves cancelled by a drag, `drop` their drop tile
+    (-1 otherwise).
+    """
+    if tables is None:
+        tables = read_study_tables(["user_data_try", "user_data_action"])
+    tries = tables["user_data_try"].reset_index(drop=True)
+    events = parse_events(tries, tables["user_data_action"])
+    b, t = np.nonzero((events.kind == MOVE) | (events.kind == DRAG))
+    moves = events.episodes[EPISODE_KEYS + ["layout"]].iloc[b].reset_index(drop=True)
+    moves["interpret_type"] = moves["user_id"].map(get_interpret_type)
+    moves["s"] = events.s[b, t]
+    moves["q_value"] = events.q_logged[b, t]
+    moves["expected_q_value"] = events.prob_logged[b, t]
+    moves["is_optimal"] = tries["is_optimal"].to_numpy()[events.try_row[b, t]]
+    moves["dragged"] = events.kind[b, t] == DRAG
+    moves["drop"] = np.where(moves["dragged"], events.dest[b, t], -1)
+    return moves
+
+
+# ==================== When to intervene ====================
+
+
+def _fit_logistic(x, y, prior, penalty) -> np.ndarray:
+    """MAP logistic regression with a ridge penalty around `prior`."""
+
+    def loss(beta):
+        z = x @ beta
+        nll = np.sum(np.logaddexp(0, z) - y * z)
+        grad = x.T @ (1 / (1 + np.exp(-z)) - y)
+        diff = beta - prior
+        return nll + 0.5 * penalty * diff @ diff, grad + penalty * diff
+
+    res = minimize(loss, prior, jac=True, method="L-BFGS-B")
+    return res.x
+
+
+def fit_interventions(moves: pd.DataFrame) -> pd.DataFrame:
+    """Per-participant intervention model, one row per PROFILE_KEYS.
+
+    Features are standardized for the fit; the coefficients are returned in
+    the units of the logged columns.
+    """
+    raw = moves[FEATURES].to_numpy(dtype=float)
+    mean, scale = raw.mean(axis=0), raw.std(axis=0)
+    scale[scale == 0] = 1.0
+    x = np.column_stack([np.ones(len(raw)), (raw - mean) / scale])
+    y = moves["dragged"].to_numpy(dtype=float)
+    types = moves["interpret_type"].to_numpy()
+
+    pooled = {
+        k: _fit_logistic(x[types == k], y[types == k], np.zeros(x.shape[1]), 1e-3)
+        for k in np.unique(types)
+    }
+    rows = []
+    for key, idx in moves.groupby(PROFILE_KEYS, sort=True).indices.items():
+        k = types[idx[0]]
+        beta = _fit_logistic(x[idx], y[idx], pooled[k], SHRINKAGE)
+        coef = beta[1:] / scale
+        rows.append(
+            (*key, k, len(idx), int(y[idx].sum()), beta[0] - coef @ mean, *coef)
+        )
+    columns = [*PROFILE_KEYS, "interpret_type", "n_moves", "n_drags", *COEF_COLUMNS]
+    return pd.DataFrame(rows, columns=columns).set_index(PROFILE_KEYS)
+
+
+# ==================== Where to drop ====================
+
+
+def component_likelihoods(layout, s, drop) -> np.ndarray:
+    """(n, components) probability of each drop tile under each component."""
+    masks = target_masks()[layout, :, s]  # (n, H, 64)
+    sizes = masks.sum(axis=2)
+    hit = masks[np.arange(len(s)), :, drop]
+    p = np.where(sizes > 0, hit / np.maximum(sizes, 1), 1 / N_STATES)
+    return np.column_stack([p, np.full(len(s), 1 / N_STATES)])
+
+
+def _em_weights(lik, prior, strength) -> np.ndarray:
+    w = prior.copy()
+    for _ in range(EM_ITERATIONS):
+        resp = lik * w
+        resp /= resp.sum(axis=1, keepdims=True)
+        w = (resp.sum(axis=0) + strength * prior) / (len(lik) + strength)
+    return w
+
+
+def fit_drops(moves: pd.DataFrame) -> pd.DataFrame:
+    """Per-participant drop-target mixture weights, one row per PROFILE_KEYS."""
+    drags = moves[moves["dragged"] & (moves["drop"] >= 0)]
+    lik = component_likelihoods(
+        drags["layout"].map(LAYOUTS.index).to_numpy(),
+        drags["s"].to_numpy(),
+        drags["drop"].to_numpy(),
+    )
+    types = drags["interpret_type"].to_numpy()
+    flat = np.full(len(COMPONENTS), 1 / len(COMPONENTS))
+    pooled = {k: _em_weights(lik[types == k], flat, 0.0) for k in np.unique(types)}
+
+    rows = []
+    for key, idx in drags.groupby(PROFILE_KEYS, sort=True).indices.items():
+        rows.append((*key, *_em_weights(lik[idx], pooled[types[idx[0]]], DROP_PRIOR)))
+    return pd.DataFrame(rows, columns=[*PROFILE_KEYS, *WEIGHT_COLUMNS]).set_index(
+        PROFILE_KEYS
+    )
+
+
+def fit_teachers(moves=None) -> pd.DataFrame:
+    """Intervention and drop models of every participant with logged moves.
+
+    Participants who never dragged get their type's mean drop weights.
+    """
+    if moves is None:
+        moves = offered_moves()
+    profiles = fit_interventions(moves).join(fit_drops(moves))
+    by_type = profiles.groupby("interpret_type")[WEIGHT_COLUMNS].transform("mean")
+    profiles[WEIGHT_COLUMNS] = profiles[WEIGHT_COLUMNS].fillna(by_type)
+    return profiles
+
+
+# ==================== Sampling ====================
+
+
+class FittedTeacher:
+    """Teacher for event_sim.simulate that plays fitted participants.
+
+    Simulated user u of interpretation type k plays the ((u - 1) // 6)-th
+    type-k profile, modulo their number. Mouse-down falls at a uniform
+    point of the move, as for AutoDragTeacher.
+    """
+
+    def __init__(self, profiles: pd.DataFrame):
+        profiles = profiles.sort_values("interpret_type", kind="stable")
+        types = profiles["interpret_type"].to_numpy()
+        missing = sorted(set(range(6)) - set(types))
+        if missing:
+            raise ValueError(f"no fitted profile for interpretation types {missing}")
+        self.profiles = profiles
+        self.first = np.searchsorted(types, np.arange(6))
+        self.count = np.bincount(types, minlength=6)
+        self.coef = profiles[COEF_COLUMNS].to_numpy()
+        self.weights = profiles[WEIGHT_COLUMNS].to_numpy()
+
+    def profile_of(self, user_id, rule) -> np.ndarray:
+        """Row of self.profiles played by each simulated user."""
+        user_id, rule = np.asarray(user_id), np.asarray(rule)
+        return self.first[rule] + ((user_id - 1) // 6) % self.count[rule]
+
+    def decide(self, rng, ctx: MoveContext):
+        n = len(ctx.s)
+        p = self.profile_of(ctx.user_id, ctx.rule)
+        x = np.column_stack([np.ones(n), ctx.q_value, ctx.expected_q, ctx.is_optimal])
+        z = (x * self.coef[p]).sum(axis=1)
+        intervene = rng.random(n) < 1 / (1 + np.exp(-z))
+
+        cum = self.weights[p].cumsum(axis=1)
+        comp = (rng.random((n, 1)) > cum).sum(axis=1).clip(max=len(HYPOTHESES))
+        hypo = np.minimum(comp, len(HYPOTHESES) - 1)
+        masks = target_masks()[ctx.layout, hypo, ctx.s]
+        uniform = (comp == len(HYPOTHESES)) | ~masks.any(axis=1)
+        masks[uniform] = True
+        drop = np.argmax(masks * rng.random(masks.shape), axis=1)
+        return intervene, drop, rng.uniform(0, SELF_MOVE_SECONDS, n)
+
+
+# ==================== Calibration ====================
+
+
+def drop_shares(layout, s, drop) -> np.ndarray:
+    """Share of drops whose most likely component is each of COMPONENTS."""
+    lik = component_likelihoods(layout, s, drop)
+    best = lik.argmax(axis=1)
+    return np.bincount(best, minlength=len(COMPONENTS)) / max(len(best), 1)
+
+
+def calibration(profiles, moves, users, rounds, seed=0) -> pd.DataFrame:
+    """Drags per round and drop shares by type, study vs FittedTeacher runs."""
+    teacher = FittedTeacher(profiles)
+    rows = []
+    study_rounds = moves.groupby([*EPISODE_KEYS[:3], "interpret_type"])["dragged"]
+    study = study_rounds.sum().groupby(["round", "interpret_type"]).mean()
+    for i, round_id in enumerate(rounds):
+        log = simulate(users, round_id, teacher=teacher, seed=seed + i)
+        sim_types = log.drags["user_id"].map(get_interpret_type)
+        layout = LAYOUTS.index(layout_of(round_id))
+        for k in range(6):
+            real = moves[
+                (moves["round"] == round_id)
+                & (moves["interpret_type"] == k)
+                & moves["dragged"]
+                & (moves["drop"] >= 0)
+            ]
+            fake = log.drags[sim_types == k]
+            n_users = (log.rounds["interpret_type"] == k).sum()
+            rows.append(
+                (
+                    round_id,
+                    get_type_name(k),
+                    study.get((round_id, k), np.nan),
+                    len(fake) / max(n_users, 1),
+                    *drop_shares(
+                        real["layout"].map(LAYOUTS.index).to_numpy(),
+                        real["s"].to_numpy(),
+                        real["drop"].to_numpy(),
+                    ),
+                    *drop_shares(
+                        np.full(len(fake), layout),
+                        fake["s"].to_numpy(),
+                        fake["drop"].to_numpy(),
+                    ),
+                )
+            )
+    columns = [
+        "round",
+        "type",
+        "study_drags",
+        "sim_drags",
+        *(f"study_{c}" for c in COMPONENTS),
+        *(f"sim_{c}" for c in COMPONENTS),
+    ]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--simulate",
+        type=int,
+        default=0,
+        help="simulated users per round for the calibration check",
+    )
+    parser.add_argument("--rounds", default="2,6", help="comma-separated round ids")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--out", help="write the fitted profiles (or the calibration) here"
+    )
+    args = parser.parse_args()
+
+    moves = offered_moves()
+    profiles = fit_teachers(moves)
+    print(f"{len(profiles)} profiles from {len(moves):,} moves")
+
+    summary = profiles.groupby("interpret_type")[
+        ["n_drags", *COEF_COLUMNS, *WEIGHT_COLUMNS]
+    ].mean()
+    summary.index = summary.index.map(get_type_name)
+    with pd.option_context("display.width", 160, "display.precision", 3):
+        print(summary)
+
+    result = profiles
+    if args.simulate:
+        users = np.arange(1, args.simulate + 1)
+        rounds = [int(r) for r in args.rounds.split(",")]
+        result = calibration(profiles, moves, users, rounds, args.seed)
+        with pd.option_context("display.width", 200, "display.precision", 2):
+            print(result.set_index(["round", "type"]))
+    if args.out:
+        result.to_csv(args.out)
+        print(f"Saved to {args.out}")
+
+
+if __name__ == "__main__":
+    profiling.rerun_profiled()
+    main()
@@ -0,0 +1,205 @@
+"""Dense (user, round, agent, time) tensors of the 0.5 s log tables.
+
+user_data_q.csv and user_data.csv hold one row per (user, round, agent,
+time) sample on the 0.5 s grid up to 100 s. LogTensor stores one column of
+such a table as a float32 array of shape (users, rounds, agents, 200) with
+NaN where nothing was logged, plus the ids along each axis. Selections by
+user, round, agent or time are then plain indexing, and group means are
+reductions over the user axis:
+
+    q = read_q_tensor()
+    q.sel(rounds=[2, 3], agents=[0]).values            # (users, 2, 1, 200)
+    q.group_mean()                                     # per interpretation type
+    q.at(100.0)                                        # (users, rounds, agents)
+    top, low = q.sel(rounds=[6, 7]).top_low()          # (users, 2, 200) each
+
+Users are (data_source, user_id) pairs, since ids are only unique within a
+folder. A repeated sample keeps its first row, as in replay.py.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from common import DATA_DIR, get_interpret_type
+from curves import eval_at_100
+from loaders import read_study_tables
+
+SAMPLE_PERIOD = 0.5
+N_TIMES = 200  # samples per round
+TIMES = np.arange(1, N_TIMES + 1) * SAMPLE_PERIOD
+USER_KEYS = ["data_source", "user_id"]
+
+
+def axis_index(axis: np.ndarray, labels, name: str) -> np.ndarray:
+    """Positions of labels on a sorted axis; KeyError if any is absent."""
+    labels = np.atleast_1d(labels)
+    pos = np.searchsorted(axis, labels).clip(max=max(len(axis) - 1, 0))
+    missing = (axis[pos] != labels) if len(axis) else np.ones(len(labels), bool)
+    if missing.any():
+        shown = axis.tolist() if len(axis) <= 10 else f"{axis[0]}..{axis[-1]}"
+        raise KeyError(f"No {name} {labels[missing].tolist()} on {shown}")
+    return pos
+
+
+@dataclass
+class LogTensor:
+    values: np.ndarray  # (users, rounds, agents, times) float32, NaN if missing
+    users: pd.DataFrame  # data_source, user_id, interpret_type per user row
+    rounds: np.ndarray
+    agents: np.ndarray
+    times = TIMES  # the sample grid, shared by every tensor
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, column: str) -> "LogTensor":
+        """Tensor of `column` from a long table on the 0.5 s grid.
+
+        Tables without a data_source column (event_sim.py output) get "".
+        """
+        if "data_source" not in df.columns:
+            df = df.assign(data_source="")
+        users = df[USER_KEYS].drop_duplicates().sort_values(USER_KEYS)
+        users = users.reset_index(drop=True)
+        users["interpret_type"] = users["user_id"].map(get_interpret_type)
+        rounds = np.sort(df["round"].unique())
+        agents = np.sort(df["agent_id"].unique())
+
+        u = pd.MultiIndex.from_frame(users[USER_KEYS]).get_indexer(
+            pd.MultiIndex.from_frame(df[USER_KEYS])
+        )
+        r = np.searchsorted(rounds, df["round"].to_numpy())
+        a = np.searchsorted(agents, df["agent_id"].to_numpy())
+        t = np.rint(df["time"].to_numpy() / SAMPLE_PERIOD).astype(int) - 1
+        ok = (t >= 0) & (t < N_TIMES)
+
+        shape = (len(users), len(rounds), len(agents), N_TIMES)
+        flat = np.ravel_multi_index((u[ok], r[ok], a[ok], t[ok]), shape)
+        flat, first = np.unique(flat, return_index=True)
+        values = np.full(shape, np.nan, dtype=np.float32)
+        values.flat[flat] = df[column].to_numpy(dtype=np.float32)[ok][first]
+        return cls(values, users, rounds, agents)
+
+    # ---------- index maps ----------
+
+    def user_index(self, user_ids, data_source=None) -> np.ndarray:
+        """Positions of users on the user axis (-1 if absent).
+
+        Without data_source, a bare id matches its first folder.
+        """
+        user_ids = np.atleast_1d(user_ids)
+        if data_source is None:
+            ids = self.users["user_id"].to_numpy()
+            order = np.unique(ids, return_index=True)
+            pos = np.searchsorted(order[0], user_ids).clip(max=len(order[0]) - 1)
+            return np.where(order[0][pos] == user_ids, order[1][pos], -1)
+        keys = pd.MultiIndex.from_arrays(
+            [np.broadcast_to(data_source, user_ids.shape), user_ids]
+        )
+        return pd.MultiIndex.from_frame(self.users[USER_KEYS]).get_indexer(keys)
+
+    def round_index(self, rounds) -> np.ndarray:
+        return axis_index(self.rounds, rounds, "round")
+
+    def agent_index(self, agents) -> np.ndarray:
+        return axis_index(self.agents, agents, "agent")
+
+    def time_index(self, times) -> np.ndarray:
+        """Positions of times on the 0.5 s grid; KeyError if any is off it."""
+        times = np.atleast_1d(times).astype(float)
+        grid = np.rint(times / SAMPLE_PERIOD) * SAMPLE_PERIOD
+        # float noise snaps to the grid, anything else stays off it
+        times = np.where(np.isclose(grid, times), grid, times)
+        return axis_index(self.times, times, "time")
+
+    # ---------- selections ----------
+
+    def sel(self, users=None, rounds=None, agents=None, types=None) -> "LogTensor":
+        """Sub-tensor; `users` are user-axis positions or a boolean mask."""
+        values = self.values
+        keep = np.arange(len(self.users)) if users is None else np.asarray(users)
+        if keep.dtype == bool:
+            keep = np.flatnonzero(keep)
+        if types is not None:
+            of_type = self.users["interpret_type"].isin(np.atleast_1d(types))
+            keep = keep[of_type.to_numpy()[keep]]
+        r = slice(None) if rounds is None else self.round_index(rounds)
+        a = slice(None) if agents is None else self.agent_index(agents)
+        values = values[keep][:, r][:, :, a]
+        return LogTensor(
+            values,
+            self.users.iloc[keep].reset_index(drop=True),
+            self.rounds[r],
+            self.agents[a],
+        )
+
+    def at(self, time: float) -> np.ndarray:
+        """(users, rounds, agents) values at one sample time."""
+        return self.values[..., self.time_index(time)[0]]
+
+    def type_of(self) -> np.ndarray:
+        return self.users["interpret_type"].to_numpy()
+
+    # ---------- reductions ----------
+
+    def group_mean(self, by=None) -> tuple[np.ndarray, np.ndarray]:
+        """NaN-mean over the users of each group: (groups, (G, R, A, T)).
+
+        `by` is one label per user; the default is the interpretation type.
+        """
+        labels = self.type_of() if by is None else np.asarray(by)
+        groups, inverse = np.unique(labels, return_inverse=True)
+        means = np.empty((len(groups),) + self.values.shape[1:], dtype=np.float32)
+        for g in range(len(groups)):
+            block = self.values[inverse == g]
+            count = (~np.isnan(block)).sum(axis=0)
+            with np.errstate(invalid="ignore"):
+                means[g] = np.nansum(block, axis=0) / count
+        return groups, means
+
+    def top_agent(self, score=None) -> np.ndarray:
+        """(users, rounds) agent position of each round's best agent.
+
+        `score` is (users, rounds, agents); the default is the LOWESS curve
+        at t = 100, as curves.build_top_low ranks the agents.
+        """
+        if score is None:
+            score = np.full(self.values.shape[:3], np.nan)
+            for idx in zip(*np.nonzero(~np.isnan(self.values).all(axis=3))):
+                y = self.values[idx].astype(float)
+                score[idx] = eval_at_100(self.times, y)
+        score = np.where(np.isnan(score), -np.inf, score)
+        # ties go to the higher agent id
+        return score.shape[2] - 1 - np.argmax(score[..., ::-1], axis=2)
+
+    def top_low(self, score=None) -> tuple[np.ndarray, np.ndarray]:
+        """(users, rounds, times) curves of the top and the other agent.
+
+        Needs exactly two agents on the agent axis.
+        """
+        if len(self.agents) != 2:
+            raise ValueError(f"top_low needs two agents, got {list(self.agents)}")
+        top = self.top_agent(score)[..., None, None]
+        return (
+            np.take_along_axis(self.values, top, axis=2)[:, :, 0],
+            np.take_along_axis(self.values, 1 - top, axis=2)[:, :, 0],
+        )
+
+    def points(self, values=None) -> tuple[np.ndarray, np.ndarray]:
+        """(time, value) of every logged sample, for curves.lowess_line."""
+        values = self.values if values is None else values
+        x = np.broadcast_to(self.times, values.shape)
+        mask = ~np.isnan(values)
+        return x[mask].astype(float), values[mask].astype(float)
+
+
+def read_q_tensor(data_dir=DATA_DIR) -> LogTensor:
+    """ExpectedQvalue of user_data_q.csv (clean + pilot, valid users)."""
+    df = read_study_tables(["user_data_q"], data_dir)["user_data_q"]
+    return LogTensor.from_frame(df, "ExpectedQvalue")
+
+
+def read_score_tensor(data_dir=DATA_DIR) -> LogTensor:
+    """Agent scores of user_data.csv (clean + pilot, valid users)."""
+    df = read_study_tables(["user_data"], data_dir)["user_data"]
+    return LogTensor.from_frame(df, "score")
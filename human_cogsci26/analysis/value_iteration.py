@@ -0,0 +1,182 @@
+"""Optimal Q/value tables of the grid task and the regret of logged actions.
+
+PolicyTeacher (and the logged is_optimal) only looks one step ahead at the
+pellet probability of the destination. This module solves the grid MDP the
+agent learns in: 8 moves plus NOMOVE, the step cost Q_STEP_COST scaled by
+1.414 on diagonals, PELLET_FEEDBACK per pellet and discount GAMMA.
+
+Pellets arrive as a Poisson process, one every EXPECTED_PELLET_TIME on
+average, spread uniformly over the layout's pellet tiles. Tracking the
+pellet count of every tile makes the state space unbounded, so a move is
+credited with the expected arrivals over one MOVE_TIME on the tiles it
+touches. Diagonals get half of each side tile, as in the teacher, which
+leaves the agent's tile as the state.
+
+Credit does not build up on a tile between visits, so staying on a pellet
+tile would earn the arrival rate for free. The agent cannot do that:
+getMove turns NOMOVE into a sub-tile jitter, and the expected-Q simulation
+(simulateActions) replaces it with a uniformly random valid move. NOMOVE is
+solved as that random move, so it is never better than the best move.
+
+    python analysis/value_iteration.py          # regret of logged moves and drags
+"""
+
+import argparse
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from common import INTERPRETATION_TYPES
+from gridworld import (
+    ACTION_DELTAS,
+    EXPECTED_PELLET_TIME,
+    GAMMA,
+    MOVE_TIME,
+    N_ACTIONS,
+    N_STATES,
+    NOMOVE,
+    PELLET_FEEDBACK,
+    Q_STEP_COST,
+    STEP_COST_MULTIPLIER,
+    expected_probabilities,
+    in_grid,
+    infer_action,
+    state_index,
+    state_xy,
+    valid_action_mask,
+)
+from loaders import read_study_tables
+from replay import DRAG, EPISODE_KEYS, LAYOUTS, MOVE, parse_events
+
+
+def transitions() -> np.ndarray:
+    """(64, 9) next state of each move; -1 where it leaves the grid."""
+    xs, ys = state_xy(np.arange(N_STATES))
+    nx = xs[:, None] + ACTION_DELTAS[None, :, 0]
+    ny = ys[:, None] + ACTION_DELTAS[None, :, 1]
+    return np.where(in_grid(nx, ny), state_index(nx, ny), -1)
+
+
+def rewards(layout: str) -> np.ndarray:
+    """(64, 9) expected feedback of each move; -inf where it leaves the grid.
+
+    Expected pellets on the destination after one move time, plus the
+    step cost. NOMOVE gets the mean of the valid moves (_random_move).
+    """
+    arrivals = MOVE_TIME / EXPECTED_PELLET_TIME
+    pellet_prob = expected_probabilities(layout)
+    r = PELLET_FEEDBACK * arrivals * pellet_prob + Q_STEP_COST * STEP_COST_MULTIPLIER
+    return _random_move(np.where(valid_action_mask(), r, -np.inf))
+
+
+def _random_move(q: np.ndarray) -> np.ndarray:
+    """Set the NOMOVE column to the mean over each state's valid moves."""
+    moves = q[:, :NOMOVE]
+    valid = np.isfinite(moves)
+    q[:, NOMOVE] = np.where(valid, moves, 0).sum(axis=1) / valid.sum(axis=1)
+    return q
+
+
+def solve(layout: str, gamma=GAMMA, tol=1e-10, max_iter=10_000):
+    """Value iteration over all states at once; returns (Q, V)."""
+    r = rewards(layout)
+    nxt = np.maximum(transitions(), 0)
+    v = np.zeros(N_STATES)
+    for _ in range(max_iter):
+        q = _random_move(r + gamma * v[nxt])
+        v_new = q.max(axis=1)
+        if np.abs(v_new - v).max() < tol:
+            v = v_new
+            break
+        v = v_new
+    else:
+        raise RuntimeError(f"value iteration did not converge for {layout!r}")
+    return _random_move(r + gamma * v[nxt]), v
+
+
+@lru_cache(maxsize=None)
+def optimal_tables(layout: str):
+    """Cached (Q, V) of a layout; the arrays are read-only."""
+    q, v = solve(layout)
+    q.setflags(write=False)
+    v.setflags(write=False)
+    return q, v
+
+
+def _stacked():
+    q = np.stack([optimal_tables(layout)[0] for layout in LAYOUTS])
+    return q, q.max(axis=2)
+
+
+def regret(layout, s, a) -> np.ndarray:
+    """V*(s) - Q*(s, a) for arrays of layouts (names or indices), states, actions.
+
+    Off-grid states and moves give NaN.
+    """
+    layout = np.asarray(layout)
+    if layout.dtype.kind in "OUS":
+        names = pd.Series(layout.ravel()).map(LAYOUTS.index)
+        layout = names.to_numpy().reshape(layout.shape)
+    layout, s, a = np.broadcast_arrays(layout, np.asarray(s), np.asarray(a))
+    q, v = _stacked()
+    ok = (s >= 0) & (s < N_STATES) & (a >= 0) & (a < N_ACTIONS)
+    li, si, ai = (np.where(ok, x, 0) for x in (layout, s, a))
+    out = v[li, si] - q[li, si, ai]
+    return np.where(ok & np.isfinite(out), out, np.nan)
+
+
+def logged_regrets(events) -> pd.DataFrame:
+    """Regret of every agent move and human drag of replay Events.
+
+    A move is scored by its direction from the start tile to the next start
+    tile; a drag by the direction from the pick-up tile to the drop tile.
+    """
+    b, t = np.nonzero(np.isin(events.kind, (MOVE, DRAG)))
+    s, dest = events.s[b, t].astype(int), events.dest[b, t].astype(int)
+    keep = (s >= 0) & (dest >= 0) & (dest != s)
+    b, t, s, dest = b[keep], t[keep], s[keep], dest[keep]
+    (sx, sy), (dx, dy) = state_xy(s), state_xy(dest)
+    a = infer_action(dx - sx, dy - sy)
+
+    frame = events.episodes.iloc[b][EPISODE_KEYS + ["interpret_type", "layout"]]
+    frame = frame.reset_index(drop=True)
+    frame["event"] = t
+    frame["kind"] = np.where(events.kind[b, t] == DRAG, "drag", "move")
+    frame["state"] = s
+    frame["action"] = a
+    frame["regret"] = regret(frame["layout"].to_numpy(), s, a)
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", help="write the per-event regrets to this CSV")
+    args = parser.parse_args()
+
+    for layout in LAYOUTS:
+        q, v = optimal_tables(layout)
+        best = np.isclose(q, v[:, None])
+        print(
+            f"{layout}: V* in [{v.min():.2f}, {v.max():.2f}], "
+            f"{best.sum(axis=1).mean():.2f} optimal moves per state"
+        )
+
+    tables = read_study_tables(["user_data_try", "user_data_action"])
+    events = parse_events(tables["user_data_try"], tables["user_data_action"])
+    frame = logged_regrets(events)
+    frame["type"] = frame["interpret_type"].map(INTERPRETATION_TYPES)
+    summary = frame.pivot_table(
+        index="type", columns="kind", values="regret", aggfunc="mean"
+    )
+    print("\nMean regret of logged actions")
+    print(summary.round(3).to_string())
+    if args.out:
+        frame.to_csv(args.out, index=False)
+        print(f"\nSaved to {args.out}")
+
+
+if __name__ == "__main__":
+    profiling.rerun_profiled()
+    main()
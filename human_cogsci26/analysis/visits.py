@@ -0,0 +1,188 @@
+"""Visit history of every (user, round, agent): which tiles it has been on.
+
+The try table logs the start tile of every agent event and the action table
+the drop tile of every drag. With the event times of replay.py's timing
+model (anchored on the drags, 100 s rounds), each tile of an episode gets the
+time the agent first stood on it. The set of tiles visited by time t is then
+one comparison, packed into a 64-bit mask with bit `state_index(x, y)`:
+
+    python analysis/visits.py                  # index clean + pilot, H3 shares
+
+    visits = read_visit_index()
+    e = visits.episode_index(actions)                    # one episode per row
+    masks = visits.masks_at(e, actions["st_time_relative"])   # uint64
+    h3 = visits.unvisited_drops(actions)                 # drop on a new tile
+
+A drag counts as exploration-encouraging (H3) when it drops the agent on a
+tile that agent had not visited before the mouse-down.
+"""
+
+import argparse
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from common import DATA_DIR, get_interpret_type, get_type_name
+from gridworld import N_STATES, state_index
+from loaders import read_study_tables
+from replay import (
+    DRAG,
+    EPISODE_KEYS,
+    Events,
+    _event_starts,
+    _tile_state,
+    parse_events,
+)
+
+ROUND_SECONDS = 100.0
+UNVISITED = np.inf
+
+
+def popcount(masks) -> np.ndarray:
+    """Number of visited tiles in each mask."""
+    return np.bitwise_count(np.asarray(masks, dtype=np.uint64))
+
+
+def mask_tiles(mask: int) -> list[tuple[int, int]]:
+    """(x, y) tiles set in one mask."""
+    return [divmod(s, 8) for s in range(N_STATES) if int(mask) >> s & 1]
+
+
+@dataclass
+class VisitIndex:
+    episodes: pd.DataFrame  # EPISODE_KEYS per episode row
+    first_visit: np.ndarray  # (episodes, 64) first time on each tile, inf if never
+
+    @classmethod
+    def from_events(cls, events: Events) -> "VisitIndex":
+        """First visits from parsed events; uses events.start when it is set.
+
+        Every event visits its start tile when it starts, and a drag visits
+        its drop tile at mouse-up.
+        """
+        start = events.start
+        if start is None:
+            start = np.full(events.shape, np.nan)
+            for b, n in enumerate(events.episodes["n_events"]):
+                start[b, :n] = _event_starts(
+                    events.kind[b], events.t_down[b], events.t_up[b], n, ROUND_SECONDS
+                )
+        drag = events.kind == DRAG
+        on, dropped = events.s >= 0, drag & (events.dest >= 0)
+        rows = np.concatenate([np.nonzero(on)[0], np.nonzero(dropped)[0]])
+        tiles = np.concatenate([events.s[on], events.dest[dropped]]).astype(int)
+        times = np.concatenate([start[on], events.t_up[dropped]])
+
+        first = np.full((len(events.episodes), N_STATES), UNVISITED)
+        np.minimum.at(first, (rows, tiles), np.nan_to_num(times, nan=0.0))
+        return cls(events.episodes[EPISODE_KEYS].reset_index(drop=True), first)
+
+    @classmethod
+    def from_tables(cls, tries: pd.DataFrame, actions: pd.DataFrame) -> "VisitIndex":
+        """Index of a try/action table pair; tables without data_source get ""."""
+        if "data_source" not in tries.columns:
+            tries = tries.assign(data_source="")
+        if "data_source" not in actions.columns:
+            actions = actions.assign(data_source="")
+        return cls.from_events(parse_events(tries, actions))
+
+    # ---------- queries ----------
+
+    def episode_index(self, frame: pd.DataFrame) -> np.ndarray:
+        """Episode row of each row of `frame` (-1 if absent)."""
+        if "data_source" not in frame.columns:
+            frame = frame.assign(data_source="")
+        keys = pd.MultiIndex.from_frame(self.episodes[EPISODE_KEYS])
+        return keys.get_indexer(pd.MultiIndex.from_frame(frame[EPISODE_KEYS]))
+
+    def visited(self, episode, times, tiles) -> np.ndarray:
+        """Had episode[i]'s agent been on state tiles[i] by times[i]?"""
+        episode, tiles = np.asarray(episode), np.asarray(tiles)
+        ok = (episode >= 0) & (tiles >= 0)
+        first = self.first_visit[np.where(ok, episode, 0), np.where(ok, tiles, 0)]
+        times = np.asarray(times, dtype=float)
+        return ok & (first <= times) & (first < UNVISITED)
+
+    def masks_at(self, episode, times) -> np.ndarray:
+        """uint64 mask of the tiles visited by times[i] in episode[i] (0 if absent)."""
+        episode = np.asarray(episode)
+        times = np.asarray(times, dtype=float)
+        ok = episode >= 0
+        first = self.first_visit[np.where(ok, episode, 0)]
+        hit = (first <= times[:, None]) & (first < UNVISITED) & ok[:, None]
+        return np.packbits(hit, axis=1, bitorder="little").view("<u8")[:, 0]
+
+    def final_masks(self) -> np.ndarray:
+        """uint64 mask of every tile each episode's agent ever stood on."""
+        n = len(self.episodes)
+        return self.masks_at(np.arange(n), np.full(n, np.inf))
+
+    def unvisited_drops(self, actions: pd.DataFrame) -> np.ndarray:
+        """Was each drag dropped on a tile its agent had not visited before?
+
+        False for drops off the grid and for drags of unknown episodes.
+        """
+        drop = _tile_state(
+            np.floor(actions["agent_end_pos_x"].to_numpy()),
+            np.floor(actions["agent_end_pos_y"].to_numpy()),
+        )
+        episode = self.episode_index(actions)
+        t_down = actions["st_time_relative"].to_numpy(dtype=float)
+        known = (episode >= 0) & (drop >= 0)
+        return known & ~self.visited(episode, t_down, drop)
+
+    def missing_end_counts(self, end_counts: pd.DataFrame) -> pd.DataFrame:
+        """user_data_end_counts rows (cnt > 0) whose tile is never visited."""
+        ended = end_counts[end_counts["cnt"] > 0]
+        tiles = state_index(ended["tile_x"].to_numpy(), ended["tile_y"].to_numpy())
+        episode = self.episode_index(ended)
+        return ended[~self.visited(episode, np.full(len(ended), np.inf), tiles)]
+
+
+def read_visit_index(data_dir=DATA_DIR) -> VisitIndex:
+    """Visit index of clean + pilot (valid users)."""
+    tables = read_study_tables(["user_data_try", "user_data_action"], data_dir)
+    return VisitIndex.from_tables(tables["user_data_try"], tables["user_data_action"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--out", help="write per-drag visited counts and H3 flags (CSV)"
+    )
+    args = parser.parse_args()
+
+    tables = read_study_tables(
+        ["user_data_try", "user_data_action", "user_data_end_counts"]
+    )
+    actions = tables["user_data_action"]
+    visits = VisitIndex.from_tables(tables["user_data_try"], actions)
+    final = popcount(visits.final_masks())
+    print(
+        f"{len(visits.episodes)} episodes, "
+        f"{final.mean():.1f} tiles visited per episode (median {np.median(final):.0f})"
+    )
+    missing = visits.missing_end_counts(tables["user_data_end_counts"])
+    print(f"End-count tiles never visited: {len(missing)}")
+
+    episode = visits.episode_index(actions)
+    actions = actions.assign(
+        visited_tiles=popcount(visits.masks_at(episode, actions["st_time_relative"])),
+        h3_exploration=visits.unvisited_drops(actions),
+    )
+    types = actions["user_id"].map(get_interpret_type)
+    actions["interpret_type"] = types.map(get_type_name)
+    print("\nDrags dropped on an unvisited tile:")
+    shares = actions.groupby(["interpret_type", "round"])["h3_exploration"].mean()
+    print(shares.unstack().round(3).to_string())
+
+    if args.out:
+        actions.to_csv(args.out, index=False)
+        print(f"\nSaved {len(actions)} drags to {args.out}")
+
+
+if __name__ == "__main__":
+    profiling.rerun_profiled()
+    main()
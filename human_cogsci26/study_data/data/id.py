@@ -6,30 +6,23 @@ user_id 对应的 INTERPRET_TYPE 分布
 """
 
 import os
+import sys
 import pandas as pd
 from pathlib import Path
 
 # ---------- 1. 定位脚本所在目录 ----------
 BASE_DIR = Path(__file__).resolve().parent   # 脚本所在文件夹
+sys.path.insert(0, str(BASE_DIR.parents[1] / "analysis"))
+from counting import type_counts  # 共享的计数内核
 CLEAN_DIR  = BASE_DIR / "clean"
 PILOT_DIR  = BASE_DIR / "pilot"
 
 CSV_NAME = "user_round_statistics.csv"
 
-# ---------- 2. 映射函数（与 React 侧保持一致） ----------
-def interpret_type(uid: int) -> int:
-    """
-    对应 React 代码：
-    const candidates = [0,1,2,3,4,5];
-    const index = (username - 1) % candidates.length;
-    return candidates[index];
-    """
-    return (uid - 1) % 6
-
-# ---------- 3. 单组统计函数 ----------
+# ---------- 2. 单组统计函数 ----------
 def count_types(folder: Path) -> pd.Series:
     """
-    读取 folder/CSV_NAME，把 user_id 列转成类型后统计
+    读取 folder/CSV_NAME，把 user_id 列按 (user_id - 1) % 6 转成类型后统计
     返回 0-5 六类的计数 Series（index 顺序 0-5，缺类补 0）
     """
     csv_path = folder / CSV_NAME
@@ -45,20 +38,15 @@ def count_types(folder: Path) -> pd.Series:
     df = df.dropna(subset=["user_id"])
     df["user_id"] = df["user_id"].astype(int)
 
-    # 映射并统计
-    types = df["user_id"].map(interpret_type)
-    counts = types.value_counts().sort_index()
-
-    # 补全 0-5 所有类
-    counts = counts.reindex(range(6), fill_value=0).astype(int)
-    return counts
+    # 映射并统计（一次 bincount，缺类补 0）
+    return type_counts(df["user_id"])
 
-# ---------- 4. 分别统计两组 ----------
+# ---------- 3. 分别统计两组 ----------
 clean_counts = count_types(CLEAN_DIR)
 pilot_counts = count_types(PILOT_DIR)
 total_counts = clean_counts + pilot_counts
 
-# ---------- 5. 打印结果 ----------
+# ---------- 4. 打印结果 ----------
 type_names = ["SUGGESTION", "RESET", "INTERRUPT", "TRANSITION", "DISRUPT", "IMPEDE"]
 
 print("clean 组统计：")
@@ -6,11 +6,14 @@
 """
 
 import os
+import sys
 import pandas as pd
 from pathlib import Path
 
 # ---------- 1. 定位脚本所在目录 ----------
 BASE_DIR = Path(__file__).resolve().parent   # 脚本所在文件夹
+sys.path.insert(0, str(BASE_DIR.parents[1] / "analysis"))
+from counting import RateCube  # 共享的计数内核
 CLEAN_DIR  = BASE_DIR / "clean"
 PILOT_DIR  = BASE_DIR / "pilot"
 
@@ -63,89 +66,41 @@ def get_user_groups(folder):
     return user_groups
 
 # ---------- 4. 按用户组统计干预率 ----------
-def analyze_group_intervention_rate(df_action, df_try, user_ids, group_name, setting_num, rounds):
-    """
-    分析指定用户组的干预率
-    """
-    if not user_ids:
-        return {'numerator': 0, 'denominator': 0, 'intervention_rate': 0}
-    
-    # 筛选指定用户和round的数据
-    action_filtered = df_action[
-        (df_action['user_id'].isin(user_ids)) & 
-        (df_action['round'].isin(rounds))
-    ]
-    
-    try_filtered = df_try[
-        (df_try['user_id'].isin(user_ids)) & 
-        (df_try['round'].isin(rounds))
-    ]
-    
-    # 计算分子：实际干预次数 (is_optimal == 0)
-    numerator = len(action_filtered[action_filtered['is_optimal'] == 0])
-    
-    # 计算分母：需要干预的总次数 (is_optimal == 0)
-    denominator = len(try_filtered[try_filtered['is_optimal'] == 0])
-    
-    # 计算干预率
-    intervention_rate = (numerator / denominator * 100) if denominator > 0 else 0
-    
-    return {
-        'numerator': numerator,
-        'denominator': denominator,
-        'intervention_rate': intervention_rate,
-        'user_count': len(user_ids)
-    }
-
 def process_all_groups_intervention():
     """
     处理所有组的干预率数据
+    一次统计所有 user × round 的分子 (is_optimal == 0 的干预) 和
+    分母 (is_optimal == 0 的 try)，各用户组只是对其求和
     """
-    results = {}
-    
-    # 获取clean组用户分组
     clean_user_groups = get_user_groups(CLEAN_DIR)
-    
-    # 获取pilot组用户分组
     pilot_user_groups = get_user_groups(PILOT_DIR)
     
-    # 读取clean组数据
-    clean_action_file = CLEAN_DIR / "user_data_action.csv"
-    clean_try_file = CLEAN_DIR / "user_data_try.csv"
-    clean_action_data = pd.read_csv(clean_action_file)
-    clean_try_data = pd.read_csv(clean_try_file)
-    
-    # 读取pilot组数据
-    pilot_action_file = PILOT_DIR / "user_data_action.csv"
-    pilot_try_file = PILOT_DIR / "user_data_try.csv"
-    pilot_action_data = pd.read_csv(pilot_action_file)
-    pilot_try_data = pd.read_csv(pilot_try_file)
+    # 读取 clean 和 pilot 组数据
+    actions, tries = [], []
+    for folder in (CLEAN_DIR, PILOT_DIR):
+        actions.append(pd.read_csv(folder / "user_data_action.csv").assign(data_source=folder.name))
+        tries.append(pd.read_csv(folder / "user_data_try.csv").assign(data_source=folder.name))
+    cube = RateCube.from_tables(pd.concat(actions), pd.concat(tries))
     
+    results = {}
     for setting_num, rounds in SETTINGS.items():
-        setting_results = {}
-        
-        # 统计≤15且>0用户组
-        le_15_users = (clean_user_groups[setting_num]['le_15'] + 
-                       pilot_user_groups[setting_num]['le_15'])
-        
-        le_15_result = analyze_group_intervention_rate(
-            pd.concat([clean_action_data, pilot_action_data]),
-            pd.concat([clean_try_data, pilot_try_data]),
-            le_15_users, "≤15", setting_num, rounds
-        )
-        
-        # 统计>15用户组
-        gt_15_users = (clean_user_groups[setting_num]['gt_15'] + 
-                       pilot_user_groups[setting_num]['gt_15'])
-        
-        gt_15_result = analyze_group_intervention_rate(
-            pd.concat([clean_action_data, pilot_action_data]),
-            pd.concat([clean_try_data, pilot_try_data]),
-            gt_15_users, ">15", setting_num, rounds
-        )
+        # 与之前一致：按 user_id 在 clean 和 pilot 两组数据中同时匹配
+        user_ids = {
+            group: clean_user_groups[setting_num][group] + pilot_user_groups[setting_num][group]
+            for group in ("le_15", "gt_15")
+        }
+        users = {group: cube.user_rows(ids) for group, ids in user_ids.items()}
+        table = cube.table(users=users, rounds={setting_num: rounds})
         
-        setting_results['le_15'] = le_15_result
-        setting_results['gt_15'] = gt_15_result
+        setting_results = {}
+        for group, ids in user_ids.items():
+            counts = table.loc[(group, setting_num)]
+            setting_results[group] = {
+                'numerator': int(counts['numerator']),
+                'denominator': int(counts['denominator']),
+                'intervention_rate': counts['intervention_rate'],
+                'user_count': len(ids)
+            }
         results[setting_num] = setting_results
     
     return results
@@ -1,95 +1,33 @@
 import os
-import pandas as pd
+import sys
+
+# 共享的计数内核 (analysis/counting.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'analysis'))
+from counting import read_category_cube
 
 def calculate_intervention_categories():
     # 获取当前脚本所在路径
     base_path = os.path.dirname(os.path.abspath(__file__))
     
-    # 定义文件夹名称
-    folders = ['clean', 'pilot']
+    # 一次读取 clean 和 pilot 的有效用户数据，统计每个 user × round 的分类计数
+    # 1. acceleration: is_optimal=1 且 expected_q_value=0
+    # 2. correction: is_optimal=0
+    # 3. restart: is_optimal=1 且 expected_q_value≠0
+    cube = read_category_cube(base_path)
     
-    # 初始化计数器
-    total_random_denominator = 0
-    total_random_acceleration = 0
-    total_random_correction = 0
-    total_random_restart = 0
+    # 按round分组
+    worlds = {'random': [2, 3, 6, 7], 'smooth': [4, 5, 8, 9]}
+    counts = cube.table(rounds=worlds).loc['all']
     
-    total_smooth_denominator = 0
-    total_smooth_acceleration = 0
-    total_smooth_correction = 0
-    total_smooth_restart = 0
+    total_random_denominator = int(counts.at['random', 'total'])
+    total_random_acceleration = int(counts.at['random', 'acceleration'])
+    total_random_correction = int(counts.at['random', 'correction'])
+    total_random_restart = int(counts.at['random', 'restart'])
     
-    for folder in folders:
-        folder_path = os.path.join(base_path, folder)
-        
-        # 读取user_round_statistics.csv获取有效用户ID
-        stats_file = os.path.join(folder_path, 'user_round_statistics.csv')
-        if not os.path.exists(stats_file):
-            print(f"警告: 在{folder}文件夹中未找到user_round_statistics.csv")
-            continue
-            
-        user_stats = pd.read_csv(stats_file)
-        valid_user_ids = user_stats['user_id'].tolist()
-        
-        # 读取user_data_action.csv
-        action_file = os.path.join(folder_path, 'user_data_action.csv')
-        if not os.path.exists(action_file):
-            print(f"警告: 在{folder}文件夹中未找到user_data_action.csv")
-            continue
-            
-        action_data = pd.read_csv(action_file)
-        
-        # 筛选有效用户的数据
-        action_data = action_data[action_data['user_id'].isin(valid_user_ids)]
-        
-        # 按round分组
-        random_rounds = [2, 3, 6, 7]
-        smooth_rounds = [4, 5, 8, 9]
-        
-        random_data = action_data[action_data['round'].isin(random_rounds)]
-        smooth_data = action_data[action_data['round'].isin(smooth_rounds)]
-        
-        # 对random组进行分类计数
-        total_random_denominator += len(random_data)
-        
-        # 1. acceleration: is_optimal=1 且 expected_q_value=0
-        random_acceleration = random_data[
-            (random_data['is_optimal'] == 1) & 
-            (random_data['expected_q_value'] == 0)
-        ]
-        total_random_acceleration += len(random_acceleration)
-        
-        # 2. correction: is_optimal=0
-        random_correction = random_data[random_data['is_optimal'] == 0]
-        total_random_correction += len(random_correction)
-        
-        # 3. restart: is_optimal=1 且 expected_q_value≠0
-        random_restart = random_data[
-            (random_data['is_optimal'] == 1) & 
-            (random_data['expected_q_value'] != 0)
-        ]
-        total_random_restart += len(random_restart)
-        
-        # 对smooth组进行分类计数
-        total_smooth_denominator += len(smooth_data)
-        
-        # 1. acceleration: is_optimal=1 且 expected_q_value=0
-        smooth_acceleration = smooth_data[
-            (smooth_data['is_optimal'] == 1) & 
-            (smooth_data['expected_q_value'] == 0)
-        ]
-        total_smooth_acceleration += len(smooth_acceleration)
-        
-        # 2. correction: is_optimal=0
-        smooth_correction = smooth_data[smooth_data['is_optimal'] == 0]
-        total_smooth_correction += len(smooth_correction)
-        
-        # 3. restart: is_optimal=1 且 expected_q_value≠0
-        smooth_restart = smooth_data[
-            (smooth_data['is_optimal'] == 1) & 
-            (smooth_data['expected_q_value'] != 0)
-        ]
-        total_smooth_restart += len(smooth_restart)
+    total_smooth_denominator = int(counts.at['smooth', 'total'])
+    total_smooth_acceleration = int(counts.at['smooth', 'acceleration'])
+    total_smooth_correction = int(counts.at['smooth', 'correction'])
+    total_smooth_restart = int(counts.at['smooth', 'restart'])
     
     # 计算combined组
     total_combined_denominator = total_random_denominator + total_smooth_denominator
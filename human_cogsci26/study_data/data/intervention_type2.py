@@ -6,11 +6,14 @@
 """
 
 import os
+import sys
 import pandas as pd
 from pathlib import Path
 
 # ---------- 1. 定位脚本所在目录 ----------
 BASE_DIR = Path(__file__).resolve().parent   # 脚本所在文件夹
+sys.path.insert(0, str(BASE_DIR.parents[1] / "analysis"))
+from counting import CATEGORIES, CategoryCube  # 共享的计数内核
 CLEAN_DIR  = BASE_DIR / "clean"
 PILOT_DIR  = BASE_DIR / "pilot"
 
@@ -63,99 +66,43 @@ def get_user_groups(folder):
     return user_groups
 
 # ---------- 4. 按用户组统计干预行为分类 ----------
-def analyze_group_intervention_categories(df_action, user_ids, group_name, setting_num, rounds):
-    """
-    分析指定用户组的干预行为分类
-    """
-    if not user_ids:
-        return {
-            'total_actions': 0,
-            'acceleration': {'count': 0, 'rate': 0},
-            'correction': {'count': 0, 'rate': 0},
-            'restart': {'count': 0, 'rate': 0},
-            'user_count': 0
-        }
-    
-    # 筛选指定用户和round的数据
-    filtered_data = df_action[
-        (df_action['user_id'].isin(user_ids)) & 
-        (df_action['round'].isin(rounds))
-    ]
-    
-    total_actions = len(filtered_data)
-    
-    # 1. Acceleration (加速): is_optimal=1 且 expected_q_value=0
-    acceleration = filtered_data[
-        (filtered_data['is_optimal'] == 1) & 
-        (filtered_data['expected_q_value'] == 0)
-    ]
-    acceleration_count = len(acceleration)
-    acceleration_rate = (acceleration_count / total_actions * 100) if total_actions > 0 else 0
-    
-    # 2. Correction (纠正): is_optimal=0
-    correction = filtered_data[filtered_data['is_optimal'] == 0]
-    correction_count = len(correction)
-    correction_rate = (correction_count / total_actions * 100) if total_actions > 0 else 0
-    
-    # 3. Restart (重启): is_optimal=1 且 expected_q_value≠0
-    restart = filtered_data[
-        (filtered_data['is_optimal'] == 1) & 
-        (filtered_data['expected_q_value'] != 0)
-    ]
-    restart_count = len(restart)
-    restart_rate = (restart_count / total_actions * 100) if total_actions > 0 else 0
-    
-    return {
-        'total_actions': total_actions,
-        'acceleration': {'count': acceleration_count, 'rate': acceleration_rate},
-        'correction': {'count': correction_count, 'rate': correction_rate},
-        'restart': {'count': restart_count, 'rate': restart_rate},
-        'user_count': len(user_ids)
-    }
-
 def process_all_groups_categories():
     """
     处理所有组的干预行为分类数据
+    一次统计所有 user × round 的分类计数，各用户组 × setting 只是对其求和:
+    1. Acceleration (加速): is_optimal=1 且 expected_q_value=0
+    2. Correction (纠正): is_optimal=0
+    3. Restart (重启): is_optimal=1 且 expected_q_value≠0
     """
-    results = {}
-    
-    # 获取clean组用户分组
     clean_user_groups = get_user_groups(CLEAN_DIR)
-    
-    # 获取pilot组用户分组
     pilot_user_groups = get_user_groups(PILOT_DIR)
     
-    # 读取clean组数据
-    clean_action_file = CLEAN_DIR / "user_data_action.csv"
-    clean_action_data = pd.read_csv(clean_action_file)
-    
-    # 读取pilot组数据
-    pilot_action_file = PILOT_DIR / "user_data_action.csv"
-    pilot_action_data = pd.read_csv(pilot_action_file)
+    # 读取 clean 和 pilot 组数据
+    actions = pd.concat([
+        pd.read_csv(folder / "user_data_action.csv").assign(data_source=folder.name)
+        for folder in (CLEAN_DIR, PILOT_DIR)
+    ])
+    cube = CategoryCube.from_actions(actions)
     
+    results = {}
     for setting_num, rounds in SETTINGS.items():
-        setting_results = {}
-        
-        # 统计≤15且>0用户组
-        le_15_users = (clean_user_groups[setting_num]['le_15'] + 
-                       pilot_user_groups[setting_num]['le_15'])
-        
-        le_15_result = analyze_group_intervention_categories(
-            pd.concat([clean_action_data, pilot_action_data]),
-            le_15_users, "≤15", setting_num, rounds
-        )
-        
-        # 统计>15用户组
-        gt_15_users = (clean_user_groups[setting_num]['gt_15'] + 
-                       pilot_user_groups[setting_num]['gt_15'])
-        
-        gt_15_result = analyze_group_intervention_categories(
-            pd.concat([clean_action_data, pilot_action_data]),
-            gt_15_users, ">15", setting_num, rounds
-        )
+        # 与之前一致：按 user_id 在 clean 和 pilot 两组数据中同时匹配
+        user_ids = {
+            group: clean_user_groups[setting_num][group] + pilot_user_groups[setting_num][group]
+            for group in ("le_15", "gt_15")
+        }
+        users = {group: cube.user_rows(ids) for group, ids in user_ids.items()}
+        table = cube.table(users=users, rounds={setting_num: rounds})
         
-        setting_results['le_15'] = le_15_result
-        setting_results['gt_15'] = gt_15_result
+        setting_results = {}
+        for group, ids in user_ids.items():
+            counts = table.loc[(group, setting_num)]
+            setting_results[group] = {
+                'total_actions': int(counts['total']),
+                **{name: {'count': int(counts[name]), 'rate': counts[f'{name}_rate']}
+                   for name in CATEGORIES},
+                'user_count': len(ids)
+            }
         results[setting_num] = setting_results
     
     return results
@@ -1,9 +1,14 @@
 import pandas as pd
 import os
+import sys
 
 # 获取当前py文件所在路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
+# 共享的计数内核 (analysis/counting.py)
+sys.path.insert(0, os.path.join(current_dir, '..', '..', '..', 'analysis'))
+from counting import round_counts
+
 # 构建完整的文件路径
 csv_file_path = os.path.join(current_dir, 'user_data_action.csv')
 
@@ -14,28 +19,9 @@ df = pd.read_csv(csv_file_path)
 if 'user_id' not in df.columns or 'round' not in df.columns:
     print("错误：CSV文件中缺少'user_id'或'round'列")
 else:
-    # 创建完整的user_id和round组合
-    user_ids = df['user_id'].unique()
-    rounds = list(range(2, 10))  # round 2到9
-    
-    # 创建所有可能的组合
-    from itertools import product
-    all_combinations = pd.DataFrame(list(product(user_ids, rounds)), columns=['user_id', 'round'])
-    
-    # 统计实际存在的组合数量
-    actual_counts = df[df['round'].between(2, 9)].groupby(['user_id', 'round']).size().reset_index(name='count')
-    
-    # 合并所有组合和实际计数，缺失值填充为0
-    result = pd.merge(all_combinations, actual_counts, on=['user_id', 'round'], how='left')
-    result['count'] = result['count'].fillna(0).astype(int)
-    
-    # 重塑数据，使每个user_id一行，round作为列
-    pivot_result = result.pivot(index='user_id', columns='round', values='count').reset_index()
-    pivot_result.columns.name = None  # 移除列名
-    
-    # 重命名列，使其更清晰
-    column_names = ['user_id'] + [f'round_{i}' for i in range(2, 10)]
-    pivot_result.columns = column_names
+    # 一次 bincount 统计所有 user_id 和 round(2-9) 组合，缺失组合为0
+    pivot_result = round_counts(df)
+    user_ids = pivot_result['user_id']
     
     # 保存结果到新的CSV文件
     output_file_path = os.path.join(current_dir, 'user_round_counts_detailed.csv')